@@ -1,14 +1,20 @@
 # backend/app.py
 import os
+import re
 import json
+import base64
 import secrets
 import logging
+import threading
 import bleach
+import click
 from functools import wraps
-from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, Response, stream_with_context, send_from_directory, redirect
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from flask import Flask, request, jsonify, Response, stream_with_context, send_from_directory, redirect, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import JSON
+from sqlalchemy import JSON, event, insert
+from sqlalchemy.orm import selectinload
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, JWTManager
 from flask_cors import CORS
 from flask_migrate import Migrate
@@ -19,6 +25,10 @@ from flask_limiter.util import get_remote_address
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 import rag_engine # Import the RAG engine
+import metrics
+import notification_stream
+import uploads
+from serving import process_memory, format_memory, is_cooperative, run_blocking
 
 from dotenv import load_dotenv
 
@@ -33,7 +43,7 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 # Fix for HTTPS behind Nginx proxy
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-CORS(app, resources={r"/*": {"origins": "*", "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"], "allow_headers": ["Content-Type", "Authorization"]}})
+CORS(app, resources={r"/*": {"origins": "*", "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"], "allow_headers": ["Content-Type", "Authorization", "X-Part-SHA256"], "expose_headers": ["X-Next-Before"]}})
 
 # --- Configuration ---
 instance_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
@@ -51,6 +61,8 @@ app.config['SECRET_KEY'] = str(os.environ.get('JWT_SECRET_KEY', 'super-secret-ke
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 DATA_DIR = os.environ.get('DATA_DIR', os.path.join(BASE_DIR, 'data'))
 app.config['UPLOAD_FOLDER'] = os.path.join(DATA_DIR, 'uploads')
+# Parts of resumable uploads; kept outside UPLOAD_FOLDER so unfinished files are never served
+app.config['INCOMING_UPLOAD_FOLDER'] = os.path.join(DATA_DIR, 'incoming')
 app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER')
 app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
 app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'true').lower() in ['true', 'on', '1']
@@ -60,11 +72,13 @@ app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_USERNAME')
 
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
+os.makedirs(app.config['INCOMING_UPLOAD_FOLDER'], exist_ok=True)
 
 # --- Initialization ---
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 jwt = JWTManager(app)
+metrics.init_app(app, db)
 mail = Mail(app)
 limiter = Limiter(
     app=app,
@@ -106,6 +120,49 @@ def api_error(message, code, status=400, details=None):
         response["details"] = details
     return jsonify(response), status
 
+# --- Keyset Pagination ---
+PAGE_MAX_LIMIT = 200
+
+def page_args(default_limit):
+    """Parse ?limit= and ?before= (raises ValueError or TypeError on bad input)"""
+    limit = max(1, min(int(request.args.get('limit', default_limit)), PAGE_MAX_LIMIT))
+    before = request.args.get('before')
+    if before:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(before.encode()).decode())
+        before = (datetime.fromisoformat(timestamp), int(row_id))
+    return limit, before
+
+def paginate_keyset(query, time_column, id_column, limit, before=None):
+    """
+    Newest-first page of query keyed on (time, id).
+    Returns (rows, next_before); next_before is an opaque cursor or None on the last page.
+    """
+    if before:
+        timestamp, row_id = before
+        compared = time_column
+        if db.engine.dialect.name == 'sqlite':
+            # server_default timestamps are stored as 'YYYY-MM-DD HH:MM:SS' text while bound
+            # datetimes carry '.000000', so compare normalized strings on both sides
+            compared = db.func.datetime(time_column)
+            timestamp = timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        query = query.filter(
+            (compared < timestamp) | ((compared == timestamp) & (id_column < row_id))
+        )
+    rows = query.order_by(time_column.desc(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    key = [getattr(last, time_column.key).isoformat(), getattr(last, id_column.key)]
+    return rows, base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def paginated_response(items, next_before):
+    """JSON list response with the next page cursor in the X-Next-Before header"""
+    response = jsonify(items)
+    if next_before:
+        response.headers['X-Next-Before'] = next_before
+    return response, 200
+
 def sanitize_input(text):
     """Sanitize user input to prevent XSS"""
     if text is None:
@@ -132,7 +189,7 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=True)  # Nullable for Google OAuth users
     google_id = db.Column(db.String(256), nullable=True, unique=True)  # Google OAuth ID
-    reset_token = db.Column(db.String(128), nullable=True)
+    reset_token = db.Column(db.String(128), nullable=True, index=True)
     reset_token_expiration = db.Column(db.DateTime, nullable=True)
 
     def set_password(self, password):
@@ -144,7 +201,7 @@ class User(db.Model):
 class Course(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(150), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     user = db.relationship('User', backref=db.backref('courses', lazy=True))
     documents = db.relationship('Document', backref='course', lazy=True, cascade="all, delete-orphan")
 
@@ -154,14 +211,17 @@ class Document(db.Model):
     filepath = db.Column(db.String(300), nullable=True) # Nullable for URL-based documents
     vector_store_path = db.Column(db.String(300), nullable=True)  # Nullable until processing complete
     uploaded_at = db.Column(db.DateTime, server_default=db.func.now())
-    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False, index=True)
     source_type = db.Column(db.String(50), nullable=False, default='pdf') # 'pdf', 'url', 'youtube'
     source_url = db.Column(db.String(500), nullable=True)
     # Processing status: 'pending', 'processing', 'ready', 'error'
     processing_status = db.Column(db.String(20), nullable=False, default='pending')
     error_message = db.Column(db.Text, nullable=True)
+    # Set for documents added through the batch ingestion endpoint
+    ingestion_batch_id = db.Column(db.String(32), nullable=True, index=True)
 
 class Note(db.Model):
+    __table_args__ = (db.Index('ix_note_user_id_course_id', 'user_id', 'course_id'),)
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
@@ -170,6 +230,10 @@ class Note(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
 class Notification(db.Model):
+    __table_args__ = (
+        db.Index('ix_notification_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_notification_user_id_is_read', 'user_id', 'is_read'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     message = db.Column(db.String(500), nullable=False)
@@ -179,6 +243,10 @@ class Notification(db.Model):
     course_id = db.Column(db.Integer, db.ForeignKey('course.id', ondelete='CASCADE'), nullable=True) # Optional
 
 class QuizAttempt(db.Model):
+    __table_args__ = (
+        db.Index('ix_quiz_attempt_user_id_course_id_timestamp', 'user_id', 'course_id', 'timestamp'),
+        db.Index('ix_quiz_attempt_user_id_timestamp', 'user_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     course_id = db.Column(db.Integer, db.ForeignKey('course.id', ondelete='CASCADE'), nullable=False)
@@ -188,7 +256,7 @@ class QuizAttempt(db.Model):
 
 class QuizQuestionResponse(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    quiz_attempt_id = db.Column(db.Integer, db.ForeignKey('quiz_attempt.id'), nullable=False)
+    quiz_attempt_id = db.Column(db.Integer, db.ForeignKey('quiz_attempt.id'), nullable=False, index=True)
     question_text = db.Column(db.Text, nullable=False)
     selected_option = db.Column(db.String(200), nullable=False)
     correct_option = db.Column(db.String(200), nullable=False)
@@ -198,6 +266,7 @@ class QuizQuestionResponse(db.Model):
 
 class ChatMessage(db.Model):
     """Stores chat messages for conversation history"""
+    __table_args__ = (db.Index('ix_chat_message_user_id_course_id_created_at', 'user_id', 'course_id', 'created_at'),)
     id = db.Column(db.Integer, primary_key=True)
     course_id = db.Column(db.Integer, db.ForeignKey('course.id', ondelete='CASCADE'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -208,6 +277,7 @@ class ChatMessage(db.Model):
 
 class FlashcardDeck(db.Model):
     """A collection of flashcards for a course"""
+    __table_args__ = (db.Index('ix_flashcard_deck_user_id_course_id', 'user_id', 'course_id'),)
     id = db.Column(db.Integer, primary_key=True)
     course_id = db.Column(db.Integer, db.ForeignKey('course.id', ondelete='CASCADE'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -217,6 +287,7 @@ class FlashcardDeck(db.Model):
 
 class Flashcard(db.Model):
     """Individual flashcard with spaced repetition (SM-2) fields"""
+    __table_args__ = (db.Index('ix_flashcard_deck_id_next_review', 'deck_id', 'next_review'),)
     id = db.Column(db.Integer, primary_key=True)
     deck_id = db.Column(db.Integer, db.ForeignKey('flashcard_deck.id', ondelete='CASCADE'), nullable=False)
     front = db.Column(db.Text, nullable=False)  # Question side
@@ -232,6 +303,10 @@ class Flashcard(db.Model):
 
 class StudySession(db.Model):
     """Tracks study time per course for analytics"""
+    __table_args__ = (
+        db.Index('ix_study_session_user_id_course_id', 'user_id', 'course_id'),
+        db.Index('ix_study_session_user_id_created_at', 'user_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     course_id = db.Column(db.Integer, db.ForeignKey('course.id', ondelete='CASCADE'), nullable=False)
@@ -244,7 +319,7 @@ class StudySession(db.Model):
 class CourseShare(db.Model):
     """Shareable links for courses"""
     id = db.Column(db.Integer, primary_key=True)
-    course_id = db.Column(db.Integer, db.ForeignKey('course.id', ondelete='CASCADE'), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id', ondelete='CASCADE'), nullable=False, index=True)
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     share_token = db.Column(db.String(64), unique=True, nullable=False)  # Unique share token
     permission = db.Column(db.String(20), default='read')  # 'read' or 'edit'
@@ -255,6 +330,7 @@ class CourseShare(db.Model):
 
 class CourseGlossary(db.Model):
     """Auto-extracted glossary terms for a course"""
+    __table_args__ = (db.Index('ix_course_glossary_course_id_term', 'course_id', 'term'),)
     id = db.Column(db.Integer, primary_key=True)
     course_id = db.Column(db.Integer, db.ForeignKey('course.id', ondelete='CASCADE'), nullable=False)
     term = db.Column(db.String(200), nullable=False)
@@ -263,16 +339,128 @@ class CourseGlossary(db.Model):
     source_document = db.Column(db.String(200), nullable=True)  # Which doc it came from
     created_at = db.Column(db.DateTime, server_default=db.func.now())
 
-def create_notification(user_id, message, type, course_id=None):
-    new_notification = Notification(
-        user_id=user_id,
-        message=message,
-        type=type,
-        course_id=course_id
+class DailyActivity(db.Model):
+    """Per-user, per-course daily activity rollup, maintained alongside the raw rows"""
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'course_id', 'day', name='uq_daily_activity_user_course_day'),
+        db.Index('ix_daily_activity_user_id_day', 'user_id', 'day'),
     )
-    db.session.add(new_notification)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id', ondelete='CASCADE'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    study_seconds = db.Column(db.Integer, nullable=False, default=0)
+    quizzes = db.Column(db.Integer, nullable=False, default=0)
+    flashcard_reviews = db.Column(db.Integer, nullable=False, default=0)
+
+def record_daily_activity(user_id, course_id, study_seconds=0, quizzes=0, flashcard_reviews=0, when=None):
+    """
+    Add to the day's rollup row inside the current transaction (caller commits).
+    Uses an atomic INSERT ... ON CONFLICT DO UPDATE so concurrent requests don't lose increments.
+    """
+    day = (when or datetime.utcnow()).date()
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    table = DailyActivity.__table__
+    stmt = dialect_insert(table).values(
+        user_id=user_id, course_id=course_id, day=day,
+        study_seconds=study_seconds, quizzes=quizzes, flashcard_reviews=flashcard_reviews
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'course_id', 'day'],
+        set_={
+            'study_seconds': table.c.study_seconds + stmt.excluded.study_seconds,
+            'quizzes': table.c.quizzes + stmt.excluded.quizzes,
+            'flashcard_reviews': table.c.flashcard_reviews + stmt.excluded.flashcard_reviews,
+        }
+    )
+    db.session.execute(stmt)
+
+def bulk_insert(model, rows, returning_ids=False):
+    """
+    Insert many rows in one executemany, bypassing per-object unit-of-work bookkeeping.
+    With returning_ids, returns the new primary keys (in row order) via RETURNING where the
+    driver supports it; otherwise returns None.
+    """
+    if not rows:
+        return [] if returning_ids else None
+    stmt = insert(model)
+    if returning_ids and db.engine.dialect.insert_executemany_returning:
+        return list(db.session.scalars(stmt.returning(model.id, sort_by_parameter_order=True), rows))
+    db.session.execute(stmt, rows)
+    return None
+
+def create_notification(user_id, message, type, course_id=None):
+    """
+    Queue a notification for the current request. Queued notifications are written in the
+    request's own next commit, or in one batch at the end of the request if it doesn't commit again.
+    Outside a request (CLI, background work) the notification is written immediately.
+    """
+    create_notifications([user_id], message, type, course_id)
+
+def create_notifications(user_ids, message, type, course_id=None):
+    """Fan out the same notification to many users with a single bulk insert"""
+    rows = [{
+        "user_id": user_id,
+        "message": message[:500],
+        "type": type,
+        "course_id": course_id,
+        "is_read": False
+    } for user_id in user_ids]
+    if has_request_context():
+        g.setdefault('pending_notifications', []).extend(rows)
+        return
+    _insert_notifications(db.session, rows)
     db.session.commit()
 
+def serialize_notification(n):
+    return {
+        "id": n.id,
+        "user_id": n.user_id,
+        "message": n.message,
+        "type": n.type,
+        "is_read": n.is_read,
+        "created_at": n.created_at.isoformat() if n.created_at else None,
+        "course_id": n.course_id
+    }
+
+def _insert_notifications(executor, rows):
+    """Insert notification rows; on PostgreSQL also NOTIFY every worker's stream listener on commit"""
+    if db.engine.dialect.name != 'postgresql':
+        executor.execute(insert(Notification), rows)
+        return
+    created = executor.execute(
+        insert(Notification).returning(Notification.id, Notification.created_at, sort_by_parameter_order=True),
+        rows
+    ).all()
+    for row, (notification_id, created_at) in zip(rows, created):
+        payload = dict(row, id=notification_id, created_at=created_at.isoformat() if created_at else None)
+        executor.execute(
+            db.text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": notification_stream.NOTIFY_CHANNEL, "payload": json.dumps(payload)}
+        )
+
+@event.listens_for(db.session, 'before_commit')
+def _notifications_before_commit(session):
+    # Ride along in the route's own transaction
+    rows = g.pop('pending_notifications', None) if has_request_context() else None
+    if rows:
+        _insert_notifications(session, rows)
+
+@app.teardown_request
+def _flush_pending_notifications(exc):
+    # Notifications queued after the route's last commit (or after a rollback): one batch,
+    # on a separate connection so uncommitted session state is never committed by accident
+    rows = g.pop('pending_notifications', None)
+    if rows:
+        try:
+            with db.engine.begin() as conn:
+                _insert_notifications(conn, rows)
+        except Exception as e:
+            logger.error(f"Failed to write notifications: {e}")
+
 # --- Database CLI Command ---
 @app.cli.command("init-db")
 def init_db_command():
@@ -281,12 +469,257 @@ def init_db_command():
         db.create_all()
     print("Initialized the database.")
 
+@app.cli.command("backfill-daily-activity")
+def backfill_daily_activity_command():
+    """Rebuilds the daily_activity rollup from study sessions, quizzes and flashcard reviews."""
+    with app.app_context():
+        rows = {}
+        def add(user_id, course_id, day, field, value):
+            key = (user_id, course_id, as_date(day))
+            row = rows.setdefault(key, {"study_seconds": 0, "quizzes": 0, "flashcard_reviews": 0})
+            row[field] += int(value or 0)
+
+        for user_id, course_id, day, seconds in db.session.query(
+            StudySession.user_id, StudySession.course_id, activity_day(StudySession.created_at),
+            db.func.sum(StudySession.duration_seconds)
+        ).group_by(StudySession.user_id, StudySession.course_id, activity_day(StudySession.created_at)):
+            add(user_id, course_id, day, "study_seconds", seconds)
+
+        for user_id, course_id, day, count in db.session.query(
+            QuizAttempt.user_id, QuizAttempt.course_id, activity_day(QuizAttempt.timestamp),
+            db.func.count(QuizAttempt.id)
+        ).group_by(QuizAttempt.user_id, QuizAttempt.course_id, activity_day(QuizAttempt.timestamp)):
+            add(user_id, course_id, day, "quizzes", count)
+
+        # Only the latest review of each card is stored, so older reviews can't be recovered
+        for user_id, course_id, day, count in db.session.query(
+            FlashcardDeck.user_id, FlashcardDeck.course_id, activity_day(Flashcard.last_reviewed),
+            db.func.count(Flashcard.id)
+        ).join(Flashcard, Flashcard.deck_id == FlashcardDeck.id).filter(
+            Flashcard.last_reviewed != None
+        ).group_by(FlashcardDeck.user_id, FlashcardDeck.course_id, activity_day(Flashcard.last_reviewed)):
+            add(user_id, course_id, day, "flashcard_reviews", count)
+
+        DailyActivity.query.delete()
+        db.session.bulk_insert_mappings(DailyActivity, [
+            dict(values, user_id=user_id, course_id=course_id, day=day)
+            for (user_id, course_id, day), values in rows.items()
+        ])
+        db.session.commit()
+    print(f"Backfilled {len(rows)} daily activity rows.")
+
+@app.cli.command("llm-cache-stats")
+def llm_cache_stats_command():
+    """Prints LLM response cache size and per-feature hit rates."""
+    from llm_cache import get_llm_cache
+    print(json.dumps(get_llm_cache().stats(), indent=2))
+
+@app.cli.command("llm-cache-clear")
+def llm_cache_clear_command():
+    """Removes all cached LLM responses."""
+    from llm_cache import get_llm_cache
+    get_llm_cache().clear()
+    print("Cleared the LLM response cache.")
+
+@app.cli.command("source-cache-clear")
+def source_cache_clear_command():
+    """Removes all cached page extractions and transcripts."""
+    from source_cache import SourceCache
+    SourceCache().clear()
+    print("Cleared the source cache.")
+
+@app.cli.command("worker-memory")
+@click.argument("master_pid", type=int)
+def worker_memory_command(master_pid):
+    """Prints unique vs shared memory of a gunicorn master and each of its workers."""
+    print(format_memory(f"master {master_pid}", process_memory(master_pid)))
+    try:
+        with open(f'/proc/{master_pid}/task/{master_pid}/children') as f:
+            worker_pids = [int(pid) for pid in f.read().split()]
+    except OSError:
+        worker_pids = []
+    for pid in worker_pids:
+        print(format_memory(f"worker {pid}", process_memory(pid)))
+
+def check_vector_stores(repair=False, checksums=False):
+    """
+    Checks every document's vector store against its manifest and finds store files no
+    document uses. With repair: documents whose store is missing or inconsistent (or whose
+    processing was interrupted) are marked as failed and their owners notified, legacy stores
+    get a manifest, and orphaned stores and stale temp files older than the grace period are
+    deleted. Returns a report dict.
+    """
+    from store_integrity import scan_files, verify_store, backfill_manifest, remove_store, ORPHAN_GRACE_SECONDS
+    report = {"ok": 0, "no_manifest": 0, "missing": [], "corrupt": [], "interrupted": [], "orphaned": [], "temp_files": []}
+    with app.app_context():
+        cutoff = datetime.utcnow() - timedelta(seconds=ORPHAN_GRACE_SECONDS)
+        referenced = set()
+        damaged = []
+        for document in Document.query.order_by(Document.id):
+            if not document.vector_store_path:
+                if document.processing_status != 'error' and document.uploaded_at and document.uploaded_at < cutoff:
+                    report["interrupted"].append({"document_id": document.id})
+                    damaged.append((document, "Processing was interrupted before the document was indexed"))
+                continue
+            path = os.path.abspath(document.vector_store_path)
+            referenced.add(path)
+            status, detail = verify_store(path, checksums)
+            if status == 'ok':
+                report["ok"] += 1
+            elif status == 'no_manifest':
+                report["no_manifest"] += 1
+                if repair:
+                    backfill_manifest(path)
+            else:
+                report[status].append({"document_id": document.id, "path": path, "detail": detail})
+                damaged.append((document, f"The search index of this document is damaged ({detail})"))
+
+        for vector_path, files, age in scan_files(rag_engine.VECTOR_STORES_DIR):
+            if vector_path in referenced or age < ORPHAN_GRACE_SECONDS:
+                continue
+            report["temp_files" if vector_path is None else "orphaned"].append(vector_path or files[0])
+            if repair:
+                for path in files:
+                    os.remove(path)
+
+        if repair:
+            for document, message in damaged:
+                if document.vector_store_path:
+                    remove_store(document.vector_store_path)
+                    document.vector_store_path = ""
+                rag_engine.remove_from_course_store(document.course_id, [document.id])
+                document.processing_status = 'error'
+                document.error_message = f"{message}. Refresh or re-add the source."
+                create_notification(document.course.user_id,
+                                    f"'{document.filename}' needs to be re-added: {message.lower()}.",
+                                    "warning", document.course_id)
+            db.session.commit()
+
+        # Course segment stores must not keep serving documents that are gone
+        live = {}
+        for document_id, course_id in db.session.query(Document.id, Document.course_id).filter(
+                Document.vector_store_path != None, Document.vector_store_path != ''):
+            live.setdefault(course_id, set()).add(document_id)
+        report["course_store_stale"] = []
+        for course_id in _course_store_ids():
+            stale = rag_engine.course_store(course_id).document_ids() - live.get(course_id, set())
+            report["course_store_stale"] += sorted(stale)
+            if repair and stale:
+                rag_engine.remove_from_course_store(course_id, stale)
+    return report
+
+def _course_store_ids():
+    """Ids of the courses that have a segment store on disk"""
+    if not os.path.isdir(rag_engine.VECTOR_STORES_DIR) or not rag_engine.COURSE_STORE_ENABLED:
+        return []
+    return [int(name[len('course_'):]) for name in os.listdir(rag_engine.VECTOR_STORES_DIR)
+            if re.fullmatch(r'course_\d+', name)
+            and os.path.exists(os.path.join(rag_engine.VECTOR_STORES_DIR, name, 'segments', 'manifest.json'))]
+
+@app.cli.command("vector-store-check")
+@click.option("--repair", is_flag=True, help="Fix what is found instead of only reporting it.")
+@click.option("--checksums", is_flag=True, help="Also verify file checksums (reads every store).")
+def vector_store_check_command(repair, checksums):
+    """Finds missing, inconsistent and orphaned vector stores."""
+    report = check_vector_stores(repair, checksums)
+    print(json.dumps(report, indent=2))
+    problems = any(report[key] for key in ("missing", "corrupt", "interrupted", "orphaned", "temp_files", "course_store_stale"))
+    if problems and not repair:
+        raise SystemExit(1)
+
+def build_course_stores(course_id=None, batch_documents=200, rebuild=False):
+    """
+    Adds documents that are missing from their course's segment store (e.g. stores written
+    before segment stores existed), reading their own vector files. rebuild=True first
+    tombstones every document, so all are re-read from their files. Returns {course_id: added}.
+    """
+    added = {}
+    with app.app_context():
+        query = db.session.query(Document.course_id, Document.id, Document.vector_store_path).filter(
+            Document.vector_store_path != None, Document.vector_store_path != '')
+        if course_id is not None:
+            query = query.filter(Document.course_id == course_id)
+        by_course = {}
+        for cid, document_id, path in query.order_by(Document.course_id, Document.id):
+            by_course.setdefault(cid, []).append({"id": document_id, "vector_store_path": path})
+        db.session.remove()
+    for cid, documents in by_course.items():
+        store = rag_engine.course_store(cid)
+        if not store:
+            break
+        indexed = store.document_ids()
+        if rebuild and indexed:
+            # Queries read the documents' own files until their rows are appended again
+            rag_engine.remove_from_course_store(cid, sorted(indexed))
+            indexed = store.document_ids()
+        missing = [d for d in documents if d["id"] not in indexed]
+        for start in range(0, len(missing), batch_documents):
+            batch = [(doc["id"], embeddings, chunks) for doc, embeddings, chunks
+                     in rag_engine.load_document_vectors(cid, missing[start:start + batch_documents])]
+            # A document refreshed meanwhile already has newer rows in the store
+            rag_engine.index_in_course_store(cid, batch, replace=False)
+        if missing:
+            added[cid] = len(missing)
+    return added
+
+@app.cli.command("course-store-build")
+@click.option("--course-id", type=int, default=None, help="Only this course.")
+@click.option("--rebuild", is_flag=True, help="Re-index every document from its own files.")
+def course_store_build_command(course_id, rebuild):
+    """Indexes documents missing from their course's segment store."""
+    added = build_course_stores(course_id, rebuild=rebuild)
+    print(f"Indexed {sum(added.values())} documents in {len(added)} course stores.")
+
+@app.cli.command("course-store-compact")
+@click.option("--course-id", type=int, default=None, help="Only this course.")
+def course_store_compact_command(course_id):
+    """Merges each course store's segments and drops tombstoned rows."""
+    for cid in ([course_id] if course_id is not None else _course_store_ids()):
+        report = rag_engine.course_store(cid).compact()
+        print(f"course {cid}: {report or 'nothing to compact'}")
+
+def preload_for_fork(hot_courses=0):
+    """
+    Loads the embedding model, and the vector stores of the most active courses, in the
+    gunicorn master so forked workers share them copy-on-write. Returns a summary line.
+    """
+    rag_engine.preload_embedding_model()
+    if not hot_courses:
+        return "preloaded the embedding model"
+    with app.app_context():
+        since = datetime.utcnow() - timedelta(days=7)
+        course_ids = [course_id for course_id, in db.session.query(ChatMessage.course_id)
+                      .filter(ChatMessage.created_at >= since)
+                      .group_by(ChatMessage.course_id)
+                      .order_by(db.func.count(ChatMessage.id).desc())
+                      .limit(hot_courses)]
+        documents = db.session.query(Document.id, Document.vector_store_path).filter(
+            Document.course_id.in_(course_ids),
+            Document.vector_store_path != None,
+            Document.vector_store_path != ''
+        ).all()
+        db.session.remove()
+        # Connections must not be shared with the forked workers
+        db.engine.dispose()
+    # Course segment stores first; only documents they don't cover are read from their own files
+    loaded, covered = rag_engine.preload_course_stores(course_ids)
+    loaded += rag_engine.preload_vector_stores([path for document_id, path in documents if document_id not in covered])
+    return (f"preloaded the embedding model and {len(documents)} documents "
+            f"({loaded / 1024 / 1024:.1f} MiB) from {len(course_ids)} courses")
+
 # --- Health Check Endpoint (for Docker) ---
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint for Docker/Kubernetes."""
     return jsonify({"status": "healthy", "service": "intelli-tutor-backend"}), 200
 
+# --- Metrics Endpoint (Prometheus scrape target) ---
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text-format metrics, aggregated across gunicorn workers when PROMETHEUS_MULTIPROC_DIR is set."""
+    body, content_type = metrics.render_metrics()
+    return Response(body, mimetype=content_type)
+
 # --- API Endpoints ---
 @app.route('/register', methods=['POST'])
 @limiter.limit("5 per minute")
@@ -563,6 +996,23 @@ def get_course(course_id):
     return jsonify(course_data), 200
 
 
+def _stored_pdf_path(course_id, filename):
+    """
+    Absolute path for a new PDF in the course's upload folder. The random prefix keeps two
+    uploads with the same name from overwriting (and, on failure, deleting) each other's file.
+    """
+    course_upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], f"course_{course_id}")
+    os.makedirs(course_upload_dir, exist_ok=True)
+    return os.path.abspath(os.path.join(course_upload_dir, f"{secrets.token_hex(4)}_{filename}"))
+
+def _mark_document_failed(document, error):
+    """Record a failed single-source ingestion on its document row, if one was created"""
+    if document is None or document.id is None:
+        return
+    document.processing_status = 'error'
+    document.error_message = str(error)
+    db.session.commit()
+
 @app.route('/courses/<int:course_id>/add-source', methods=['POST'])
 @jwt_required()
 def add_source(course_id):
@@ -574,107 +1024,437 @@ def add_source(course_id):
 
     source_type = request.form.get('source_type')
     
-    if source_type == 'pdf':
-        if 'file' not in request.files:
-            return jsonify({"msg": "No file part"}), 400
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({"msg": "No selected file"}), 400
-
-        if file and file.filename.endswith('.pdf'):
-            filename = secure_filename(file.filename)
-            course_upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], f"course_{course_id}")
-            os.makedirs(course_upload_dir, exist_ok=True)
-            filepath = os.path.abspath(os.path.join(course_upload_dir, filename))
-            file.save(filepath)
+    if source_type not in ('pdf', 'url', 'youtube'):
+        return jsonify({"msg": "Invalid source type specified"}), 400
 
+    # Counted in the ingestion queue depth gauge while parsing/embedding runs
+    with metrics.track_ingestion(source_type):
+        if source_type == 'pdf':
+            if 'file' not in request.files:
+                return jsonify({"msg": "No file part"}), 400
+            file = request.files['file']
+            if file.filename == '':
+                return jsonify({"msg": "No selected file"}), 400
+
+            if file and file.filename.endswith('.pdf'):
+                filename = secure_filename(file.filename)
+                filepath = _stored_pdf_path(course_id, filename)
+                file.save(filepath)
+
+                new_document = None
+                try:
+                    chunks = run_blocking(rag_engine.process_pdf_and_get_chunks, filepath)
+                    new_document = Document(
+                        filename=filename,
+                        filepath=filepath,
+                        vector_store_path="",
+                        course_id=course_id,
+                        source_type='pdf',
+                        processing_status='processing'
+                    )
+                    db.session.add(new_document)
+                    db.session.commit()
+
+                    vector_store_path = rag_engine.create_vector_store(chunks, course_id, new_document.id)
+                    new_document.vector_store_path = vector_store_path
+                    new_document.processing_status = 'ready'
+                    db.session.commit()
+                    create_notification(current_user_id, f"Document '{filename}' processed successfully!", "success", course_id)
+                    return jsonify({"msg": "PDF processed and indexed successfully"}), 200
+                except Exception as e:
+                    db.session.rollback()
+                    _mark_document_failed(new_document, e)
+                    if os.path.exists(filepath): os.remove(filepath)
+                    create_notification(current_user_id, f"Failed to process PDF '{filename}': {str(e)}", "error", course_id)
+                    return jsonify({"msg": f"Failed to process {filename}: {str(e)}"}), 500
+            else:
+                return jsonify({"msg": "Invalid file type. Only PDF is supported."}), 400
+
+        elif source_type == 'url':
+            url = request.form.get('url')
+            if not url:
+                return jsonify({"msg": "No URL provided"}), 400
+            if not rag_engine.is_supported_url(url):
+                return jsonify({"msg": "Only http and https URLs are supported."}), 400
+        
+            new_document = None
             try:
-                chunks = rag_engine.process_pdf_and_get_chunks(filepath)
+                chunks, title = run_blocking(rag_engine.process_url, url)
+                if not chunks:
+                    # Without chunks, process_url returns an error message (if any) in place of the title
+                    return jsonify({"msg": title or "Could not extract content from the URL."}), 400
+
                 new_document = Document(
-                    filename=filename,
-                    filepath=filepath,
+                    filename=title,
                     vector_store_path="",
                     course_id=course_id,
-                    source_type='pdf'
+                    source_type='url',
+                    source_url=url,
+                    processing_status='processing'
                 )
                 db.session.add(new_document)
                 db.session.commit()
 
                 vector_store_path = rag_engine.create_vector_store(chunks, course_id, new_document.id)
                 new_document.vector_store_path = vector_store_path
+                new_document.processing_status = 'ready'
                 db.session.commit()
-                create_notification(current_user_id, f"Document '{filename}' processed successfully!", "success", course_id)
-                return jsonify({"msg": "PDF processed and indexed successfully"}), 200
+                create_notification(current_user_id, f"URL '{title}' processed successfully!", "success", course_id)
+                return jsonify({"msg": "URL processed and indexed successfully"}), 200
             except Exception as e:
                 db.session.rollback()
-                if os.path.exists(filepath): os.remove(filepath)
-                create_notification(current_user_id, f"Failed to process PDF '{filename}': {str(e)}", "error", course_id)
-                return jsonify({"msg": f"Failed to process {filename}: {str(e)}"}), 500
-        else:
-            return jsonify({"msg": "Invalid file type. Only PDF is supported."}), 400
-
-    elif source_type == 'url':
-        url = request.form.get('url')
-        if not url:
-            return jsonify({"msg": "No URL provided"}), 400
+                _mark_document_failed(new_document, e)
+                create_notification(current_user_id, f"Failed to process URL: {str(e)}", "error", course_id)
+                return jsonify({"msg": f"Failed to process URL: {str(e)}"}), 500
+    
+        elif source_type == 'youtube':
+            url = request.form.get('url')
+            if not url:
+                return jsonify({"msg": "No URL provided"}), 400
+            if not rag_engine.is_supported_url(url):
+                return jsonify({"msg": "Only http and https URLs are supported."}), 400
         
+            new_document = None
+            try:
+                chunks, title = run_blocking(rag_engine.process_url, url)
+                if not chunks:
+                    # Without chunks, process_url returns an error message (if any) in place of the title
+                    return jsonify({"msg": title or "Could not extract content from the YouTube video."}), 400
+
+                new_document = Document(
+                    filename=title,
+                    vector_store_path="",
+                    course_id=course_id,
+                    source_type='youtube',
+                    source_url=url,
+                    processing_status='processing'
+                )
+                db.session.add(new_document)
+                db.session.commit()
+
+                vector_store_path = rag_engine.create_vector_store(chunks, course_id, new_document.id)
+                new_document.vector_store_path = vector_store_path
+                new_document.processing_status = 'ready'
+                db.session.commit()
+                create_notification(current_user_id, f"YouTube video '{title}' processed successfully!", "success", course_id)
+                return jsonify({"msg": "YouTube video processed and indexed successfully"}), 200
+            except Exception as e:
+                db.session.rollback()
+                _mark_document_failed(new_document, e)
+                create_notification(current_user_id, f"Failed to process YouTube video: {str(e)}", "error", course_id)
+                return jsonify({"msg": f"Failed to process YouTube video: {str(e)}"}), 500
+
+
+# --- Batch Ingestion ---
+INGEST_BATCH_MAX_SOURCES = int(os.environ.get('INGEST_BATCH_MAX_SOURCES', 50))
+# Sources parsed/downloaded at once across all running batches in this process
+INGEST_BATCH_WORKERS = int(os.environ.get('INGEST_BATCH_WORKERS', 4))
+# Parsed documents are embedded together once this many chunks are waiting
+INGEST_EMBED_BATCH_CHUNKS = int(os.environ.get('INGEST_EMBED_BATCH_CHUNKS', 512))
+
+_ingest_pool = None
+_ingest_pool_lock = threading.Lock()
+
+def _get_ingest_pool():
+    global _ingest_pool
+    with _ingest_pool_lock:
+        if _ingest_pool is None:
+            _ingest_pool = ThreadPoolExecutor(max_workers=INGEST_BATCH_WORKERS, thread_name_prefix='ingest')
+        return _ingest_pool
+
+def _parse_source(source_type, source):
+    """Parse one PDF path or URL into chunks; returns (chunks, title or None). Touches no database state."""
+    if source_type == 'pdf':
+        return rag_engine.process_pdf_and_get_chunks(source), None
+    chunks, title = rag_engine.process_url(source)
+    if not chunks:
+        # Without chunks, process_url returns an error message (if any) in place of the title
+        raise ValueError(title or "Could not extract content from the URL.")
+    return chunks, title
+
+def _run_ingestion_batch(batch_id, course_id, user_id):
+    """Thread target for one batch; documents left unfinished by an unexpected error are marked failed"""
+    with app.app_context():
         try:
-            chunks, title = rag_engine.process_url(url)
-            if not chunks:
-                return jsonify({"msg": "Could not extract content from the URL."}), 400
-
-            new_document = Document(
-                filename=title,
-                vector_store_path="",
-                course_id=course_id,
-                source_type='url',
-                source_url=url
-            )
-            db.session.add(new_document)
+            _ingest_batch_documents(batch_id, course_id, user_id)
+        except Exception as e:
+            logger.error(f"Ingestion batch {batch_id} failed: {e}")
+            db.session.rollback()
+            for document in Document.query.filter(Document.ingestion_batch_id == batch_id,
+                                                  Document.processing_status.in_(('pending', 'processing'))):
+                document.processing_status = 'error'
+                document.error_message = "Batch ingestion was interrupted"
+                metrics.INGESTION_QUEUE_DEPTH.labels(source_type=document.source_type).dec()
             db.session.commit()
 
-            vector_store_path = rag_engine.create_vector_store(chunks, course_id, new_document.id)
-            new_document.vector_store_path = vector_store_path
-            db.session.commit()
-            create_notification(current_user_id, f"URL '{title}' processed successfully!", "success", course_id)
-            return jsonify({"msg": "URL processed and indexed successfully"}), 200
+def _ingest_batch_documents(batch_id, course_id, user_id):
+    """
+    Parse every pending document of a batch on the shared ingest pool, then embed the
+    parsed documents together in large batches and save their vector stores.
+    Progress is kept in each document's processing_status.
+    """
+    documents = Document.query.filter_by(ingestion_batch_id=batch_id, processing_status='pending').all()
+    for document in documents:
+        document.processing_status = 'processing'
+    db.session.commit()
+
+    pool = _get_ingest_pool()
+    # Under gevent the pool's threads are greenlets, so the CPU-bound parsing is handed to
+    # native threads; otherwise run_blocking is a plain call
+    futures = {
+        pool.submit(run_blocking, _parse_source, d.source_type,
+                    d.filepath if d.source_type == 'pdf' else d.source_url): d.id
+        for d in documents
+    }
+    parsed = []  # (document_id, chunks) waiting to be embedded
+    waiting_chunks = 0
+
+    def finish(document, error=None):
+        if error:
+            document.processing_status = 'error'
+            document.error_message = str(error)[:500]
+            if document.filepath and os.path.exists(document.filepath):
+                os.remove(document.filepath)
+        else:
+            document.processing_status = 'ready'
+        metrics.INGESTION_QUEUE_DEPTH.labels(source_type=document.source_type).dec()
+
+    def embed_parsed():
+        try:
+            paths = rag_engine.create_vector_stores(parsed, course_id)
         except Exception as e:
-            db.session.rollback()
-            create_notification(current_user_id, f"Failed to process URL: {str(e)}", "error", course_id)
-            return jsonify({"msg": f"Failed to process URL: {str(e)}"}), 500
-    
-    elif source_type == 'youtube':
-        url = request.form.get('url')
-        if not url:
-            return jsonify({"msg": "No URL provided"}), 400
-        
+            paths = {document_id: None for document_id, _ in parsed}
+            print(f"Error embedding ingestion batch {batch_id}: {e}")
+        for document_id, path in paths.items():
+            document = db.session.get(Document, document_id)
+            document.vector_store_path = path or ""
+            finish(document, None if path else "Failed to create the vector store")
+        db.session.commit()
+        parsed.clear()
+
+    for future in as_completed(futures):
+        document = db.session.get(Document, futures[future])
         try:
-            chunks, title = rag_engine.process_url(url)
-            if not chunks:
-                return jsonify({"msg": "Could not extract content from the YouTube video."}), 400
-
-            new_document = Document(
-                filename=title,
-                vector_store_path="",
-                course_id=course_id,
-                source_type='youtube',
-                source_url=url
-            )
-            db.session.add(new_document)
+            chunks, title = future.result()
+        except Exception as e:
+            finish(document, e)
             db.session.commit()
+            continue
+        if title:
+            document.filename = title[:150]
+        parsed.append((document.id, chunks))
+        waiting_chunks += len(chunks)
+        if waiting_chunks >= INGEST_EMBED_BATCH_CHUNKS:
+            embed_parsed()
+            waiting_chunks = 0
+    if parsed:
+        embed_parsed()
+
+    status = ingestion_batch_status(course_id, batch_id)
+    counts = status["counts"]
+    course = db.session.get(Course, course_id)
+    create_notification(
+        user_id,
+        f"Batch import into '{course.name}' finished: {counts['ready']} of {status['total']} sources processed"
+        + (f", {counts['error']} failed" if counts['error'] else ""),
+        "warning" if counts['error'] else "success",
+        course_id
+    )
 
-            vector_store_path = rag_engine.create_vector_store(chunks, course_id, new_document.id)
-            new_document.vector_store_path = vector_store_path
-            db.session.commit()
-            create_notification(current_user_id, f"YouTube video '{title}' processed successfully!", "success", course_id)
-            return jsonify({"msg": "YouTube video processed and indexed successfully"}), 200
-        except Exception as e:
-            db.session.rollback()
-            create_notification(current_user_id, f"Failed to process YouTube video: {str(e)}", "error", course_id)
-            return jsonify({"msg": f"Failed to process YouTube video: {str(e)}"}), 500
-            
-    else:
-        return jsonify({"msg": "Invalid source type specified"}), 400
+def ingestion_batch_status(course_id, batch_id):
+    """Aggregated progress of one ingestion batch, or None if it does not exist"""
+    documents = Document.query.filter_by(course_id=course_id, ingestion_batch_id=batch_id).order_by(Document.id).all()
+    if not documents:
+        return None
+    counts = {"pending": 0, "processing": 0, "ready": 0, "error": 0}
+    for document in documents:
+        counts[document.processing_status] = counts.get(document.processing_status, 0) + 1
+    done = counts["ready"] + counts["error"]
+    return {
+        "batch_id": batch_id,
+        "state": "complete" if done == len(documents) else "running",
+        "total": len(documents),
+        "counts": counts,
+        "progress": round(done / len(documents), 3),
+        "documents": [{
+            "id": d.id,
+            "filename": d.filename,
+            "source_type": d.source_type,
+            "processing_status": d.processing_status,
+            "error_message": d.error_message
+        } for d in documents]
+    }
+
+@app.route('/courses/<int:course_id>/sources/batch', methods=['POST'])
+@jwt_required()
+def add_sources_batch(course_id):
+    """
+    Queue many PDFs ('files' parts) and URLs ('urls' form fields or a JSON 'urls' list) for
+    ingestion in one request. Returns 202 with the batch's aggregated status; poll
+    GET /courses/<id>/sources/batch/<batch_id> for progress.
+    """
+    current_user_id = int(get_jwt_identity())
+    course = Course.query.filter_by(id=course_id, user_id=current_user_id).first()
+    if not course:
+        return api_error("Course not found", ErrorCode.NOT_FOUND, 404)
+
+    files = [f for f in request.files.getlist('files') if f and f.filename]
+    urls = (request.get_json(silent=True) or {}).get('urls', []) if request.is_json else request.form.getlist('urls')
+    urls = [u.strip() for u in urls if isinstance(u, str) and u.strip()]
+
+    if not files and not urls:
+        return api_error("No files or URLs provided", ErrorCode.VALIDATION_ERROR)
+    if len(files) + len(urls) > INGEST_BATCH_MAX_SOURCES:
+        return api_error(f"At most {INGEST_BATCH_MAX_SOURCES} sources per batch", ErrorCode.VALIDATION_ERROR,
+                         details={"max_sources": INGEST_BATCH_MAX_SOURCES})
+    invalid = [f.filename for f in files if not f.filename.lower().endswith('.pdf')]
+    if invalid:
+        return api_error("Invalid file type. Only PDF is supported.", ErrorCode.VALIDATION_ERROR,
+                         details={"files": invalid})
+    invalid = [u for u in urls if not rag_engine.is_supported_url(u)]
+    if invalid:
+        return api_error("Only http and https URLs are supported.", ErrorCode.VALIDATION_ERROR,
+                         details={"urls": invalid})
+
+    batch_id = secrets.token_hex(16)
+    documents = []
+    for file in files:
+        filename = secure_filename(file.filename)
+        filepath = _stored_pdf_path(course_id, filename)
+        file.save(filepath)
+        documents.append(Document(filename=filename, filepath=filepath, vector_store_path="", course_id=course_id,
+                                  source_type='pdf', ingestion_batch_id=batch_id))
+    for url in urls:
+        source_type = 'youtube' if re.match(rag_engine.YOUTUBE_URL_REGEX, url) else 'url'
+        documents.append(Document(filename=url[:150], vector_store_path="", course_id=course_id,
+                                  source_type=source_type, source_url=url, ingestion_batch_id=batch_id))
+    db.session.add_all(documents)
+    db.session.commit()
+    for document in documents:
+        metrics.INGESTION_QUEUE_DEPTH.labels(source_type=document.source_type).inc()
+
+    threading.Thread(target=_run_ingestion_batch, args=(batch_id, course_id, current_user_id),
+                     daemon=True, name=f'ingest-batch-{batch_id[:8]}').start()
+    return jsonify(ingestion_batch_status(course_id, batch_id)), 202
+
+@app.route('/courses/<int:course_id>/sources/batch/<batch_id>', methods=['GET'])
+@jwt_required()
+def get_sources_batch(course_id, batch_id):
+    """Aggregated progress of a batch ingestion"""
+    current_user_id = int(get_jwt_identity())
+    course = Course.query.filter_by(id=course_id, user_id=current_user_id).first()
+    if not course:
+        return api_error("Course not found", ErrorCode.NOT_FOUND, 404)
+    status = ingestion_batch_status(course_id, batch_id)
+    if status is None:
+        return api_error("Batch not found", ErrorCode.NOT_FOUND, 404)
+    return jsonify(status), 200
+
+
+# --- Resumable Uploads ---
+# Large PDFs are uploaded as numbered parts (see uploads.py) and ingested once complete
+def _owned_upload(course_id, upload_id):
+    """Course and upload metadata for the current user; raises uploads.UploadError(404) otherwise"""
+    current_user_id = int(get_jwt_identity())
+    if not Course.query.filter_by(id=course_id, user_id=current_user_id).first():
+        raise uploads.UploadError("Course not found", 404)
+    return uploads.load_upload(app.config['INCOMING_UPLOAD_FOLDER'], upload_id, current_user_id, course_id)
+
+def _upload_error(e):
+    code = ErrorCode.NOT_FOUND if e.status == 404 else ErrorCode.VALIDATION_ERROR
+    return api_error(str(e), code, e.status, details=e.details)
+
+@app.route('/courses/<int:course_id>/uploads', methods=['POST'])
+@jwt_required()
+def start_upload(course_id):
+    """
+    Start a resumable PDF upload. JSON: filename, size (bytes), optional part_size and
+    sha256 of the whole file. Returns 201 with the upload_id and the part layout.
+    """
+    current_user_id = int(get_jwt_identity())
+    course = Course.query.filter_by(id=course_id, user_id=current_user_id).first()
+    if not course:
+        return api_error("Course not found", ErrorCode.NOT_FOUND, 404)
+
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename') or '')
+    if not filename.lower().endswith('.pdf'):
+        return api_error("Invalid file type. Only PDF is supported.", ErrorCode.VALIDATION_ERROR)
+    try:
+        size = int(data.get('size'))
+        part_size = int(data['part_size']) if data.get('part_size') else None
+    except (TypeError, ValueError):
+        return api_error("size and part_size must be integers", ErrorCode.VALIDATION_ERROR)
+    sha256 = data.get('sha256').lower() if isinstance(data.get('sha256'), str) else None
+
+    try:
+        meta = uploads.create_upload(app.config['INCOMING_UPLOAD_FOLDER'], current_user_id, course_id,
+                                     filename, size, part_size, sha256)
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return jsonify(uploads.upload_status(app.config['INCOMING_UPLOAD_FOLDER'], meta)), 201
+
+@app.route('/courses/<int:course_id>/uploads/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_upload(course_id, upload_id):
+    """Received and missing parts of an upload, for resuming after an interruption"""
+    try:
+        meta = _owned_upload(course_id, upload_id)
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return jsonify(uploads.upload_status(app.config['INCOMING_UPLOAD_FOLDER'], meta)), 200
+
+@app.route('/courses/<int:course_id>/uploads/<upload_id>/parts/<int:part_number>', methods=['PUT'])
+@jwt_required()
+def upload_part(course_id, upload_id, part_number):
+    """
+    Store one part; the request body is the raw bytes and is streamed to disk. An optional
+    X-Part-SHA256 header is verified. Re-sending a part replaces it.
+    """
+    try:
+        meta = _owned_upload(course_id, upload_id)
+        part = uploads.write_part(app.config['INCOMING_UPLOAD_FOLDER'], meta, part_number,
+                                  request.stream, request.headers.get('X-Part-SHA256'))
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return jsonify(part), 200
+
+@app.route('/courses/<int:course_id>/uploads/<upload_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_upload(course_id, upload_id):
+    """
+    Assemble the parts (checking the whole-file sha256 if one was given) and queue the PDF
+    for ingestion. Returns 202 with the same status as a batch ingestion of one file;
+    poll GET /courses/<id>/sources/batch/<upload_id> for progress.
+    """
+    current_user_id = int(get_jwt_identity())
+    try:
+        meta = _owned_upload(course_id, upload_id)
+        filepath = _stored_pdf_path(course_id, meta["filename"])
+        uploads.assemble(app.config['INCOMING_UPLOAD_FOLDER'], meta, filepath)
+    except uploads.UploadError as e:
+        return _upload_error(e)
+
+    document = Document(filename=meta["filename"], filepath=filepath, vector_store_path="", course_id=course_id,
+                        source_type='pdf', ingestion_batch_id=upload_id)
+    db.session.add(document)
+    db.session.commit()
+    metrics.INGESTION_QUEUE_DEPTH.labels(source_type='pdf').inc()
+
+    threading.Thread(target=_run_ingestion_batch, args=(upload_id, course_id, current_user_id),
+                     daemon=True, name=f'ingest-upload-{upload_id[:8]}').start()
+    return jsonify(ingestion_batch_status(course_id, upload_id)), 202
+
+@app.route('/courses/<int:course_id>/uploads/<upload_id>', methods=['DELETE'])
+@jwt_required()
+def abort_upload(course_id, upload_id):
+    """Abandon an upload and delete the parts received so far"""
+    try:
+        meta = _owned_upload(course_id, upload_id)
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    uploads.discard(app.config['INCOMING_UPLOAD_FOLDER'], meta)
+    return jsonify({"msg": "Upload aborted"}), 200
 
 
 @app.route('/courses/<int:course_id>/chat', methods=['POST'])
@@ -685,6 +1465,7 @@ def chat_with_course(course_id):
     question = sanitize_input(data.get('question'))
     document_ids = data.get('document_ids') # Optional list of document IDs
     stream = data.get('stream', False)  # Enable streaming if requested
+    include_timing = data.get('include_timing', False)  # Emit a final SSE 'timing' event
 
     if not question:
         return api_error("Question is required", ErrorCode.VALIDATION_ERROR)
@@ -719,7 +1500,8 @@ def chat_with_course(course_id):
         docs_data = [{
             'id': d.id,
             'filename': d.filename,
-            'vector_store_path': d.vector_store_path
+            'vector_store_path': d.vector_store_path,
+            'source_url': d.source_url
         } for d in documents_to_search]
         
         def generate():
@@ -729,6 +1511,8 @@ def chat_with_course(course_id):
                         # Final response with sources
                         sources = chunk_data.get('sources', [])
                         yield f"data: {json.dumps({'type': 'sources', 'sources': sources})}\n\n"
+                        if include_timing and chunk_data.get('timing'):
+                            yield f"data: {json.dumps({'type': 'timing', 'timing': chunk_data['timing']})}\n\n"
                     else:
                         # Text chunk
                         yield f"data: {json.dumps({'type': 'chunk', 'content': chunk_data})}\n\n"
@@ -820,9 +1604,6 @@ def delete_course(course_id):
         return jsonify({"msg": "Unauthorized: You are not the owner of this course"}), 403
 
     try:
-        # Create notification BEFORE deleting the course
-        create_notification(current_user_id, f"Course '{course.name}' has been deleted.", "info", course_id=course.id)
-
         # Clean up directories
         course_upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], f"course_{course_id}")
         course_vector_dir = os.path.join(rag_engine.VECTOR_STORES_DIR, f"course_{course_id}")
@@ -835,6 +1616,8 @@ def delete_course(course_id):
             import shutil
             shutil.rmtree(course_vector_dir)
 
+        # Written in the same commit as the delete; not linked to the course, which is going away
+        create_notification(current_user_id, f"Course '{course.name}' has been deleted.", "info")
         db.session.delete(course)
         db.session.commit()
 
@@ -870,8 +1653,9 @@ def delete_document(course_id, document_id):
         if os.path.exists(document.filepath):
             os.remove(document.filepath)
 
-        # 2. Delete the vector store files
+        # 2. Delete the vector store files and tombstone the document in the course store
         rag_engine.delete_document_from_course(document.vector_store_path)
+        rag_engine.remove_from_course_store(course_id, [document.id])
 
         # 3. Delete the document from the database
         db.session.delete(document)
@@ -888,6 +1672,106 @@ def delete_document(course_id, document_id):
         return jsonify({"msg": "An error occurred during deletion."}), 500
 
 
+@app.route('/courses/<int:course_id>/documents/<int:document_id>/refresh', methods=['POST'])
+@jwt_required()
+def refresh_document(course_id, document_id):
+    """
+    Re-index a document in place, keeping its id so chat citations stay valid. URL and
+    YouTube sources are re-extracted; a PDF is replaced by the uploaded 'file' part or a
+    completed resumable upload ('upload_id'). Only new or changed chunks are embedded.
+    """
+    current_user_id = int(get_jwt_identity())
+    course = Course.query.filter_by(id=course_id, user_id=current_user_id).first()
+    if not course:
+        return api_error("Course not found", ErrorCode.NOT_FOUND, 404)
+    document = Document.query.filter_by(id=document_id, course_id=course_id).first()
+    if not document:
+        return api_error("Document not found", ErrorCode.NOT_FOUND, 404)
+    if document.processing_status in ('pending', 'processing'):
+        return api_error("Document is still being processed", ErrorCode.VALIDATION_ERROR, 409)
+
+    new_filepath = None
+    if document.source_type == 'pdf':
+        course_upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], f"course_{course_id}")
+        os.makedirs(course_upload_dir, exist_ok=True)
+        # A new file named after the document, so it can't clobber another document's PDF; the
+        # current file stays in place until the refresh is committed
+        staging = os.path.abspath(os.path.join(course_upload_dir, f"doc_{document_id}_{secrets.token_hex(4)}.pdf"))
+        file = request.files.get('file')
+        upload_id = request.form.get('upload_id') or (request.get_json(silent=True) or {}).get('upload_id')
+        if file and file.filename:
+            if not file.filename.lower().endswith('.pdf'):
+                return api_error("Invalid file type. Only PDF is supported.", ErrorCode.VALIDATION_ERROR)
+            file.save(staging)
+            new_filename = secure_filename(file.filename)
+        elif upload_id:
+            try:
+                meta = _owned_upload(course_id, upload_id)
+                uploads.assemble(app.config['INCOMING_UPLOAD_FOLDER'], meta, staging)
+            except uploads.UploadError as e:
+                return _upload_error(e)
+            new_filename = meta["filename"]
+        else:
+            return api_error("A replacement PDF ('file' or 'upload_id') is required", ErrorCode.VALIDATION_ERROR)
+        new_filepath = staging
+
+    old_vector_store_path = document.vector_store_path
+    with metrics.track_ingestion(document.source_type):
+        try:
+            if new_filepath:
+                chunks, title = run_blocking(rag_engine.process_pdf_and_get_chunks, staging), new_filename
+            else:
+                chunks, title = run_blocking(rag_engine.process_url, document.source_url, revalidate=True)
+            if not chunks:
+                raise ValueError(title or "Could not extract content from the source.")
+            vector_store_path, stats = rag_engine.refresh_vector_store(chunks, course_id, document.id,
+                                                                      old_vector_store_path)
+            if not vector_store_path:
+                raise ValueError("Failed to create the vector store")
+        except Exception as e:
+            if new_filepath and os.path.exists(staging):
+                os.remove(staging)
+            logger.error(f"Refreshing document {document_id} failed: {e}")
+            return api_error(f"Failed to refresh '{document.filename}': {e}", ErrorCode.PROCESSING_ERROR, 500)
+
+    old_filepath = document.filepath
+    if new_filepath:
+        document.filepath = new_filepath
+    document.filename = (title or document.filename)[:150]
+    document.vector_store_path = vector_store_path
+    document.processing_status = 'ready'
+    document.error_message = None
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        if new_filepath and os.path.exists(new_filepath):
+            os.remove(new_filepath)
+        if vector_store_path != old_vector_store_path:
+            rag_engine.delete_document_from_course(vector_store_path)
+            # The segment store may already hold the new rows; queries fall back to the old files
+            rag_engine.remove_from_course_store(course_id, [document.id])
+        logger.error(f"Saving the refresh of document {document_id} failed: {e}")
+        return api_error(f"Failed to refresh '{document.filename}'", ErrorCode.SERVER_ERROR, 500)
+    # Readers switch to the new store and file with the commit above; only then are the old ones removed
+    if old_vector_store_path != vector_store_path:
+        rag_engine.delete_document_from_course(old_vector_store_path)
+    if new_filepath and old_filepath and old_filepath != new_filepath and os.path.exists(old_filepath):
+        os.remove(old_filepath)
+
+    create_notification(current_user_id, f"Document '{document.filename}' was refreshed: "
+                        f"{stats['embedded']} new or changed chunks, {stats['removed']} removed.", "success", course_id)
+    return jsonify({"id": document.id, "filename": document.filename, **stats}), 200
+
+
+def _use_cache(data):
+    """Whether a generation request may be served from the LLM cache ("use_cache": false forces a fresh result)"""
+    value = data.get('use_cache', True)
+    if isinstance(value, str):
+        return value.strip().lower() not in ('false', '0', 'off', 'no')
+    return bool(value)
+
+
 @app.route('/courses/<int:course_id>/generate-quiz', methods=['POST'])
 @jwt_required()
 def generate_quiz(course_id):
@@ -903,6 +1787,7 @@ def generate_quiz(course_id):
         count = data.get('count', 5)  # 5, 10, 15, 20
         # Question types: mcq, true_false, fill_blank (no short_answer/essay by default)
         question_types = data.get('question_types', ['mcq', 'true_false', 'fill_blank'])
+        use_cache = _use_cache(data)  # Set false to force a fresh quiz
         
         # Validate parameters
         if difficulty not in ['easy', 'medium', 'hard']:
@@ -921,7 +1806,8 @@ def generate_quiz(course_id):
             course.documents, 
             difficulty=difficulty, 
             count=count,
-            question_types=question_types
+            question_types=question_types,
+            use_cache=use_cache
         )
         
         if "error" in quiz_data:
@@ -957,21 +1843,23 @@ def submit_quiz(course_id):
     db.session.add(new_attempt)
     db.session.flush() # Flush to get the ID for the new_attempt
 
+    response_rows = []
     for res in responses:
         is_correct = res['selected_option'] == res['correct_option']
         if is_correct:
             correct_answers += 1
         
-        question_response = QuizQuestionResponse(
-            quiz_attempt_id=new_attempt.id,
-            question_text=res['question'],
-            selected_option=res['selected_option'],
-            correct_option=res['correct_option'],
-            is_correct=is_correct
-        )
-        db.session.add(question_response)
+        response_rows.append({
+            "quiz_attempt_id": new_attempt.id,
+            "question_text": res['question'],
+            "selected_option": res['selected_option'],
+            "correct_option": res['correct_option'],
+            "is_correct": is_correct
+        })
+    bulk_insert(QuizQuestionResponse, response_rows)
 
     new_attempt.score = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
+    record_daily_activity(current_user_id, course_id, quizzes=1)
     
     db.session.commit()
 
@@ -1008,7 +1896,7 @@ def generate_mind_map(course_id):
             'vector_store_path': d.vector_store_path
         } for d in documents_to_use]
         
-        mind_map_data = rag_engine.generate_mind_map(docs_data, topic=topic)
+        mind_map_data = rag_engine.generate_mind_map(docs_data, topic=topic, use_cache=_use_cache(data))
         
         return jsonify({
             "nodes": mind_map_data.get("nodes", []),
@@ -1024,10 +1912,42 @@ def generate_mind_map(course_id):
 @app.route('/courses/<int:course_id>/quizzes/history', methods=['GET'])
 @jwt_required()
 def get_quiz_history(course_id):
+    """Newest-first quiz attempts (?limit, ?before; ?summary=true omits per-question detail)"""
     current_user_id = int(get_jwt_identity())
-    attempts = QuizAttempt.query.filter_by(user_id=current_user_id, course_id=course_id).order_by(QuizAttempt.timestamp.desc()).all()
+    try:
+        limit, before = page_args(default_limit=20)
+    except (ValueError, TypeError):
+        return api_error("Invalid limit or before cursor", ErrorCode.VALIDATION_ERROR)
+    summary = request.args.get('summary', 'false').lower() in ['true', '1']
+
+    query = QuizAttempt.query.filter_by(user_id=current_user_id, course_id=course_id)
+    if not summary:
+        query = query.options(selectinload(QuizAttempt.responses))
+    attempts, next_before = paginate_keyset(query, QuizAttempt.timestamp, QuizAttempt.id, limit, before)
 
     history_data = []
+    if summary:
+        # Per-attempt question counts in one grouped query instead of loading responses
+        counts = {}
+        if attempts:
+            counts = {row.quiz_attempt_id: row for row in db.session.query(
+                QuizQuestionResponse.quiz_attempt_id,
+                db.func.count(QuizQuestionResponse.id).label('total'),
+                db.func.sum(db.case((QuizQuestionResponse.is_correct == True, 1), else_=0)).label('correct')
+            ).filter(
+                QuizQuestionResponse.quiz_attempt_id.in_([a.id for a in attempts])
+            ).group_by(QuizQuestionResponse.quiz_attempt_id).all()}
+        for attempt in attempts:
+            row = counts.get(attempt.id)
+            history_data.append({
+                "id": attempt.id,
+                "score": attempt.score,
+                "timestamp": attempt.timestamp.isoformat(),
+                "num_questions": row.total if row else 0,
+                "num_correct": int(row.correct or 0) if row else 0
+            })
+        return paginated_response(history_data, next_before)
+
     for attempt in attempts:
         responses_data = [{
             "question_text": res.question_text,
@@ -1043,7 +1963,7 @@ def get_quiz_history(course_id):
             "responses": responses_data
         })
 
-    return jsonify(history_data), 200
+    return paginated_response(history_data, next_before)
 
 @app.route('/courses/<int:course_id>/generate-study-guide', methods=['POST'])
 @jwt_required()
@@ -1151,18 +2071,90 @@ def delete_note(note_id):
 @app.route('/notifications', methods=['GET'])
 @jwt_required()
 def get_notifications():
+    """Newest-first notifications (?limit, ?before)"""
     current_user_id = int(get_jwt_identity())
-    notifications = Notification.query.filter_by(user_id=current_user_id).order_by(Notification.created_at.desc()).all()
-    return jsonify([
-        {
-            "id": n.id,
-            "message": n.message,
-            "type": n.type,
-            "is_read": n.is_read,
-            "created_at": n.created_at.isoformat(),
-            "course_id": n.course_id
-        } for n in notifications
-    ]), 200
+    try:
+        limit, before = page_args(default_limit=50)
+    except (ValueError, TypeError):
+        return api_error("Invalid limit or before cursor", ErrorCode.VALIDATION_ERROR)
+    notifications, next_before = paginate_keyset(
+        Notification.query.filter_by(user_id=current_user_id),
+        Notification.created_at, Notification.id, limit, before
+    )
+    return paginated_response([serialize_notification(n) for n in notifications], next_before)
+
+@app.route('/notifications/unread-count', methods=['GET'])
+@jwt_required()
+def get_unread_notification_count():
+    """
+    Number of unread notifications (served from the (user_id, is_read) index). "stream" says
+    whether /notifications/stream is available; otherwise clients poll this endpoint.
+    """
+    current_user_id = int(get_jwt_identity())
+    count = db.session.query(db.func.count(Notification.id)).filter(
+        Notification.user_id == current_user_id,
+        Notification.is_read == False
+    ).scalar()
+    return jsonify({"unread": count, "stream": is_cooperative()}), 200
+
+# --- Notification Stream (SSE) ---
+notification_broker = notification_stream.NotificationBroker()
+_notification_listener = None
+_notification_listener_lock = threading.Lock()
+
+def _fetch_notifications_since(last_id):
+    with app.app_context():
+        return [serialize_notification(n) for n in Notification.query.filter(
+            Notification.id > last_id
+        ).order_by(Notification.id).limit(500).all()]
+
+def _latest_notification_id():
+    with app.app_context():
+        return db.session.query(db.func.max(Notification.id)).scalar() or 0
+
+def _ensure_notification_listener():
+    """Start this worker's listener thread on first use (after gunicorn has forked)"""
+    global _notification_listener
+    with _notification_listener_lock:
+        if _notification_listener is not None:
+            return
+        if db.engine.dialect.name == 'postgresql':
+            # A dedicated connection outside the pool, since it stays in LISTEN forever
+            connect = lambda: db.engine.raw_connection().detach().driver_connection
+            listener = notification_stream.PostgresListener(connect, notification_broker)
+        else:
+            listener = notification_stream.PollingListener(
+                _fetch_notifications_since, _latest_notification_id, notification_broker
+            )
+        listener.start()
+        _notification_listener = listener
+
+@app.route('/notifications/stream', methods=['GET'])
+@jwt_required()
+def stream_notifications():
+    """
+    Server-sent events with each new notification for the current user; ?after=<id> first
+    replays the user's notifications newer than that id. Only served by gevent workers: on
+    the threads profile every open stream would pin a worker thread.
+    """
+    if not is_cooperative():
+        return api_error("Notification streaming needs the gevent serving profile; poll /notifications/unread-count",
+                         ErrorCode.NOT_FOUND, 404)
+    current_user_id = int(get_jwt_identity())
+    after = request.args.get('after', type=int)
+    backlog = None
+    if after is not None:
+        # Whatever was created since the client's newest notification, e.g. while it reconnected
+        backlog = lambda: [serialize_notification(n) for n in Notification.query.filter(
+            Notification.user_id == current_user_id, Notification.id > after
+        ).order_by(Notification.id).limit(100)]
+    _ensure_notification_listener()
+    return Response(
+        stream_with_context(notification_stream.sse_stream(notification_broker, current_user_id,
+                                                           backlog=backlog)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/notifications/<int:notification_id>/read', methods=['PUT'])
 @jwt_required()
@@ -1224,25 +2216,30 @@ def serve_upload(filename):
 @app.route('/courses/<int:course_id>/chat-history', methods=['GET'])
 @jwt_required()
 def get_chat_history(course_id):
-    """Get chat history for a course"""
+    """Get chat history for a course: the latest page (?limit, ?before), oldest message first"""
     current_user_id = int(get_jwt_identity())
     course = Course.query.filter_by(id=course_id, user_id=current_user_id).first()
     
     if not course:
         return api_error("Course not found", ErrorCode.NOT_FOUND, 404)
     
-    messages = ChatMessage.query.filter_by(
-        course_id=course_id, 
-        user_id=current_user_id
-    ).order_by(ChatMessage.created_at.asc()).all()
+    try:
+        limit, before = page_args(default_limit=100)
+    except (ValueError, TypeError):
+        return api_error("Invalid limit or before cursor", ErrorCode.VALIDATION_ERROR)
+    messages, next_before = paginate_keyset(
+        ChatMessage.query.filter_by(course_id=course_id, user_id=current_user_id),
+        ChatMessage.created_at, ChatMessage.id, limit, before
+    )
+    messages.reverse()
     
-    return jsonify([{
+    return paginated_response([{
         "id": msg.id,
         "role": msg.role,
         "content": msg.content,
         "sources": msg.sources,
         "created_at": msg.created_at.isoformat()
-    } for msg in messages]), 200
+    } for msg in messages], next_before)
 
 @app.route('/courses/<int:course_id>/chat-history', methods=['DELETE'])
 @jwt_required()
@@ -1300,7 +2297,10 @@ def generate_flashcards(course_id):
         difficulty = data.get('difficulty', 'medium')
         if difficulty not in ['easy', 'medium', 'hard']:
             difficulty = 'medium'
-        flashcard_data = rag_engine.generate_flashcards(document_data, count, topic=topic, difficulty=difficulty)
+        flashcard_data = rag_engine.generate_flashcards(
+            document_data, count, topic=topic, difficulty=difficulty,
+            use_cache=_use_cache(data)
+        )
         
         # Create deck
         deck_name = f"Flashcards ({difficulty.title()}): {topic}" if topic else f"Flashcards ({difficulty.title()}) for {course.name}"
@@ -1313,20 +2313,17 @@ def generate_flashcards(course_id):
         db.session.flush()
         
         # Create cards with source info stored in a metadata field (JSON)
-        for card in flashcard_data:
-            source_info = json.dumps({
+        now = datetime.utcnow()
+        card_ids = bulk_insert(Flashcard, [{
+            "deck_id": deck.id,
+            "front": card.get('front', ''),
+            "back": card.get('back', ''),
+            "source_info": json.dumps({
                 'source': card.get('source', 'Unknown'),
                 'page': card.get('page')
-            })
-            flashcard = Flashcard(
-                deck_id=deck.id,
-                front=card.get('front', ''),
-                back=card.get('back', ''),
-                next_review=datetime.utcnow()
-            )
-            # Store source in the existing model (we'll add to response)
-            flashcard.source_info = source_info  # This will be handled dynamically
-            db.session.add(flashcard)
+            }),
+            "next_review": now
+        } for card in flashcard_data], returning_ids=True)
         
         db.session.commit()
         
@@ -1340,6 +2337,7 @@ def generate_flashcards(course_id):
         return jsonify({
             "deck_id": deck.id,
             "count": len(flashcard_data),
+            "card_ids": card_ids,
             "cards": flashcard_data,  # Return cards with source info
             "msg": "Flashcards generated successfully"
         }), 201
@@ -1376,7 +2374,7 @@ def explain_flashcard():
     } for d in documents_to_use]
     
     try:
-        explanation = rag_engine.explain_flashcard(card_front, card_back, document_data)
+        explanation = rag_engine.explain_flashcard(card_front, card_back, document_data, use_cache=_use_cache(data))
         return jsonify({"explanation": explanation}), 200
     except Exception as e:
         logger.error(f"Flashcard explain error: {str(e)}")
@@ -1421,6 +2419,46 @@ def regenerate_flashcard():
 
 
 
+def serialize_flashcard(card):
+    """Flashcard as returned by the deck listing and review queue"""
+    source_info = json.loads(card.source_info) if card.source_info else {}
+    return {
+        "id": card.id,
+        "front": card.front,
+        "back": card.back,
+        "ease_factor": card.ease_factor,
+        "interval": card.interval,
+        "repetitions": card.repetitions,
+        "next_review": card.next_review.isoformat() if card.next_review else None,
+        "last_reviewed": card.last_reviewed.isoformat() if card.last_reviewed else None,
+        "source": source_info.get('source'),
+        "page": source_info.get('page')
+    }
+
+def apply_sm2_review(card, quality, now=None):
+    """Update a card's SM-2 scheduling fields for a review of quality 0-5"""
+    now = now or datetime.utcnow()
+    quality = max(0, min(5, quality))
+    
+    if quality < 3:
+        # Failed - reset
+        card.repetitions = 0
+        card.interval = 1
+    else:
+        if card.repetitions == 0:
+            card.interval = 1
+        elif card.repetitions == 1:
+            card.interval = 6
+        else:
+            card.interval = round(card.interval * card.ease_factor)
+        
+        card.repetitions += 1
+    
+    # Update ease factor
+    card.ease_factor = max(1.3, card.ease_factor + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)))
+    card.last_reviewed = now
+    card.next_review = now + timedelta(days=card.interval)
+
 @app.route('/courses/<int:course_id>/flashcards', methods=['GET'])
 @jwt_required()
 def get_flashcards(course_id):
@@ -1431,33 +2469,31 @@ def get_flashcards(course_id):
     if not course:
         return api_error("Course not found", ErrorCode.NOT_FOUND, 404)
     
-    decks = FlashcardDeck.query.filter_by(course_id=course_id, user_id=current_user_id).all()
+    # Constant query count regardless of deck/card numbers: decks, their cards (one IN query)
+    # and the due counts grouped per deck
+    decks = FlashcardDeck.query.options(selectinload(FlashcardDeck.cards)).filter_by(
+        course_id=course_id, user_id=current_user_id
+    ).order_by(FlashcardDeck.id).all()
+    
+    now = datetime.utcnow()
+    due_counts = dict(db.session.query(
+        Flashcard.deck_id, db.func.count(Flashcard.id)
+    ).join(FlashcardDeck, Flashcard.deck_id == FlashcardDeck.id).filter(
+        FlashcardDeck.course_id == course_id,
+        FlashcardDeck.user_id == current_user_id,
+        (Flashcard.next_review <= now) | (Flashcard.next_review == None)
+    ).group_by(Flashcard.deck_id).all())
     
     result = []
     for deck in decks:
-        cards_due = Flashcard.query.filter(
-            Flashcard.deck_id == deck.id,
-            (Flashcard.next_review <= datetime.utcnow()) | (Flashcard.next_review == None)
-        ).count()
-        
+        cards = [serialize_flashcard(card) for card in deck.cards]
         result.append({
             "id": deck.id,
             "name": deck.name,
             "created_at": deck.created_at.isoformat(),
-            "total_cards": len(deck.cards),
-            "cards_due": cards_due,
-            "cards": [{
-                "id": card.id,
-                "front": card.front,
-                "back": card.back,
-                "ease_factor": card.ease_factor,
-                "interval": card.interval,
-                "repetitions": card.repetitions,
-                "next_review": card.next_review.isoformat() if card.next_review else None,
-                "last_reviewed": card.last_reviewed.isoformat() if card.last_reviewed else None,
-                "source": (json.loads(card.source_info).get('source') if card.source_info else None),
-                "page": (json.loads(card.source_info).get('page') if card.source_info else None)
-            } for card in deck.cards]
+            "total_cards": len(cards),
+            "cards_due": due_counts.get(deck.id, 0),
+            "cards": cards
         })
     
     return jsonify(result), 200
@@ -1479,27 +2515,8 @@ def review_flashcard(card_id):
     
     data = request.get_json()
     quality = data.get('quality', 3)  # 0-5 scale (0=forgot, 5=perfect)
-    quality = max(0, min(5, quality))
-    
-    # SM-2 Algorithm
-    if quality < 3:
-        # Failed - reset
-        card.repetitions = 0
-        card.interval = 1
-    else:
-        if card.repetitions == 0:
-            card.interval = 1
-        elif card.repetitions == 1:
-            card.interval = 6
-        else:
-            card.interval = round(card.interval * card.ease_factor)
-        
-        card.repetitions += 1
-    
-    # Update ease factor
-    card.ease_factor = max(1.3, card.ease_factor + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)))
-    card.last_reviewed = datetime.utcnow()
-    card.next_review = datetime.utcnow() + timedelta(days=card.interval)
+    apply_sm2_review(card, quality)
+    record_daily_activity(current_user_id, deck.course_id, flashcard_reviews=1)
     
     db.session.commit()
     
@@ -1511,6 +2528,136 @@ def review_flashcard(card_id):
     }), 200
 
 
+REVIEW_QUEUE_MAX_LIMIT = 200
+REVIEW_BATCH_MAX_SIZE = 500
+
+def _encode_queue_cursor(card):
+    # New cards (no next_review) are served first by id, then due cards by (next_review, id)
+    if card.next_review is None:
+        key = ["new", card.id]
+    else:
+        key = ["due", card.next_review.isoformat(), card.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def _decode_queue_cursor(cursor):
+    key = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    if key[0] == "new":
+        return "new", None, int(key[1])
+    return "due", datetime.fromisoformat(key[1]), int(key[2])
+
+@app.route('/courses/<int:course_id>/flashcards/due', methods=['GET'])
+@jwt_required()
+def get_review_queue(course_id):
+    """Cursor-paginated queue of cards due for review (new cards first, then oldest due)"""
+    current_user_id = int(get_jwt_identity())
+    course = Course.query.filter_by(id=course_id, user_id=current_user_id).first()
+    
+    if not course:
+        return api_error("Course not found", ErrorCode.NOT_FOUND, 404)
+    
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), REVIEW_QUEUE_MAX_LIMIT))
+        deck_id = request.args.get('deck_id', type=int)
+        cursor = request.args.get('cursor')
+        phase, after_review, after_id = _decode_queue_cursor(cursor) if cursor else ("new", None, 0)
+    except (ValueError, TypeError, IndexError, json.JSONDecodeError, UnicodeDecodeError):
+        return api_error("Invalid limit or cursor", ErrorCode.VALIDATION_ERROR)
+    
+    deck_ids = db.session.query(FlashcardDeck.id).filter_by(course_id=course_id, user_id=current_user_id)
+    if deck_id is not None:
+        deck_ids = deck_ids.filter(FlashcardDeck.id == deck_id)
+    deck_ids = deck_ids.scalar_subquery()
+    now = datetime.utcnow()
+    
+    # Both phases are range scans on the (deck_id, next_review) index; fetch one extra row to detect more pages
+    cards = []
+    if phase == "new":
+        cards = Flashcard.query.filter(
+            Flashcard.deck_id.in_(deck_ids),
+            Flashcard.next_review == None,
+            Flashcard.id > after_id
+        ).order_by(Flashcard.id).limit(limit + 1).all()
+        after_review, after_id = None, 0
+    if len(cards) <= limit:
+        due = Flashcard.query.filter(
+            Flashcard.deck_id.in_(deck_ids),
+            Flashcard.next_review <= now
+        )
+        if after_review is not None:
+            due = due.filter(
+                (Flashcard.next_review > after_review) |
+                ((Flashcard.next_review == after_review) & (Flashcard.id > after_id))
+            )
+        cards += due.order_by(Flashcard.next_review, Flashcard.id).limit(limit + 1 - len(cards)).all()
+    
+    has_more = len(cards) > limit
+    cards = cards[:limit]
+    
+    result = {
+        "cards": [dict(serialize_flashcard(card), deck_id=card.deck_id) for card in cards],
+        "next_cursor": _encode_queue_cursor(cards[-1]) if has_more else None
+    }
+    if not cursor:
+        result["total_due"] = Flashcard.query.filter(
+            Flashcard.deck_id.in_(deck_ids),
+            (Flashcard.next_review <= now) | (Flashcard.next_review == None)
+        ).count()
+    return jsonify(result), 200
+
+
+@app.route('/flashcards/review/batch', methods=['POST'])
+@jwt_required()
+def review_flashcards_batch():
+    """Apply SM-2 reviews for many cards in a single transaction"""
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json() or {}
+    reviews = data.get('reviews')
+    
+    if not isinstance(reviews, list) or not reviews:
+        return api_error("reviews must be a non-empty list", ErrorCode.VALIDATION_ERROR)
+    if len(reviews) > REVIEW_BATCH_MAX_SIZE:
+        return api_error(f"At most {REVIEW_BATCH_MAX_SIZE} reviews per batch", ErrorCode.VALIDATION_ERROR)
+    try:
+        reviews = [(int(r['card_id']), int(r.get('quality', 3))) for r in reviews]
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return api_error("Each review needs an integer card_id and quality", ErrorCode.VALIDATION_ERROR)
+    
+    # One query loads every card and checks ownership through its deck
+    card_ids = {card_id for card_id, _ in reviews}
+    rows = db.session.query(Flashcard, FlashcardDeck.course_id).join(
+        FlashcardDeck, Flashcard.deck_id == FlashcardDeck.id
+    ).filter(
+        Flashcard.id.in_(card_ids),
+        FlashcardDeck.user_id == current_user_id
+    ).all()
+    cards = {card.id: card for card, _ in rows}
+    card_courses = {card.id: course_id for card, course_id in rows}
+    
+    missing = sorted(card_ids - cards.keys())
+    if missing:
+        return api_error("Flashcards not found", ErrorCode.NOT_FOUND, 404, details={"card_ids": missing})
+    
+    now = datetime.utcnow()
+    reviews_per_course = {}
+    for card_id, quality in reviews:
+        apply_sm2_review(cards[card_id], quality, now)
+        course_id = card_courses[card_id]
+        reviews_per_course[course_id] = reviews_per_course.get(course_id, 0) + 1
+    for course_id, count in reviews_per_course.items():
+        record_daily_activity(current_user_id, course_id, flashcard_reviews=count, when=now)
+    db.session.commit()
+    
+    return jsonify({
+        "reviewed": len(reviews),
+        "cards": [{
+            "card_id": card.id,
+            "next_review": card.next_review.isoformat(),
+            "interval": card.interval,
+            "ease_factor": card.ease_factor
+        } for card in cards.values()]
+    }), 200
+
+
 @app.route('/flashcards/<int:card_id>', methods=['DELETE'])
 @jwt_required()
 def delete_flashcard(card_id):
@@ -1969,24 +3116,26 @@ def get_analytics_summary():
     """Get overall analytics summary for the current user"""
     current_user_id = int(get_jwt_identity())
     
-    # Get study time per course (last 30 days)
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    # Get study time per course (last 30 days) from the daily rollup
+    thirty_days_ago = datetime.utcnow().date() - timedelta(days=30)
     
     study_sessions = db.session.query(
-        StudySession.course_id,
-        db.func.sum(StudySession.duration_seconds).label('total_seconds')
+        DailyActivity.course_id,
+        db.func.sum(DailyActivity.study_seconds).label('total_seconds')
     ).filter(
-        StudySession.user_id == current_user_id,
-        StudySession.created_at >= thirty_days_ago
-    ).group_by(StudySession.course_id).all()
+        DailyActivity.user_id == current_user_id,
+        DailyActivity.day >= thirty_days_ago,
+        DailyActivity.study_seconds > 0
+    ).group_by(DailyActivity.course_id).all()
     
-    # Get quiz attempts and average scores
-    quiz_attempts = QuizAttempt.query.filter_by(user_id=current_user_id).all()
-    quiz_scores = [a.score for a in quiz_attempts]
-    avg_quiz_score = sum(quiz_scores) / len(quiz_scores) if quiz_scores else 0
+    # Quiz count and average score, aggregated in SQL
+    total_quizzes, avg_quiz_score = db.session.query(
+        db.func.count(QuizAttempt.id),
+        db.func.avg(QuizAttempt.score)
+    ).filter(QuizAttempt.user_id == current_user_id).one()
     
     # Get courses for study time breakdown
-    courses = Course.query.filter_by(user_id=current_user_id).all()
+    courses = db.session.query(Course.id, Course.name).filter_by(user_id=current_user_id).all()
     course_map = {c.id: c.name for c in courses}
     
     study_time_by_course = [
@@ -2017,8 +3166,8 @@ def get_analytics_summary():
     
     return jsonify({
         "total_study_minutes": round(sum(cs[1] or 0 for cs in study_sessions) / 60, 1),
-        "total_quizzes": len(quiz_attempts),
-        "average_quiz_score": round(avg_quiz_score, 1),
+        "total_quizzes": total_quizzes,
+        "average_quiz_score": round(float(avg_quiz_score or 0), 1),
         "learning_streak_days": streak,
         "study_time_by_course": study_time_by_course,
         "quiz_score_trend": quiz_trend,
@@ -2026,27 +3175,32 @@ def get_analytics_summary():
     }), 200
 
 
+def activity_day(column):
+    """SQL expression truncating a timestamp column to its day (SQLite and PostgreSQL)"""
+    return db.func.date(column)
+
+def as_date(value):
+    """Normalize a day returned by activity_day (a date on PostgreSQL, 'YYYY-MM-DD' on SQLite)"""
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
 def calculate_learning_streak(user_id):
     """Calculate current learning streak (consecutive days)"""
     today = datetime.utcnow().date()
     streak = 0
     
-    # Get all unique dates with activity (study sessions, quizzes, flashcard reviews)
-    activity_dates = set()
-    
-    # Study sessions
-    sessions = StudySession.query.filter_by(user_id=user_id).all()
-    for s in sessions:
-        activity_dates.add(s.created_at.date())
-    
-    # Quiz attempts
-    quizzes = QuizAttempt.query.filter_by(user_id=user_id).all()
-    for q in quizzes:
-        activity_dates.add(q.timestamp.date())
+    # Distinct active days (study sessions, quizzes, flashcard reviews) from the rollup, newest first
+    activity_days = db.session.query(DailyActivity.day).filter(
+        DailyActivity.user_id == user_id,
+        DailyActivity.day <= today
+    ).distinct().order_by(DailyActivity.day.desc())
     
-    # Count consecutive days from today backwards
+    # Count consecutive days from today backwards, stopping at the first gap
     current_date = today
-    while current_date in activity_dates:
+    for (day,) in activity_days.yield_per(100):
+        if day > current_date:
+            continue
+        if day < current_date:
+            break
         streak += 1
         current_date -= timedelta(days=1)
     
@@ -2076,6 +3230,7 @@ def log_study_session():
         activity_type=activity_type
     )
     db.session.add(session)
+    record_daily_activity(current_user_id, course_id, study_seconds=duration_seconds)
     db.session.commit()
     
     return jsonify({"msg": "Session logged", "session_id": session.id}), 201
@@ -2086,34 +3241,27 @@ def log_study_session():
 def get_daily_activity():
     """Get daily activity for the last 30 days (for streak calendar)"""
     current_user_id = int(get_jwt_identity())
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    thirty_days_ago = datetime.utcnow().date() - timedelta(days=30)
     
-    # Get activity by date
+    # Get activity by date from the daily rollup
     daily_activity = {}
     
-    # Study sessions
-    sessions = StudySession.query.filter(
-        StudySession.user_id == current_user_id,
-        StudySession.created_at >= thirty_days_ago
-    ).all()
-    
-    for s in sessions:
-        date_key = s.created_at.date().isoformat()
-        if date_key not in daily_activity:
-            daily_activity[date_key] = {"minutes": 0, "quizzes": 0, "flashcards": 0}
-        daily_activity[date_key]["minutes"] += round(s.duration_seconds / 60, 1)
-    
-    # Quiz attempts
-    quizzes = QuizAttempt.query.filter(
-        QuizAttempt.user_id == current_user_id,
-        QuizAttempt.timestamp >= thirty_days_ago
-    ).all()
-    
-    for q in quizzes:
-        date_key = q.timestamp.date().isoformat()
-        if date_key not in daily_activity:
-            daily_activity[date_key] = {"minutes": 0, "quizzes": 0, "flashcards": 0}
-        daily_activity[date_key]["quizzes"] += 1
+    rows = db.session.query(
+        DailyActivity.day,
+        db.func.sum(DailyActivity.study_seconds),
+        db.func.sum(DailyActivity.quizzes),
+        db.func.sum(DailyActivity.flashcard_reviews)
+    ).filter(
+        DailyActivity.user_id == current_user_id,
+        DailyActivity.day >= thirty_days_ago
+    ).group_by(DailyActivity.day).all()
+    
+    for day, study_seconds, quizzes, flashcard_reviews in rows:
+        daily_activity[day.isoformat()] = {
+            "minutes": round((study_seconds or 0) / 60, 1),
+            "quizzes": int(quizzes or 0),
+            "flashcards": int(flashcard_reviews or 0)
+        }
     
     return jsonify(daily_activity), 200
 
@@ -2273,7 +3421,8 @@ def shared_course_chat(share_token):
         docs_data = [{
             'id': d.id,
             'filename': d.filename,
-            'vector_store_path': d.vector_store_path
+            'vector_store_path': d.vector_store_path,
+            'source_url': d.source_url
         } for d in documents]
         
         def generate():
@@ -2283,6 +3432,8 @@ def shared_course_chat(share_token):
                         # Final response with sources
                         sources = chunk_data.get('sources', [])
                         yield f"data: {json.dumps({'type': 'sources', 'sources': sources})}\n\n"
+                        if data.get('include_timing') and chunk_data.get('timing'):
+                            yield f"data: {json.dumps({'type': 'timing', 'timing': chunk_data['timing']})}\n\n"
                     else:
                         # Text chunk
                         yield f"data: {json.dumps({'type': 'chunk', 'content': chunk_data})}\n\n"
@@ -2368,7 +3519,8 @@ def extract_course_concepts(course_id):
         return api_error("No documents in course", ErrorCode.VALIDATION_ERROR)
     
     # Use rag_engine to extract concepts
-    concepts = rag_engine.extract_concepts_from_docs(documents)
+    data = request.get_json(silent=True) or {}
+    concepts = rag_engine.extract_concepts_from_docs(documents, use_cache=_use_cache(data))
     
     if not concepts:
         return api_error("Could not extract concepts", ErrorCode.INTERNAL_ERROR, 500)
@@ -0,0 +1,119 @@
+"""
+Bulk insert benchmark - per-object ORM adds vs the bulk_insert() path.
+
+Runs concurrent workers that each save 20-question quiz attempts and 30-card decks,
+once with one ORM object per row and once with bulk_insert(), and prints throughput.
+
+Usage:
+    python bench_bulk_inserts.py                                  # scratch SQLite database
+    python bench_bulk_inserts.py --database-url URL --workers 8 --iterations 50
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+QUIZ_QUESTIONS = 20
+DECK_CARDS = 30
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database to benchmark against (defaults to a scratch SQLite file)')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent workers')
+    parser.add_argument('--iterations', type=int, default=25, help='Saves per worker')
+    return parser.parse_args()
+
+
+def save_quiz(m, user_id, course_id, bulk):
+    attempt = m.QuizAttempt(user_id=user_id, course_id=course_id, score=50.0)
+    m.db.session.add(attempt)
+    m.db.session.flush()
+    rows = [{
+        "quiz_attempt_id": attempt.id,
+        "question_text": f"Question {i}?",
+        "selected_option": "A",
+        "correct_option": "A" if i % 2 else "B",
+        "is_correct": bool(i % 2)
+    } for i in range(QUIZ_QUESTIONS)]
+    if bulk:
+        m.bulk_insert(m.QuizQuestionResponse, rows)
+    else:
+        for row in rows:
+            m.db.session.add(m.QuizQuestionResponse(**row))
+    m.db.session.commit()
+
+
+def save_deck(m, user_id, course_id, bulk):
+    deck = m.FlashcardDeck(course_id=course_id, user_id=user_id, name='Benchmark deck')
+    m.db.session.add(deck)
+    m.db.session.flush()
+    now = datetime.utcnow()
+    rows = [{
+        "deck_id": deck.id,
+        "front": f"Front {i}",
+        "back": f"Back {i}",
+        "source_info": '{"source": "bench.pdf", "page": 1}',
+        "next_review": now
+    } for i in range(DECK_CARDS)]
+    if bulk:
+        m.bulk_insert(m.Flashcard, rows, returning_ids=True)
+    else:
+        for row in rows:
+            m.db.session.add(m.Flashcard(**row))
+    m.db.session.commit()
+
+
+def run(m, save, user_id, course_id, bulk, workers, iterations):
+    def worker(_):
+        with m.app.app_context():
+            for _ in range(iterations):
+                save(m, user_id, course_id, bulk)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(worker, range(workers)))
+    elapsed = time.perf_counter() - start
+    return workers * iterations / elapsed
+
+
+def main():
+    args = parse_args()
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        scratch = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'bench.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{scratch}'
+    os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='bench-data-'))
+
+    import app as m
+
+    with m.app.app_context():
+        m.db.create_all()
+        if m.db.engine.dialect.name == 'sqlite':
+            with m.db.engine.begin() as conn:
+                conn.exec_driver_sql('PRAGMA journal_mode=WAL')
+        user = m.User(email=f'bench-{time.time_ns()}@example.com')
+        user.set_password('password')
+        m.db.session.add(user)
+        m.db.session.flush()
+        course = m.Course(name='Benchmark', user_id=user.id)
+        m.db.session.add(course)
+        m.db.session.commit()
+        user_id, course_id = user.id, course.id
+        dialect = m.db.engine.dialect.name
+
+    print(f"{dialect}, {args.workers} workers x {args.iterations} saves")
+    for label, save in ((f"quiz ({QUIZ_QUESTIONS} responses)", save_quiz), (f"deck ({DECK_CARDS} cards)", save_deck)):
+        orm = run(m, save, user_id, course_id, False, args.workers, args.iterations)
+        bulk = run(m, save, user_id, course_id, True, args.workers, args.iterations)
+        print(f"{label:<24} orm {orm:8.1f}/s   bulk {bulk:8.1f}/s   x{bulk / orm:.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Import-time budget check - fails if importing the app gets slow or pulls in heavy dependencies.
+
+Runs `python -X importtime -c "import app"` in a fresh interpreter, then checks that
+- none of the heavy, first-use-only modules (torch, sentence-transformers, sklearn, ...) were imported
+- the total import time stays under the budget
+
+Usage:
+    python check_import_time.py [--budget-ms 2500] [--module app]
+"""
+
+import os
+import re
+import sys
+import argparse
+import tempfile
+import subprocess
+
+# Must only be imported on first use (see the note at the top of rag_engine.py)
+HEAVY_MODULES = [
+    'torch',
+    'sentence_transformers',
+    'transformers',
+    'sklearn',
+    'PyPDF2',
+    'langchain_text_splitters',
+    'trafilatura',
+    'yt_dlp',
+    'whisper',
+    'groq',
+    'google.generativeai',
+    'reportlab',
+]
+
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=int, default=int(os.environ.get('IMPORT_TIME_BUDGET_MS', 2500)),
+                        help='Maximum total import time in milliseconds')
+    parser.add_argument('--module', default='app', help='Module to import')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    scratch = tempfile.mkdtemp(prefix='import-check-')
+    env = dict(os.environ,
+               DATA_DIR=os.environ.get('DATA_DIR', scratch),
+               DATABASE_URL=os.environ.get('DATABASE_URL', f"sqlite:///{os.path.join(scratch, 'app.db')}"))
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {args.module}'],
+        cwd=backend_dir, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr[-4000:])
+        print(f"FAIL  importing {args.module} raised an error")
+        return 1
+
+    imported = set()
+    top_level = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        cumulative_us, depth, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        imported.add(name)
+        if depth == 1:
+            top_level.append((cumulative_us, name))
+
+    total_ms = sum(us for us, _ in top_level) / 1000
+    heavy = [m for m in HEAVY_MODULES if m in imported]
+
+    print(f"Importing {args.module}: {total_ms:.0f} ms (budget {args.budget_ms} ms)")
+    for us, name in sorted(top_level, reverse=True)[:15]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if heavy:
+        print(f"FAIL  heavy modules imported eagerly: {', '.join(heavy)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"FAIL  import time {total_ms:.0f} ms is over the {args.budget_ms} ms budget")
+        failed = True
+    if not failed:
+        print("ok")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
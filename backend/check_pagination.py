@@ -0,0 +1,112 @@
+"""
+Pagination check - pages through every keyset-paginated route by following X-Next-Before.
+
+Seeds rows that all share one timestamp (the hard case for (time, id) cursors) and fails if
+any row is returned twice, skipped, or a cursor repeats.
+
+Usage:
+    python check_pagination.py                       # scratch SQLite database
+    python check_pagination.py --database-url URL    # e.g. an empty PostgreSQL database
+
+Exits with status 1 when a route does not return every row exactly once.
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+
+ROWS = 10
+PAGE_SIZE = 3
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database to seed and check (defaults to a scratch SQLite file)')
+    return parser.parse_args()
+
+
+def seed(m):
+    """One user and course with ROWS chat messages, notifications and quiz attempts in the same second"""
+    db = m.db
+    user = m.User(email='page-check@example.com', first_name='Page')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    course = m.Course(name='Course', user_id=user.id)
+    db.session.add(course)
+    db.session.flush()
+    for i in range(ROWS):
+        db.session.add(m.ChatMessage(course_id=course.id, user_id=user.id, role='user', content=f'Message {i}'))
+        db.session.add(m.Notification(user_id=user.id, message=f'Notification {i}', type='info', course_id=course.id))
+        db.session.add(m.QuizAttempt(user_id=user.id, course_id=course.id, score=50.0))
+    db.session.commit()
+    # One statement, so every row gets the same server-side now() in the database's own format
+    for model, column in ((m.ChatMessage, 'created_at'), (m.Notification, 'created_at'), (m.QuizAttempt, 'timestamp')):
+        db.session.execute(db.update(model).values({column: db.func.now()}))
+    db.session.commit()
+    return user.id, course.id
+
+
+def page_through(client, path, headers):
+    """Follow the cursor to the end; returns (ids in order, number of requests)"""
+    ids, cursors, before = [], set(), None
+    for requests in range(1, ROWS * 2):
+        query = f"?limit={PAGE_SIZE}" + (f"&before={before}" if before else "")
+        response = client.get(path + query, headers=headers)
+        if response.status_code != 200:
+            raise AssertionError(f"{path} returned {response.status_code}")
+        ids += [row['id'] for row in response.get_json()]
+        before = response.headers.get('X-Next-Before')
+        if not before:
+            return ids, requests
+        if before in cursors:
+            raise AssertionError(f"{path} repeated cursor {before} after ids {ids}")
+        cursors.add(before)
+    raise AssertionError(f"{path} did not finish after {ROWS * 2} pages")
+
+
+def main():
+    args = parse_args()
+    scratch = None
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        os.environ['DATABASE_URL'] = f'sqlite:///{scratch.name}'
+    os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='page-check-'))
+
+    import app as m
+    from flask_jwt_extended import create_access_token
+
+    app, db = m.app, m.db
+    app.config['RATELIMIT_ENABLED'] = False
+    m.limiter.enabled = False
+
+    with app.app_context():
+        db.create_all()
+        user_id, course_id = seed(m)
+        token = create_access_token(identity=str(user_id))
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    failures = 0
+    for path in (f'/courses/{course_id}/chat-history', '/notifications',
+                 f'/courses/{course_id}/quizzes/history'):
+        try:
+            ids, requests = page_through(client, path, headers)
+            if sorted(ids) != sorted(set(ids)) or len(ids) != ROWS:
+                raise AssertionError(f"{path} returned ids {ids}, expected {ROWS} distinct rows")
+            print(f"ok    GET {path}: {ROWS} rows in {requests} pages")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL  {e}")
+
+    if scratch is not None:
+        scratch.close()
+        os.unlink(scratch.name)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""
+Query plan check - fails if any registered GET route falls back to a sequential scan.
+
+Seeds a scratch database, calls every GET route with a logged-in test client,
+captures the SQL each route runs and EXPLAINs it. Also checks that listing flashcards
+issues the same number of statements for one deck as for many decks with many cards.
+
+Usage:
+    python check_query_plans.py                       # scratch SQLite database
+    python check_query_plans.py --database-url URL    # e.g. an empty PostgreSQL database
+
+Exits with status 1 when a sequential scan is found or the flashcard statement count grows with decks.
+"""
+
+import os
+import re
+import sys
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+# Routes that do no database work or need external services
+SKIP_ROUTES = {
+    '/health',
+    '/metrics',
+    '/auth/google',
+    '/auth/google/callback',
+    '/uploads/<path:filename>',
+    '/courses/<int:course_id>/search',
+    '/notifications/stream',
+    '/static/<path:filename>',
+}
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?"?(\w+)"?')
+POSTGRES_SCAN = re.compile(r'Seq Scan on "?(\w+)"?')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database to seed and check (defaults to a scratch SQLite file)')
+    parser.add_argument('--verbose', action='store_true', help='Print every plan, not only failures')
+    return parser.parse_args()
+
+
+def seed(app, m):
+    """Create several users so that one user's rows are a small fraction of each table, as in production"""
+    db = m.db
+    now = datetime.utcnow()
+    ids = {}
+    for n in range(8):
+        user = m.User(email=f'plan-check-{n}@example.com', first_name='Plan', reset_token=f'reset-{n}')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.flush()
+        for c in range(3):
+            course = m.Course(name=f'Course {c}', user_id=user.id)
+            db.session.add(course)
+            db.session.flush()
+            for i in range(5):
+                db.session.add(m.Document(filename=f'doc{i}.pdf', course_id=course.id, source_type='pdf',
+                                          vector_store_path=f'course_{course.id}/doc_{i}', processing_status='ready',
+                                          ingestion_batch_id=f'batch-{course.id}' if i < 2 else None))
+                db.session.add(m.Note(title=f'Note {i}', content='...', course_id=course.id, user_id=user.id))
+                db.session.add(m.Notification(user_id=user.id, message='Hello', type='info', course_id=course.id))
+                db.session.add(m.ChatMessage(course_id=course.id, user_id=user.id, role='user', content='Hi'))
+                db.session.add(m.StudySession(user_id=user.id, course_id=course.id, start_time=now - timedelta(days=i),
+                                              duration_seconds=600, activity_type='chat'))
+                db.session.add(m.CourseGlossary(course_id=course.id, term=f'Term {i}', definition='...'))
+                db.session.add(m.DailyActivity(user_id=user.id, course_id=course.id, day=(now - timedelta(days=i)).date(),
+                                               study_seconds=600, quizzes=1, flashcard_reviews=3))
+                attempt = m.QuizAttempt(user_id=user.id, course_id=course.id, score=80.0)
+                db.session.add(attempt)
+                db.session.flush()
+                db.session.add(m.QuizQuestionResponse(quiz_attempt_id=attempt.id, question_text='Q?',
+                                                      selected_option='A', correct_option='A', is_correct=True))
+            deck = m.FlashcardDeck(course_id=course.id, user_id=user.id, name='Deck')
+            db.session.add(deck)
+            db.session.flush()
+            for i in range(10):
+                db.session.add(m.Flashcard(deck_id=deck.id, front='Front', back='Back',
+                                           next_review=now + timedelta(days=i - 5)))
+            share = m.CourseShare(course_id=course.id, created_by=user.id, share_token=f'token-{course.id}')
+            db.session.add(share)
+            db.session.flush()
+            ids = {
+                'user_id': user.id, 'course_id': course.id, 'deck_id': deck.id,
+                'document_id': m.Document.query.filter_by(course_id=course.id).first().id,
+                'share_token': share.share_token, 'share_id': share.id, 'batch_id': f'batch-{course.id}',
+            }
+    db.session.commit()
+    if db.engine.dialect.name == 'sqlite':
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('ANALYZE')
+    # Check routes as the last seeded user
+    return ids
+
+
+def count_flashcard_statements(app, m, client, headers, captured, user_id):
+    """Statements issued by GET /courses/<id>/flashcards for a course with one deck, then with many"""
+    db = m.db
+    with app.app_context():
+        course = m.Course(name='Statement count', user_id=user_id)
+        db.session.add(course)
+        db.session.flush()
+        course_id = course.id
+        db.session.add(m.FlashcardDeck(course_id=course_id, user_id=user_id, name='Deck 0'))
+        db.session.commit()
+    path = f'/courses/{course_id}/flashcards'
+    captured.clear()
+    client.get(path, headers=headers)
+    one_deck = len(captured)
+
+    now = datetime.utcnow()
+    with app.app_context():
+        for d in range(1, 20):
+            deck = m.FlashcardDeck(course_id=course_id, user_id=user_id, name=f'Deck {d}')
+            db.session.add(deck)
+            db.session.flush()
+            for i in range(25):
+                db.session.add(m.Flashcard(deck_id=deck.id, front='Front', back='Back',
+                                           next_review=now + timedelta(days=i - 12)))
+        db.session.commit()
+    captured.clear()
+    client.get(path, headers=headers)
+    return one_deck, len(captured)
+
+
+def explain(conn, dialect, statement, parameters):
+    """Return (plan lines, scanned tables) for one statement"""
+    if dialect == 'sqlite':
+        rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+        lines = [row[-1] for row in rows]
+        scans = []
+        for line in lines:
+            match = SQLITE_SCAN.match(line)
+            if match and 'INDEX' not in line:
+                scans.append(match.group(1))
+        return lines, scans
+    rows = conn.exec_driver_sql(f'EXPLAIN {statement}', parameters).fetchall()
+    lines = [row[0] for row in rows]
+    return lines, [m.group(1) for m in map(POSTGRES_SCAN.search, lines) if m]
+
+
+def main():
+    args = parse_args()
+    scratch = None
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        os.environ['DATABASE_URL'] = f'sqlite:///{scratch.name}'
+    os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='plan-check-'))
+
+    import app as m
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy import event
+
+    app, db = m.app, m.db
+    app.config['RATELIMIT_ENABLED'] = False
+    m.limiter.enabled = False
+
+    with app.app_context():
+        db.create_all()
+        ids = seed(app, m)
+        token = create_access_token(identity=str(ids['user_id']))
+        engine = db.engine
+        dialect = engine.dialect.name
+        tables = set(db.metadata.tables)
+
+    captured = []
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            captured.append((statement, parameters))
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    failures = []
+    checked = 0
+
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if 'GET' not in rule.methods or rule.rule in SKIP_ROUTES:
+            continue
+        try:
+            path = rule.build({arg: ids[arg] for arg in rule.arguments})[1]
+        except KeyError as e:
+            print(f"SKIP  {rule.rule} (no seeded value for {e})")
+            continue
+
+        captured.clear()
+        response = client.get(path, headers=headers)
+        statements = list(captured)
+        route_scans = []
+        with app.app_context(), engine.connect() as conn:
+            if dialect == 'postgresql':
+                # Small seeded tables would otherwise always be scanned sequentially
+                conn.exec_driver_sql('SET enable_seqscan = off')
+            for statement, parameters in statements:
+                lines, scans = explain(conn, dialect, statement, parameters)
+                scans = [t for t in scans if t in tables]
+                if scans:
+                    route_scans.append((statement, lines, scans))
+                elif args.verbose:
+                    print(f"      {statement.splitlines()[0][:100]}\n        " + "\n        ".join(lines))
+
+        checked += 1
+        status = 'FAIL' if route_scans else 'ok  '
+        print(f"{status}  GET {rule.rule} [{response.status_code}] {len(statements)} queries")
+        for statement, lines, scans in route_scans:
+            failures.append((rule.rule, scans))
+            print(f"      sequential scan on {', '.join(scans)}:")
+            print("        " + " ".join(statement.split())[:300])
+            print("        " + "\n        ".join(lines))
+
+    one_deck, many_decks = count_flashcard_statements(app, m, client, headers, captured, ids['user_id'])
+    constant = one_deck == many_decks
+    print(f"\n{'ok  ' if constant else 'FAIL'}  GET /courses/<int:course_id>/flashcards: "
+          f"{one_deck} queries for 1 deck, {many_decks} for 20 decks with 25 cards each")
+
+    if scratch is not None:
+        scratch.close()
+        os.unlink(scratch.name)
+
+    print(f"\nChecked {checked} routes, {len(failures)} statements with sequential scans")
+    return 1 if failures or not constant else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
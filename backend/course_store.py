@@ -0,0 +1,264 @@
+"""
+Course Store - one append-only, segment-based vector index per course
+Queries read a course's vectors from a handful of segment files instead of one vector file
+and one chunk file per document. Adding documents appends a segment. Removing or
+replacing a document writes a tombstone into the manifest, so no segment is rewritten.
+Compaction runs in the background and merges the segments into one, dropping tombstoned
+rows, once there are too many segments or too many dead rows.
+
+Layout of course_<id>/segments/:
+    seg_00000001.pkl ...  immutable {"vectors", "chunks", "spans": {document_id: (start, end)}}
+    manifest.json         {"next", "segments": {name: {"rows", "dead"}},
+                           "documents": {document_id: segment name}}
+The manifest is replaced atomically and is the only record of which rows are live; writers
+take a file lock so gunicorn workers can share a course.
+"""
+
+import os
+import json
+import time
+import pickle
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows development setups: the thread lock still serialises writers
+    fcntl = None
+
+try:
+    from store_integrity import write_atomic, ORPHAN_GRACE_SECONDS
+except ImportError:
+    from .store_integrity import write_atomic, ORPHAN_GRACE_SECONDS
+
+COURSE_STORE_ENABLED = os.environ.get('COURSE_STORE_ENABLED', 'true').lower() in ['true', 'on', '1']
+# Compact once a course has more segments than this, or this fraction of its rows is dead
+COURSE_STORE_MAX_SEGMENTS = int(os.environ.get('COURSE_STORE_MAX_SEGMENTS', 8))
+COURSE_STORE_MAX_DEAD_FRACTION = float(os.environ.get('COURSE_STORE_MAX_DEAD_FRACTION', 0.3))
+
+# One writer lock per store directory, so compacting one course never blocks another
+_write_locks = {}
+_write_locks_lock = threading.Lock()
+_compacting = set()
+_compacting_lock = threading.Lock()
+
+
+class CourseStore:
+    """The segment store of one course directory"""
+
+    def __init__(self, course_dir: str):
+        self.dir = os.path.join(course_dir, 'segments')
+        self.manifest_path = os.path.join(self.dir, 'manifest.json')
+
+    def _write_lock(self) -> threading.Lock:
+        with _write_locks_lock:
+            return _write_locks.setdefault(self.dir, threading.Lock())
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.dir, exist_ok=True)
+        with self._write_lock(), open(os.path.join(self.dir, '.lock'), 'w') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def manifest(self) -> dict:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"next": 1, "segments": {}, "documents": {}}
+
+    def _commit(self, manifest: dict):
+        write_atomic(self.manifest_path, lambda w: w.write(json.dumps(manifest).encode()))
+
+    def _segment_path(self, name: str) -> str:
+        return os.path.join(self.dir, name)
+
+    def document_ids(self) -> set:
+        """Documents with live rows in this store"""
+        return {int(document_id) for document_id in self.manifest()["documents"]}
+
+    def segment_paths(self) -> list:
+        return [self._segment_path(name) for name in self.manifest()["segments"]]
+
+    def needs_compaction(self, manifest: Optional[dict] = None) -> bool:
+        manifest = manifest or self.manifest()
+        segments = manifest["segments"].values()
+        rows = sum(s["rows"] for s in segments)
+        dead = sum(s["dead"] for s in segments)
+        return len(manifest["segments"]) > COURSE_STORE_MAX_SEGMENTS or bool(rows and dead / rows > COURSE_STORE_MAX_DEAD_FRACTION)
+
+    @staticmethod
+    def _tombstone(manifest: dict, document_id: str, spans: dict):
+        """Mark a document's current rows dead; returns segments that no longer hold live rows"""
+        name = manifest["documents"].pop(document_id, None)
+        if name is None:
+            return []
+        segment = manifest["segments"][name]
+        start, end = spans[name][document_id]
+        segment["dead"] += end - start
+        if segment["dead"] >= segment["rows"]:
+            del manifest["segments"][name]
+            return [name]
+        return []
+
+    def _spans(self, manifest: dict, names: Iterable[str]) -> dict:
+        """Row spans per document of the given segments, read from their small index files"""
+        spans = {}
+        for name in set(names):
+            with open(self._segment_path(name) + '.idx') as f:
+                spans[name] = json.load(f)
+        return spans
+
+    def append(self, documents, replace: bool = True) -> bool:
+        """
+        Append one segment holding documents, a list of (document_id, vectors, chunks); any
+        earlier rows of those documents are tombstoned. With replace=False, documents that are
+        already in the store are left as they are. Returns True if compaction is due.
+        """
+        import numpy as np
+        with self._locked():
+            manifest = self.manifest()
+            documents = [(str(d), v, c) for d, v, c in documents
+                         if len(c) and (replace or str(d) not in manifest["documents"])]
+            if not documents:
+                return False
+            spans, chunks, start = {}, [], 0
+            for document_id, vectors, document_chunks in documents:
+                spans[document_id] = (start, start + len(document_chunks))
+                chunks.extend(document_chunks)
+                start += len(document_chunks)
+            vectors = np.vstack([np.asarray(v, dtype=np.float32) for _, v, _ in documents])
+
+            name = f"seg_{manifest['next']:08d}.pkl"
+            self._write_segment(name, vectors, chunks, spans)
+            replaced = [manifest["documents"][d] for d in spans if d in manifest["documents"]]
+            old_spans = self._spans(manifest, replaced)
+            emptied = []
+            for document_id in spans:
+                emptied += self._tombstone(manifest, document_id, old_spans)
+                manifest["documents"][document_id] = name
+            manifest["segments"][name] = {"rows": len(chunks), "dead": 0}
+            manifest["next"] += 1
+            self._commit(manifest)
+            self._remove_segments(emptied)
+            return self.needs_compaction(manifest)
+
+    def delete(self, document_ids) -> bool:
+        """Tombstone documents' rows without touching any segment. Returns True if compaction is due."""
+        with self._locked():
+            manifest = self.manifest()
+            present = [str(d) for d in document_ids if str(d) in manifest["documents"]]
+            if not present:
+                return False
+            old_spans = self._spans(manifest, [manifest["documents"][d] for d in present])
+            emptied = []
+            for document_id in present:
+                emptied += self._tombstone(manifest, document_id, old_spans)
+            self._commit(manifest)
+            self._remove_segments(emptied)
+            return self.needs_compaction(manifest)
+
+    def compact(self) -> Optional[dict]:
+        """Merge all live rows into a single segment; returns {"segments", "rows", "dropped"} or None"""
+        import numpy as np
+        with self._locked():
+            manifest = self.manifest()
+            segments = manifest["segments"]
+            if len(segments) <= 1 and not any(s["dead"] for s in segments.values()):
+                return None
+            order = sorted(manifest["documents"], key=int)
+            loaded = {name: self._load_segment(name, pickle.load) for name in segments}
+            spans, chunks, parts, start = {}, [], [], 0
+            for document_id in order:
+                segment = loaded[manifest["documents"][document_id]]
+                lo, hi = segment["spans"][document_id]
+                spans[document_id] = (start, start + hi - lo)
+                chunks.extend(segment["chunks"][lo:hi])
+                parts.append(segment["vectors"][lo:hi])
+                start += hi - lo
+            old = list(segments)
+            report = {"segments": len(old), "rows": len(chunks),
+                      "dropped": sum(s["rows"] for s in segments.values()) - len(chunks)}
+            new = {"next": manifest["next"] + 1, "segments": {}, "documents": {}}
+            if chunks:
+                name = f"seg_{manifest['next']:08d}.pkl"
+                self._write_segment(name, np.vstack(parts), chunks, spans)
+                new["segments"][name] = {"rows": len(chunks), "dead": 0}
+                new["documents"] = {document_id: name for document_id in order}
+            self._commit(new)
+            self._remove_segments(old)
+            self._remove_stale_temp_files()
+            return report
+
+    def read(self, document_ids, loader: Callable = pickle.load) -> Dict[int, tuple]:
+        """
+        {document_id: (vectors, chunks)} for the requested documents that are in the store,
+        reading each segment they live in once. loader(f) unpickles a segment file.
+        """
+        for attempt in range(2):
+            manifest = self.manifest()
+            wanted = {}
+            for document_id in document_ids:
+                name = manifest["documents"].get(str(document_id))
+                if name:
+                    wanted.setdefault(name, []).append(document_id)
+            try:
+                result = {}
+                for name, ids in wanted.items():
+                    segment = self._load_segment(name, loader)
+                    for document_id in ids:
+                        lo, hi = segment["spans"][str(document_id)]
+                        result[document_id] = (segment["vectors"][lo:hi], segment["chunks"][lo:hi])
+                return result
+            except FileNotFoundError:
+                # A compaction replaced the segments after we read the manifest
+                if attempt:
+                    raise
+        return {}
+
+    def _write_segment(self, name: str, vectors, chunks: list, spans: dict):
+        path = self._segment_path(name)
+        data = {"vectors": vectors, "chunks": chunks, "spans": spans}
+        write_atomic(path, lambda w: pickle.dump(data, w, pickle.HIGHEST_PROTOCOL))
+        # Spans alone, so tombstoning needs no segment read
+        write_atomic(path + '.idx', lambda w: w.write(json.dumps(spans).encode()))
+
+    def _load_segment(self, name: str, loader: Callable) -> dict:
+        with open(self._segment_path(name), 'rb') as f:
+            return loader(f)
+
+    def _remove_segments(self, names):
+        for name in names:
+            for path in (self._segment_path(name), self._segment_path(name) + '.idx'):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _remove_stale_temp_files(self):
+        cutoff = time.time() - ORPHAN_GRACE_SECONDS
+        for entry in os.scandir(self.dir):
+            if entry.name.endswith('.tmp') and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+
+
+def compact_in_background(store: CourseStore):
+    """Start a compaction of store on a daemon thread unless one is already running in this process"""
+    with _compacting_lock:
+        if store.dir in _compacting:
+            return
+        _compacting.add(store.dir)
+
+    def run():
+        try:
+            report = store.compact()
+            if report:
+                print(f"[Course Store] Compacted {store.dir}: {report}")
+        except Exception as e:
+            print(f"[Course Store] Compaction of {store.dir} failed: {e}")
+        finally:
+            with _compacting_lock:
+                _compacting.discard(store.dir)
+
+    threading.Thread(target=run, daemon=True, name='course-store-compaction').start()
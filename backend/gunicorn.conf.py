@@ -0,0 +1,81 @@
+# backend/gunicorn.conf.py
+# Picked up automatically by gunicorn when started from this directory.
+#
+# Serving profiles (SERVING_PROFILE):
+#   threads - sync workers with a small thread pool (default). Each SSE chat/study-guide
+#             stream pins a thread for the whole LLM generation.
+#   gevent  - cooperative workers: streams wait on the LLM as cheap greenlets, so one worker
+#             holds hundreds of open streams. Embedding work is moved to native threads
+#             (see serving.run_blocking) so it never blocks the event loop.
+#
+# PRELOAD_MODELS=1 imports the app and loads the embedding model (plus the vector stores of
+# the PRELOAD_HOT_COURSES most active courses) in the master before forking, so workers
+# share those pages copy-on-write instead of each holding its own copy of torch + MiniLM.
+# Each worker logs its unique vs shared memory at startup; `flask worker-memory <master pid>`
+# prints the same report later. Workers no longer pick up code changes on HUP with preload.
+import os
+import shutil
+import tempfile
+
+SERVING_PROFILE = os.environ.get('SERVING_PROFILE', 'threads')
+PRELOAD_MODELS = os.environ.get('PRELOAD_MODELS', '0').lower() in ('1', 'true', 'yes')
+PRELOAD_HOT_COURSES = int(os.environ.get('PRELOAD_HOT_COURSES', 0))
+
+if PRELOAD_MODELS and SERVING_PROFILE == 'gevent':
+    # The app is imported in the master, so its locks and sockets must already be cooperative
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 300))
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+if SERVING_PROFILE == 'gevent':
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 500))
+else:
+    threads = int(os.environ.get('GUNICORN_THREADS', 2))
+
+preload_app = PRELOAD_MODELS
+
+# Per-worker metric files live here so /metrics can aggregate across workers.
+# Must be set before any worker imports prometheus_client. Each deployment starts with an
+# empty directory, created here rather than in a server hook: with preload_app the master
+# imports the app (and opens its metric files) in setup(), before on_starting runs.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'omnilearn-metrics'))
+shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+
+def when_ready(server):
+    """With PRELOAD_MODELS, load the shared models in the master right before the first fork."""
+    if not PRELOAD_MODELS:
+        return
+    import gc
+    from app import preload_for_fork
+    from serving import process_memory, format_memory
+    server.log.info("Preload: %s", preload_for_fork(PRELOAD_HOT_COURSES))
+    # Keep the collector from touching (and so copying) the preloaded objects in every worker
+    gc.freeze()
+    server.log.info("Preload: %s", format_memory(f"master {os.getpid()}", process_memory()))
+
+
+def post_worker_init(worker):
+    """Report this worker's unique vs shared memory; make gRPC (Gemini SDK) cooperate with gevent."""
+    if PRELOAD_MODELS:
+        from serving import process_memory, format_memory
+        worker.log.info("Preload: %s", format_memory(f"worker {worker.pid}", process_memory()))
+    if SERVING_PROFILE != 'gevent':
+        return
+    try:
+        from grpc.experimental import gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+    except ImportError:
+        pass
+
+
+def child_exit(server, worker):
+    """Drop live gauges (in-flight requests, ingestion depth) of workers that exited."""
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
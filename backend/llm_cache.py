@@ -0,0 +1,174 @@
+"""
+LLM Response Cache
+Persistent cache for deterministic generation calls (quizzes, flashcards, mind maps, ...)
+Entries are keyed by provider, model, prompt hash and generation parameters.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from typing import Any, Optional
+
+try:
+    from sqlite_cache import SQLiteCache
+except ImportError:
+    from .sqlite_cache import SQLiteCache
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(BASE_DIR, 'data'))
+LLM_CACHE_PATH = os.environ.get('LLM_CACHE_PATH', os.path.join(DATA_DIR, 'llm_cache.db'))
+
+# Defaults: one week TTL, 50 MB of cached responses
+LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+LLM_CACHE_TTL_SECONDS = int(os.environ.get('LLM_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+LLM_CACHE_MAX_BYTES = int(os.environ.get('LLM_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+
+
+class LLMResponseCache(SQLiteCache):
+    """SQLite-backed response cache with TTL and size-based (LRU) eviction"""
+
+    table = 'responses'
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl_seconds: int = LLM_CACHE_TTL_SECONDS,
+                 max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        super().__init__(path, max_bytes)
+
+    def _create_tables(self, conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                feature TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_last_accessed ON responses (last_accessed)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS stats (
+                feature TEXT PRIMARY KEY,
+                hits INTEGER NOT NULL DEFAULT 0,
+                misses INTEGER NOT NULL DEFAULT 0,
+                bypasses INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str, params: Optional[dict] = None) -> str:
+        """Build a stable cache key from provider, model, prompt hash and parameters"""
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        payload = json.dumps({
+            "provider": provider,
+            "model": model,
+            "prompt": prompt_hash,
+            "params": params or {}
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _record(self, conn, feature: str, column: str):
+        conn.execute("INSERT OR IGNORE INTO stats (feature) VALUES (?)", (feature,))
+        conn.execute(f"UPDATE stats SET {column} = {column} + 1 WHERE feature = ?", (feature,))
+
+    def get(self, feature: str, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss or expired entry"""
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[1] <= self.ttl_seconds:
+                    conn.execute("UPDATE responses SET last_accessed = ? WHERE key = ?", (now, key))
+                    self._record(conn, feature, 'hits')
+                    return json.loads(row[0])
+                if row:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._record(conn, feature, 'misses')
+        except sqlite3.Error as e:
+            print(f"[LLM Cache] Read error: {e}")
+        return None
+
+    def set(self, feature: str, key: str, value: Any):
+        """Store a JSON-serialisable value and evict old entries if over budget"""
+        now = time.time()
+        data = json.dumps(value)
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, feature, value, size, created_at, last_accessed) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, feature, data, len(data), now, now)
+                )
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"[LLM Cache] Write error: {e}")
+
+    def _evict(self, conn, now: float):
+        conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._evict_lru(conn)
+
+    def record_bypass(self, feature: str):
+        """Count a call that explicitly opted out of the cache"""
+        try:
+            with self._lock, self._connect() as conn:
+                self._record(conn, feature, 'bypasses')
+        except sqlite3.Error as e:
+            print(f"[LLM Cache] Stats error: {e}")
+
+    def stats(self) -> dict:
+        """Per-feature hit/miss counters and hit rates, plus current cache size"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT feature, hits, misses, bypasses FROM stats ORDER BY feature").fetchall()
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        features = {}
+        for feature, hits, misses, bypasses in rows:
+            lookups = hits + misses
+            features[feature] = {
+                "hits": hits,
+                "misses": misses,
+                "bypasses": bypasses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0
+            }
+        return {"entries": entries, "size_bytes": size, "max_bytes": self.max_bytes, "features": features}
+
+    def clear(self):
+        """Remove all cached responses (stats are kept)"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+
+# Global cache instance (lazy initialization)
+_llm_cache: Optional[LLMResponseCache] = None
+
+def get_llm_cache() -> LLMResponseCache:
+    """Get or create the global LLM response cache"""
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache()
+    return _llm_cache
+
+
+def cache_lookup(feature: str, llm, prompt: str, params: Optional[dict] = None, use_cache: bool = True):
+    """
+    Look up a cached response for this provider/prompt.
+    Returns (key, value); key is None when caching is disabled for this call.
+    """
+    if not LLM_CACHE_ENABLED:
+        return None, None
+    cache = get_llm_cache()
+    if not use_cache:
+        cache.record_bypass(feature)
+        return None, None
+    key = cache.make_key(llm.provider_name, llm.model_name, prompt, params)
+    return key, cache.get(feature, key)
+
+
+def cache_store(feature: str, key: Optional[str], value: Any):
+    """Store a response under a key returned by cache_lookup (no-op when key is None)"""
+    if key is None:
+        return
+    get_llm_cache().set(feature, key, value)
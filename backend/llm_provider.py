@@ -1,22 +1,38 @@
 """
 LLM Provider Abstraction Layer
-Supports multiple LLM backends: Groq (default), Gemini, OpenAI (future)
+Supports multiple LLM backends: Groq (default), Gemini, Mock (offline load testing), OpenAI (future)
 """
 
 import os
+import re
+import json
+import math
+import time
+import random
 from abc import ABC, abstractmethod
-from typing import Generator, Optional
+from typing import Dict, Generator, List, Optional
 
-# Groq imports
-from groq import Groq
+# Call latency / error / token metrics
+try:
+    from metrics import observe_llm_call, count_llm_tokens
+except ImportError:
+    from .metrics import observe_llm_call, count_llm_tokens
 
-# Gemini imports (fallback)
-import google.generativeai as genai
+# Provider SDKs (groq, google.generativeai) are imported when a provider is created,
+# so only the configured backend is ever loaded.
+
+
+# Default system instructions (override with LLM_SYSTEM_PROMPT)
+DEFAULT_SYSTEM_PROMPT = os.environ.get("LLM_SYSTEM_PROMPT", "You are a helpful educational AI tutor.")
 
 
 class LLMProvider(ABC):
     """Abstract base class for LLM providers"""
     
+    # Identify the backend and model (used for response cache keys)
+    provider_name: str = "unknown"
+    model_name: str = "unknown"
+    
     @abstractmethod
     def generate(self, prompt: str, max_tokens: int = 4096) -> str:
         """Generate a response from the LLM"""
@@ -26,11 +42,45 @@ class LLMProvider(ABC):
     def generate_stream(self, prompt: str, max_tokens: int = 4096) -> Generator[str, None, None]:
         """Generate a streaming response from the LLM"""
         pass
+    
+    # --- Structured message API ---
+    # Requests are split into system instructions, a course-context block and the question.
+    # The first two are identical across follow-up questions on the same material, so
+    # sending them first (in that order) lets providers with prefix caching reuse them.
+    
+    @staticmethod
+    def build_messages(system: str, context: str, question: str) -> List[Dict[str, str]]:
+        """Build chat messages with the stable parts (system, context) first"""
+        messages = [{"role": "system", "content": system}]
+        if context:
+            messages.append({"role": "user", "content": f"Context:\n{context}"})
+        messages.append({"role": "user", "content": question})
+        return messages
+    
+    @staticmethod
+    def flatten_messages(system: str, context: str, question: str) -> str:
+        """Single-prompt fallback for providers without a message API"""
+        parts = [system]
+        if context:
+            parts.append(f"Context:\n{context}")
+        parts.append(question)
+        return "\n\n".join(parts)
+    
+    def generate_with_context(self, system: str, context: str, question: str, max_tokens: int = 4096) -> str:
+        """Generate a response from system instructions, a context block and a question"""
+        return self.generate(self.flatten_messages(system, context, question), max_tokens=max_tokens)
+    
+    def generate_with_context_stream(self, system: str, context: str, question: str,
+                                     max_tokens: int = 4096) -> Generator[str, None, None]:
+        """Streaming version of generate_with_context"""
+        yield from self.generate_stream(self.flatten_messages(system, context, question), max_tokens=max_tokens)
 
 
 class GroqProvider(LLMProvider):
     """Groq LLM Provider - Uses LLaMA 3.3 70B by default"""
     
+    provider_name = "groq"
+    
     # Available models on Groq (as of Dec 2024)
     MODELS = {
         "llama-3.3-70b": "llama-3.3-70b-versatile",      # Best for general tasks
@@ -40,70 +90,128 @@ class GroqProvider(LLMProvider):
         "mixtral": "mixtral-8x7b-32768",                 # Fast, good quality
     }
     
-    def __init__(self, model_key: str = "llama-3.3-70b"):
+    def __init__(self, model_key: str = "llama-3.3-70b", system_prompt: str = DEFAULT_SYSTEM_PROMPT):
         api_key = os.environ.get("GROQ_API_KEY")
         if not api_key:
             raise ValueError("GROQ_API_KEY environment variable not set")
         
+        from groq import Groq
         self.client = Groq(api_key=api_key)
         self.model = self.MODELS.get(model_key, self.MODELS["llama-3.3-70b"])
+        self.model_name = self.model
+        self.system_prompt = system_prompt
         print(f"[LLM] Initialized Groq provider with model: {self.model}")
     
-    def generate(self, prompt: str, max_tokens: int = 4096) -> str:
-        """Generate a response using Groq"""
+    def _complete(self, messages: List[Dict[str, str]], max_tokens: int) -> str:
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful educational AI tutor."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=max_tokens,
-                temperature=0.7,
-            )
+            with observe_llm_call(self.provider_name, "generate"):
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=0.7,
+                )
+            usage = getattr(response, "usage", None)
+            if usage:
+                count_llm_tokens(self.provider_name, usage.prompt_tokens, usage.completion_tokens)
             return response.choices[0].message.content
         except Exception as e:
             print(f"[LLM] Groq error: {e}")
             raise
     
-    def generate_stream(self, prompt: str, max_tokens: int = 4096) -> Generator[str, None, None]:
-        """Generate a streaming response using Groq"""
+    def _complete_stream(self, messages: List[Dict[str, str]], max_tokens: int) -> Generator[str, None, None]:
         try:
-            stream = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful educational AI tutor."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=max_tokens,
-                temperature=0.7,
-                stream=True,
-            )
-            for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            with observe_llm_call(self.provider_name, "stream"):
+                stream = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=0.7,
+                    stream=True,
+                )
+                deltas = 0
+                for chunk in stream:
+                    if chunk.choices[0].delta.content:
+                        deltas += 1
+                        yield chunk.choices[0].delta.content
+                count_llm_tokens(self.provider_name, completion_tokens=deltas)
         except Exception as e:
             print(f"[LLM] Groq streaming error: {e}")
             raise
+    
+    def generate(self, prompt: str, max_tokens: int = 4096) -> str:
+        """Generate a response using Groq"""
+        return self._complete(self.build_messages(self.system_prompt, "", prompt), max_tokens)
+    
+    def generate_stream(self, prompt: str, max_tokens: int = 4096) -> Generator[str, None, None]:
+        """Generate a streaming response using Groq"""
+        yield from self._complete_stream(self.build_messages(self.system_prompt, "", prompt), max_tokens)
+    
+    def generate_with_context(self, system: str, context: str, question: str, max_tokens: int = 4096) -> str:
+        """Generate using separate system/context/question messages"""
+        return self._complete(self.build_messages(system, context, question), max_tokens)
+    
+    def generate_with_context_stream(self, system: str, context: str, question: str,
+                                     max_tokens: int = 4096) -> Generator[str, None, None]:
+        """Stream using separate system/context/question messages"""
+        yield from self._complete_stream(self.build_messages(system, context, question), max_tokens)
 
 
 class GeminiProvider(LLMProvider):
     """Gemini LLM Provider - Fallback option"""
     
+    provider_name = "gemini"
+    
     def __init__(self, model_name: str = "gemini-2.5-flash-preview-05-20"):
         api_key = os.environ.get("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY environment variable not set")
         
+        import google.generativeai as genai
         genai.configure(api_key=api_key)
+        self._genai = genai
         self.model = genai.GenerativeModel(model_name)
+        self.model_name = model_name
+        # Gemini takes system instructions per model object; keep one per distinct instruction
+        self._system_models = {}
         print(f"[LLM] Initialized Gemini provider with model: {model_name}")
     
+    def _model_for(self, system: str):
+        if system not in self._system_models:
+            self._system_models[system] = self._genai.GenerativeModel(self.model_name, system_instruction=system)
+        return self._system_models[system]
+    
+    def _count_usage(self, response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            count_llm_tokens(self.provider_name, getattr(usage, "prompt_token_count", None),
+                             getattr(usage, "candidates_token_count", None))
+    
+    def _generate(self, model, contents) -> str:
+        with observe_llm_call(self.provider_name, "generate"):
+            response = model.generate_content(contents)
+        self._count_usage(response)
+        return response.text
+    
+    def _generate_stream(self, model, contents) -> Generator[str, None, None]:
+        with observe_llm_call(self.provider_name, "stream"):
+            response_stream = model.generate_content(contents, stream=True)
+            for chunk in response_stream:
+                if chunk.text:
+                    yield chunk.text
+        # Usage metadata is populated once the stream has been fully consumed
+        self._count_usage(response_stream)
+    
+    @staticmethod
+    def _contents(context: str, question: str):
+        # Context goes first so repeated requests share a prefix (implicit caching)
+        parts = [f"Context:\n{context}", question] if context else [question]
+        return [{"role": "user", "parts": parts}]
+    
     def generate(self, prompt: str, max_tokens: int = 4096) -> str:
         """Generate a response using Gemini"""
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            return self._generate(self.model, prompt)
         except Exception as e:
             print(f"[LLM] Gemini error: {e}")
             raise
@@ -111,15 +219,179 @@ class GeminiProvider(LLMProvider):
     def generate_stream(self, prompt: str, max_tokens: int = 4096) -> Generator[str, None, None]:
         """Generate a streaming response using Gemini"""
         try:
-            response_stream = self.model.generate_content(prompt, stream=True)
-            for chunk in response_stream:
-                if chunk.text:
-                    yield chunk.text
+            yield from self._generate_stream(self.model, prompt)
+        except Exception as e:
+            print(f"[LLM] Gemini streaming error: {e}")
+            raise
+    
+    def generate_with_context(self, system: str, context: str, question: str, max_tokens: int = 4096) -> str:
+        """Generate using a system instruction plus context/question parts"""
+        try:
+            return self._generate(self._model_for(system), self._contents(context, question))
+        except Exception as e:
+            print(f"[LLM] Gemini error: {e}")
+            raise
+    
+    def generate_with_context_stream(self, system: str, context: str, question: str,
+                                     max_tokens: int = 4096) -> Generator[str, None, None]:
+        """Stream using a system instruction plus context/question parts"""
+        try:
+            yield from self._generate_stream(self._model_for(system), self._contents(context, question))
         except Exception as e:
             print(f"[LLM] Gemini streaming error: {e}")
             raise
 
 
+class MockProvider(LLMProvider):
+    """
+    Offline stand-in provider for load testing and local benchmarking.
+    Returns schema-valid quiz/flashcard/mind-map/concept JSON and streams
+    tokens with a configurable first-token latency and token rate.
+    
+    Configuration (environment):
+        MOCK_LLM_TOKENS_PER_SEC   - streaming rate (default 50)
+        MOCK_LLM_LATENCY_MS       - mean time to first token (default 300)
+        MOCK_LLM_LATENCY_JITTER_MS - spread of the latency distribution (default 100)
+        MOCK_LLM_LATENCY_DIST     - 'fixed', 'uniform', 'normal' or 'lognormal' (default 'normal')
+        MOCK_LLM_SEED             - optional seed for reproducible runs
+    
+    Set LLM_CACHE_ENABLED=false when benchmarking so every request pays the simulated cost.
+    """
+    
+    provider_name = "mock"
+    model_name = "mock"
+    
+    def __init__(self, tokens_per_sec: Optional[float] = None, latency_ms: Optional[float] = None,
+                 jitter_ms: Optional[float] = None, distribution: Optional[str] = None,
+                 seed: Optional[int] = None):
+        self.tokens_per_sec = tokens_per_sec or float(os.environ.get("MOCK_LLM_TOKENS_PER_SEC", 50))
+        self.latency_ms = latency_ms if latency_ms is not None else float(os.environ.get("MOCK_LLM_LATENCY_MS", 300))
+        self.jitter_ms = jitter_ms if jitter_ms is not None else float(os.environ.get("MOCK_LLM_LATENCY_JITTER_MS", 100))
+        self.distribution = (distribution or os.environ.get("MOCK_LLM_LATENCY_DIST", "normal")).lower()
+        if seed is None and os.environ.get("MOCK_LLM_SEED"):
+            seed = int(os.environ["MOCK_LLM_SEED"])
+        self.rng = random.Random(seed)
+        print(f"[LLM] Initialized Mock provider ({self.tokens_per_sec} tok/s, "
+              f"{self.latency_ms}ms {self.distribution} latency)")
+    
+    def _first_token_delay(self) -> float:
+        """Sample a time-to-first-token in seconds"""
+        mean, spread = self.latency_ms, self.jitter_ms
+        if self.distribution == "fixed":
+            delay = mean
+        elif self.distribution == "uniform":
+            delay = self.rng.uniform(mean - spread, mean + spread)
+        elif self.distribution == "lognormal" and mean > 0:
+            # Parameterise so the distribution has the requested mean and standard deviation
+            sigma2 = math.log(1 + (spread / mean) ** 2)
+            delay = self.rng.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+        else:
+            delay = self.rng.gauss(mean, spread)
+        return max(0.0, delay) / 1000.0
+    
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        # Word-ish tokens that re-join to the original text
+        return re.findall(r"\S+\s*|\s+", text)
+    
+    @staticmethod
+    def _int_after(pattern: str, prompt: str, default: int) -> int:
+        match = re.search(pattern, prompt, re.IGNORECASE)
+        return int(match.group(1)) if match else default
+    
+    def _respond(self, prompt: str) -> str:
+        """Pick a schema-valid canned response based on what the prompt asks for"""
+        if '"type": "mcq"' in prompt:
+            return json.dumps(self._quiz(prompt))
+        if "Generate ONE new flashcard" in prompt:
+            return json.dumps({"front": "What is a mock concept?", "back": "A placeholder answer.",
+                               "source": "mock.pdf", "page": 1})
+        if '"front"' in prompt:
+            count = self._int_after(r"generate (\d+) high-quality flashcards", prompt, 10)
+            return json.dumps([{"front": f"Mock question {i}?", "back": f"Mock answer {i}.",
+                                "source": "mock.pdf", "page": i} for i in range(1, count + 1)])
+        if "mind map structure" in prompt:
+            return json.dumps(self._mind_map())
+        if '"related_terms"' in prompt:
+            count = self._int_after(r"extract the (\d+) most important", prompt, 30)
+            return json.dumps([{"term": f"Term {i}", "definition": f"Definition of term {i}.",
+                                "related_terms": [f"Term {i + 1}"], "source": "mock.pdf"}
+                               for i in range(1, count + 1)])
+        if '"rubric_breakdown"' in prompt:
+            return json.dumps({
+                "score": 80, "grade_letter": "B", "feedback": "Mock feedback.",
+                "strengths": ["Clear"], "improvements": ["More detail"],
+                "rubric_breakdown": {
+                    "content_accuracy": {"score": 32, "comment": "Mostly accurate"},
+                    "understanding": {"score": 20, "comment": "Good"},
+                    "completeness": {"score": 16, "comment": "Covers most parts"},
+                    "clarity": {"score": 12, "comment": "Readable"}
+                }
+            })
+        sentence = "This is a mock answer generated offline for load testing, citing the course material [1]. "
+        return (sentence * 8).strip()
+    
+    def _quiz(self, prompt: str) -> list:
+        count = self._int_after(r"exactly (\d+) questions", prompt, 5)
+        types_match = re.search(r"question types: ([^*\n]+)", prompt)
+        type_names = {"Multiple Choice": "mcq", "True/False": "true_false", "Fill in the Blank": "fill_blank"}
+        types = [type_names[t.strip()] for t in types_match.group(1).split(",")
+                 if t.strip() in type_names] if types_match else []
+        types = types or ["mcq"]
+        quiz = []
+        for i in range(count):
+            qtype = types[i % len(types)]
+            if qtype == "mcq":
+                quiz.append({"type": "mcq", "question": f"Mock question {i + 1}?",
+                             "options": {"A": "Option A", "B": "Option B", "C": "Option C", "D": "Option D"},
+                             "answer": "B", "explanation": "Mock explanation."})
+            elif qtype == "true_false":
+                quiz.append({"type": "true_false", "question": f"Mock statement {i + 1}.",
+                             "answer": "True", "explanation": "Mock explanation."})
+            else:
+                quiz.append({"type": "fill_blank", "question": f"Mock ___ number {i + 1}.",
+                             "answer": "blank", "explanation": "Mock explanation.",
+                             "acceptable_answers": ["blank"]})
+        return quiz
+    
+    @staticmethod
+    def _mind_map() -> dict:
+        nodes = [{"id": "1", "label": "Mock Topic", "type": "central", "description": "Central topic"}]
+        edges = []
+        next_id = 2
+        for m in range(1, 4):
+            main_id = str(next_id)
+            nodes.append({"id": main_id, "label": f"Concept {m}", "type": "main", "description": "Main concept"})
+            edges.append({"source": "1", "target": main_id, "label": "includes"})
+            next_id += 1
+            for sub in range(1, 3):
+                sub_id = str(next_id)
+                nodes.append({"id": sub_id, "label": f"Detail {m}.{sub}", "type": "sub", "description": "Sub-concept"})
+                edges.append({"source": main_id, "target": sub_id, "label": "has"})
+                next_id += 1
+        return {"central_topic": "Mock Topic", "nodes": nodes, "edges": edges}
+    
+    def generate(self, prompt: str, max_tokens: int = 4096) -> str:
+        """Return a canned response after simulating latency and generation time"""
+        text = self._respond(prompt)
+        tokens = self._tokens(text)[:max_tokens]
+        with observe_llm_call(self.provider_name, "generate"):
+            time.sleep(self._first_token_delay() + len(tokens) / self.tokens_per_sec)
+        count_llm_tokens(self.provider_name, len(self._tokens(prompt)), len(tokens))
+        return "".join(tokens)
+    
+    def generate_stream(self, prompt: str, max_tokens: int = 4096) -> Generator[str, None, None]:
+        """Stream a canned response at the configured token rate"""
+        tokens = self._tokens(self._respond(prompt))[:max_tokens]
+        interval = 1.0 / self.tokens_per_sec
+        with observe_llm_call(self.provider_name, "stream"):
+            time.sleep(self._first_token_delay())
+            for token in tokens:
+                yield token
+                time.sleep(interval)
+        count_llm_tokens(self.provider_name, len(self._tokens(prompt)), len(tokens))
+
+
 # Factory function to get the appropriate provider
 def get_llm_provider(provider_name: Optional[str] = None) -> LLMProvider:
     """
@@ -129,6 +401,8 @@ def get_llm_provider(provider_name: Optional[str] = None) -> LLMProvider:
     1. Explicit provider_name argument
     2. LLM_PROVIDER environment variable
     3. Default to Groq if GROQ_API_KEY exists, else Gemini
+    
+    Set LLM_PROVIDER=mock to run without any API key (offline load testing).
     """
     if provider_name is None:
         provider_name = os.environ.get("LLM_PROVIDER", "auto")
@@ -142,13 +416,15 @@ def get_llm_provider(provider_name: Optional[str] = None) -> LLMProvider:
         elif os.environ.get("GEMINI_API_KEY"):
             provider_name = "gemini"
         else:
-            raise ValueError("No LLM API key found. Set GROQ_API_KEY or GEMINI_API_KEY.")
+            raise ValueError("No LLM API key found. Set GROQ_API_KEY or GEMINI_API_KEY (or LLM_PROVIDER=mock).")
     
     if provider_name == "groq":
         model = os.environ.get("GROQ_MODEL", "llama-3.3-70b")
         return GroqProvider(model_key=model)
     elif provider_name == "gemini":
         return GeminiProvider()
+    elif provider_name == "mock":
+        return MockProvider()
     else:
         raise ValueError(f"Unknown LLM provider: {provider_name}")
 
@@ -0,0 +1,113 @@
+"""
+Streaming load test - how many chat streams a running server serves concurrently.
+
+Opens N streaming chat requests at once against a course that already has processed
+documents and reports time to first token, total duration and the peak number of
+streams that were producing tokens at the same time.
+
+Compare serving profiles with the mock provider so the LLM is not the bottleneck:
+
+    LLM_PROVIDER=mock MOCK_LLM_LATENCY_MS=500 MOCK_LLM_TOKENS_PER_SEC=20 gunicorn app:app
+    python loadtest_streams.py --email me@example.com --password ... --course-id 1 --concurrency 20
+
+    LLM_PROVIDER=mock MOCK_LLM_LATENCY_MS=500 MOCK_LLM_TOKENS_PER_SEC=20 SERVING_PROFILE=gevent gunicorn app:app
+    python loadtest_streams.py --email me@example.com --password ... --course-id 1 --concurrency 20
+
+The first chat in a fresh worker loads the embedding model and vector stores, so --warmup
+streams (default 1) run one at a time before the measured burst and are not reported.
+The default rate limit (100 requests per hour per client) caps one server at ~95 streams.
+
+Measured with the commands above (1 worker, 1 CPU core, 400-chunk course, 120 chunks per
+answer; the embedding model was an offline 384-dimension stand-in for MiniLM):
+
+    profile  streams  peak  time to first token p50 / p95  duration p50 / p95  wall
+    threads       20     2             33.15s / 60.01s       39.22s / 66.09s  66.1s
+    gevent        20    20              0.72s /  0.97s        6.84s /  7.10s   7.1s
+    gevent        50    50              1.00s /  1.12s        7.12s /  7.24s   7.4s
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--course-id', type=int, required=True)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=1, help='Unreported streams to run first, one at a time')
+    parser.add_argument('--question', default='Summarize the main ideas of this course.')
+    return parser.parse_args()
+
+
+def post_json(url, payload, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    return urllib.request.urlopen(urllib.request.Request(url, json.dumps(payload).encode(), headers), timeout=600)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def main():
+    args = parse_args()
+    with post_json(f'{args.base_url}/login', {'email': args.email, 'password': args.password}) as response:
+        token = json.load(response)['access_token']
+
+    start_barrier = threading.Barrier(args.concurrency)
+
+    def one_stream(_, barrier=start_barrier):
+        if barrier:
+            barrier.wait()
+        started = time.perf_counter()
+        first_token = None
+        tokens = 0
+        with post_json(f'{args.base_url}/courses/{args.course_id}/chat',
+                       {'question': args.question, 'stream': True, 'use_cache': False}, token) as response:
+            for line in response:
+                if not line.startswith(b'data: '):
+                    continue
+                event = json.loads(line[6:])
+                if event.get('type') == 'chunk':
+                    tokens += 1
+                    if first_token is None:
+                        first_token = time.perf_counter()
+        ended = time.perf_counter()
+        return started, first_token or ended, ended, tokens
+
+    for _ in range(args.warmup):
+        one_stream(None, barrier=None)
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one_stream, range(args.concurrency)))
+    wall = time.perf_counter() - wall_start
+
+    # Peak overlap of the intervals during which streams were producing tokens
+    events = sorted([(first, 1) for _, first, _, _ in results] + [(end, -1) for _, _, end, _ in results])
+    active = peak = 0
+    for _, delta in events:
+        active += delta
+        peak = max(peak, active)
+
+    ttft = [first - start for start, first, _, _ in results]
+    durations = [end - start for start, _, end, _ in results]
+    print(f"{args.concurrency} concurrent streams in {wall:.1f}s, peak concurrently streaming: {peak}")
+    print(f"time to first token  p50 {percentile(ttft, 50):.2f}s  p95 {percentile(ttft, 95):.2f}s  max {max(ttft):.2f}s")
+    print(f"stream duration      p50 {percentile(durations, 50):.2f}s  p95 {percentile(durations, 95):.2f}s")
+    print(f"chunks received      {sum(r[3] for r in results)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
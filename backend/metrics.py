@@ -0,0 +1,320 @@
+"""
+Metrics - Prometheus-style instrumentation for the backend
+HTTP request latency, DB queries, embedding/vector store activity, LLM calls,
+ingestion queue depth, and RAG stage / streaming LLM timing.
+
+Multiple gunicorn workers: set PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py does this)
+so every worker writes its samples to shared files that /metrics aggregates.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Generator, Iterable, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Buckets in seconds, from sub-millisecond similarity search up to slow cold model loads
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_RATE_BUCKETS = (1, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+RAG_STAGE_SECONDS = Histogram(
+    'rag_stage_seconds',
+    'Time spent in each RAG pipeline stage',
+    ['stage'],
+    buckets=STAGE_BUCKETS
+)
+LLM_TIME_TO_FIRST_TOKEN_SECONDS = Histogram(
+    'llm_time_to_first_token_seconds',
+    'Time from starting a streaming LLM request to its first token',
+    ['provider'],
+    buckets=STAGE_BUCKETS
+)
+LLM_INTER_TOKEN_SECONDS = Histogram(
+    'llm_inter_token_seconds',
+    'Mean gap between streamed tokens per request',
+    ['provider'],
+    buckets=STAGE_BUCKETS
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    'llm_tokens_per_second',
+    'Streaming output rate after the first token',
+    ['provider'],
+    buckets=TOKEN_RATE_BUCKETS
+)
+
+# --- HTTP ---
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds',
+    'Request latency per route (time to response headers for streams)',
+    ['method', 'route', 'status'],
+    buckets=STAGE_BUCKETS
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    'http_requests_in_flight',
+    'Requests currently being handled',
+    ['method', 'route'],
+    multiprocess_mode='livesum'
+)
+
+# --- Database ---
+DB_QUERY_SECONDS = Histogram(
+    'db_query_duration_seconds',
+    'SQL statement execution time (count = number of statements)',
+    ['operation'],
+    buckets=STAGE_BUCKETS
+)
+DB_QUERY_ERRORS = Counter(
+    'db_query_errors_total',
+    'SQL statements that raised an error',
+    ['operation']
+)
+
+# --- Embeddings & vector stores ---
+EMBEDDING_MODEL_LOADS = Counter(
+    'embedding_model_loads_total',
+    'Times the sentence-transformer model was loaded'
+)
+EMBEDDING_MODEL_LOAD_SECONDS = Histogram(
+    'embedding_model_load_seconds',
+    'Time to load the sentence-transformer model',
+    buckets=STAGE_BUCKETS
+)
+EMBEDDING_ENCODE_SECONDS = Histogram(
+    'embedding_encode_seconds',
+    'Time spent encoding text into embeddings',
+    ['kind'],
+    buckets=STAGE_BUCKETS
+)
+VECTOR_STORE_READS = Counter(
+    'vector_store_reads_total',
+    'Vector store files read from disk',
+    ['kind']
+)
+VECTOR_STORE_READ_BYTES = Counter(
+    'vector_store_read_bytes_total',
+    'Bytes of vector store files read from disk',
+    ['kind']
+)
+
+# --- LLM calls ---
+LLM_REQUEST_SECONDS = Histogram(
+    'llm_request_duration_seconds',
+    'LLM call latency (full generation, including streamed calls)',
+    ['provider', 'mode'],
+    buckets=STAGE_BUCKETS
+)
+LLM_REQUESTS = Counter(
+    'llm_requests_total',
+    'LLM calls by outcome',
+    ['provider', 'mode', 'status']
+)
+LLM_TOKENS = Counter(
+    'llm_tokens_total',
+    'LLM tokens by direction (provider-reported usage, or streamed deltas when unavailable)',
+    ['provider', 'direction']
+)
+
+# --- Ingestion ---
+INGESTION_QUEUE_DEPTH = Gauge(
+    'ingestion_queue_depth',
+    'Sources currently waiting for or undergoing ingestion',
+    ['source_type'],
+    multiprocess_mode='livesum'
+)
+
+
+@contextmanager
+def observe_llm_call(provider: str, mode: str):
+    """Record latency and success/error of one LLM call"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        LLM_REQUESTS.labels(provider=provider, mode=mode, status='error').inc()
+        raise
+    finally:
+        LLM_REQUEST_SECONDS.labels(provider=provider, mode=mode).observe(time.perf_counter() - start)
+    LLM_REQUESTS.labels(provider=provider, mode=mode, status='success').inc()
+
+
+def count_llm_tokens(provider: str, prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None):
+    if prompt_tokens:
+        LLM_TOKENS.labels(provider=provider, direction='prompt').inc(prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(provider=provider, direction='completion').inc(completion_tokens)
+
+
+@contextmanager
+def track_ingestion(source_type: str):
+    """Count a source as queued/in progress for the duration of the block"""
+    gauge = INGESTION_QUEUE_DEPTH.labels(source_type=source_type)
+    gauge.inc()
+    try:
+        yield
+    finally:
+        gauge.dec()
+
+
+class StageTimer:
+    """
+    Collects per-stage timings for one request.
+    Each stage is recorded in `timings` (milliseconds) and observed in RAG_STAGE_SECONDS.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        self.timings[f"{name}_ms"] = round(self.timings.get(f"{name}_ms", 0) + seconds * 1000, 2)
+        RAG_STAGE_SECONDS.labels(stage=name).observe(seconds)
+
+    def stream(self, provider: str, tokens: Iterable[str]) -> Generator[str, None, None]:
+        """
+        Wrap an LLM token stream, recording time-to-first-token and inter-token rate.
+        Streamed deltas are used as the token unit (providers emit roughly one token per delta).
+        """
+        start = time.perf_counter()
+        first = None
+        count = 0
+        for token in tokens:
+            if first is None:
+                first = time.perf_counter()
+                self.record('llm_first_token', first - start)
+                LLM_TIME_TO_FIRST_TOKEN_SECONDS.labels(provider=provider).observe(first - start)
+            count += 1
+            yield token
+        end = time.perf_counter()
+        self.record('llm_total', end - start)
+        self.timings['tokens'] = count
+        if first is not None and count > 1 and end > first:
+            rate = (count - 1) / (end - first)
+            gap = (end - first) / (count - 1)
+            self.timings['tokens_per_sec'] = round(rate, 1)
+            self.timings['inter_token_ms'] = round(gap * 1000, 2)
+            LLM_TOKENS_PER_SECOND.labels(provider=provider).observe(rate)
+            LLM_INTER_TOKEN_SECONDS.labels(provider=provider).observe(gap)
+
+    def summary(self) -> dict:
+        """All recorded timings plus the total elapsed time"""
+        return dict(self.timings, total_ms=round((time.perf_counter() - self.started) * 1000, 2))
+
+
+class LLMCacheCollector:
+    """Exposes the persistent LLM response cache stats (already shared across workers)"""
+
+    def describe(self):
+        # Lets the registry skip calling collect() at registration, which would open the cache at import
+        return []
+
+    def collect(self):
+        try:
+            from llm_cache import LLM_CACHE_ENABLED, get_llm_cache
+        except ImportError:
+            from .llm_cache import LLM_CACHE_ENABLED, get_llm_cache
+        if not LLM_CACHE_ENABLED:
+            return
+        stats = get_llm_cache().stats()
+        lookups = CounterMetricFamily('llm_cache_lookups', 'LLM response cache lookups', labels=['feature', 'result'])
+        for feature, counts in stats['features'].items():
+            for result in ('hits', 'misses', 'bypasses'):
+                lookups.add_metric([feature, result], counts[result])
+        yield lookups
+        yield GaugeMetricFamily('llm_cache_entries', 'Entries in the LLM response cache', value=stats['entries'])
+        yield GaugeMetricFamily('llm_cache_size_bytes', 'Size of cached LLM responses', value=stats['size_bytes'])
+
+
+def init_app(app, db):
+    """Register request hooks and SQLAlchemy engine events on the Flask app"""
+    from flask import g, request
+    from sqlalchemy import event
+
+    def _route():
+        return request.url_rule.rule if request.url_rule else 'unmatched'
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_route = _route()
+        HTTP_REQUESTS_IN_FLIGHT.labels(method=request.method, route=g.metrics_route).inc()
+
+    @app.after_request
+    def _observe_request(response):
+        if 'metrics_start' in g:
+            HTTP_REQUEST_SECONDS.labels(
+                method=request.method, route=g.metrics_route, status=str(response.status_code)
+            ).observe(time.perf_counter() - g.metrics_start)
+        return response
+
+    @app.teardown_request
+    def _finish_request(exc):
+        if 'metrics_route' in g:
+            HTTP_REQUESTS_IN_FLIGHT.labels(method=request.method, route=g.metrics_route).dec()
+
+    def _operation(statement):
+        return statement.lstrip().split(None, 1)[0].upper() if statement and statement.strip() else 'UNKNOWN'
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info['metrics_query_start'].pop()
+        DB_QUERY_SECONDS.labels(operation=_operation(statement)).observe(time.perf_counter() - start)
+
+    @event.listens_for(engine, 'handle_error')
+    def _handle_error(context):
+        starts = context.connection.info.get('metrics_query_start') if context.connection is not None else None
+        if starts:
+            starts.pop()
+        DB_QUERY_ERRORS.labels(operation=_operation(context.statement)).inc()
+
+
+def render_metrics(registry: Optional[CollectorRegistry] = None):
+    """
+    Render all metrics in Prometheus text format.
+    Returns (body, content_type).
+    """
+    if registry is None:
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            # Aggregate the per-worker files written by every gunicorn worker
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            registry.register(LLMCacheCollector())
+        else:
+            registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    """Clean up a dead worker's live gauges (call from gunicorn's child_exit hook)"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
+
+
+# Single-process mode uses the default registry; register the cache collector once
+if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    REGISTRY.register(LLMCacheCollector())
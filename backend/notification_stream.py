@@ -0,0 +1,178 @@
+"""
+Notification Stream - pushes new notifications to connected clients over SSE
+An in-process broker fans notifications out to each user's open streams. Notifications
+reach the broker from every worker via PostgreSQL LISTEN/NOTIFY, or, on SQLite, from a
+poller that only queries while someone is subscribed.
+"""
+
+import os
+import json
+import time
+import queue
+import threading
+from collections import defaultdict
+from typing import Callable, Generator, List, Optional
+
+NOTIFY_CHANNEL = 'notifications'
+NOTIFICATION_POLL_INTERVAL = float(os.environ.get('NOTIFICATION_POLL_INTERVAL', 2.0))
+NOTIFICATION_STREAM_HEARTBEAT = float(os.environ.get('NOTIFICATION_STREAM_HEARTBEAT', 15.0))
+# Streams end after this long and the client reconnects, so a worker thread is never held forever
+NOTIFICATION_STREAM_MAX_SECONDS = float(os.environ.get('NOTIFICATION_STREAM_MAX_SECONDS', 300.0))
+
+
+class NotificationBroker:
+    """Thread-safe per-user fan-out of notification dicts to subscriber queues"""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        # Called (outside the lock) after a subscription that ends a period without subscribers
+        self.on_first_subscriber: Optional[Callable[[], None]] = None
+
+    def subscribe(self, user_id: int) -> queue.Queue:
+        q = queue.Queue(maxsize=100)
+        with self._lock:
+            first = not self._subscribers
+            self._subscribers[user_id].add(q)
+        if first and self.on_first_subscriber:
+            self.on_first_subscriber()
+        return q
+
+    def unsubscribe(self, user_id: int, q: queue.Queue):
+        with self._lock:
+            self._subscribers[user_id].discard(q)
+            if not self._subscribers[user_id]:
+                del self._subscribers[user_id]
+
+    def has_subscribers(self) -> bool:
+        with self._lock:
+            return bool(self._subscribers)
+
+    def publish(self, notification: dict):
+        with self._lock:
+            targets = list(self._subscribers.get(notification.get('user_id'), ()))
+        for q in targets:
+            try:
+                q.put_nowait(notification)
+            except queue.Full:
+                # A stalled client drops notifications; it still sees them on its next list fetch
+                pass
+
+
+class PostgresListener(threading.Thread):
+    """LISTENs on the notifications channel and publishes every payload to the broker"""
+
+    def __init__(self, connect: Callable, broker: NotificationBroker, channel: str = NOTIFY_CHANNEL):
+        super().__init__(daemon=True, name='notification-listener')
+        self.connect = connect
+        self.broker = broker
+        self.channel = channel
+
+    def run(self):
+        while True:
+            conn = None
+            try:
+                conn = self.connect()
+                conn.autocommit = True
+                conn.execute(f'LISTEN {self.channel}')
+                for notify in conn.notifies():
+                    try:
+                        self.broker.publish(json.loads(notify.payload))
+                    except (ValueError, TypeError) as e:
+                        print(f"[Notifications] Bad payload: {e}")
+            except Exception as e:
+                print(f"[Notifications] Listener error, reconnecting: {e}")
+                time.sleep(5)
+            finally:
+                # The connection is detached from the pool, so nothing else would close it
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+class PollingListener(threading.Thread):
+    """
+    SQLite fallback: polls for notifications newer than the last seen id.
+    One query per interval for the whole process, and none while nobody is subscribed.
+    """
+
+    def __init__(self, fetch_since: Callable[[int], List[dict]], latest_id: Callable[[], int],
+                 broker: NotificationBroker, interval: float = NOTIFICATION_POLL_INTERVAL):
+        super().__init__(daemon=True, name='notification-poller')
+        self.fetch_since = fetch_since
+        self.latest_id = latest_id
+        self.broker = broker
+        self.interval = interval
+        # Notifications above last_id are still to be published; None while nobody listens
+        self.last_id = None
+        self._lock = threading.Lock()
+        broker.on_first_subscriber = self.start_from_latest
+
+    def start_from_latest(self):
+        """Start from the newest notification as the first subscriber arrives, not a poll later"""
+        try:
+            with self._lock:
+                if self.last_id is None:
+                    self.last_id = self.latest_id()
+        except Exception as e:
+            # The next poll starts from the newest notification instead
+            print(f"[Notifications] Poll error: {e}")
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                with self._lock:
+                    if not self.broker.has_subscribers():
+                        self.last_id = None
+                        continue
+                    if self.last_id is None:
+                        self.last_id = self.latest_id()
+                        continue
+                    last_id = self.last_id
+                for notification in self.fetch_since(last_id):
+                    last_id = max(last_id, notification['id'])
+                    self.broker.publish(notification)
+                with self._lock:
+                    if self.last_id is not None:
+                        self.last_id = max(self.last_id, last_id)
+            except Exception as e:
+                print(f"[Notifications] Poll error: {e}")
+
+
+def _frame(notification: dict) -> str:
+    return f"data: {json.dumps({'type': 'notification', 'notification': notification})}\n\n"
+
+
+def sse_stream(broker: NotificationBroker, user_id: int, heartbeat: float = NOTIFICATION_STREAM_HEARTBEAT,
+               max_seconds: float = NOTIFICATION_STREAM_MAX_SECONDS,
+               backlog: Optional[Callable[[], List[dict]]] = None) -> Generator[str, None, None]:
+    """
+    Yield SSE frames for one user's new notifications until max_seconds elapse. backlog()
+    returns notifications the client missed (e.g. while reconnecting); it is called after
+    subscribing, so nothing created in between is lost, and duplicates are skipped.
+    """
+    q = broker.subscribe(user_id)
+    try:
+        yield "retry: 3000\n\n"
+        sent = set()
+        for notification in (backlog() if backlog else []):
+            sent.add(notification['id'])
+            yield _frame(notification)
+        deadline = time.monotonic() + max_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                notification = q.get(timeout=min(heartbeat, remaining))
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if notification['id'] in sent:
+                continue
+            yield _frame(notification)
+    finally:
+        broker.unsubscribe(user_id, q)
@@ -1,15 +1,21 @@
 # backend/rag_engine.py
+# Heavy dependencies (torch via sentence-transformers, sklearn, PyPDF2, trafilatura, yt-dlp,
+# whisper) are imported where they are first used, so the app, CLI commands and migrations
+# start without paying for them. Keep it that way: check_import_time.py guards it.
 import os
-import PyPDF2
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
+import hashlib
+import secrets
+import importlib.util
 import numpy as np
 import pickle
-from sklearn.metrics.pairwise import cosine_similarity
 import json
-import trafilatura
 import re
-import yt_dlp
+import time
+import logging
+import threading
+import urllib.error
+import urllib.request
+from urllib.parse import urlsplit
 
 # Import LLM provider abstraction
 try:
@@ -17,21 +23,72 @@ try:
 except ImportError:
     from .llm_provider import get_provider
 
-# Whisper is optional - only needed for YouTube transcription
+# Stage timing and LLM streaming metrics
 try:
-    import whisper
-    WHISPER_AVAILABLE = True
+    import metrics
+    from metrics import StageTimer
 except ImportError:
-    whisper = None
-    WHISPER_AVAILABLE = False
+    from . import metrics
+    from .metrics import StageTimer
+
+# Persistent cache for deterministic generation calls
+try:
+    from llm_cache import cache_lookup, cache_store
+except ImportError:
+    from .llm_cache import cache_lookup, cache_store
+
+# Keeps CPU-bound embedding work off cooperative (gevent) workers
+try:
+    from serving import run_blocking
+except ImportError:
+    from .serving import run_blocking
+
+# Extracted page text and transcripts, reused when the same URL or video is added again
+try:
+    from source_cache import (get_source_cache, canonical_url, video_key,
+                              SOURCE_CACHE_PAGE_TTL_SECONDS, SOURCE_CACHE_VIDEO_TTL_SECONDS)
+except ImportError:
+    from .source_cache import (get_source_cache, canonical_url, video_key,
+                               SOURCE_CACHE_PAGE_TTL_SECONDS, SOURCE_CACHE_VIDEO_TTL_SECONDS)
+
+# Whisper transcriptions run in a bounded pool with cached models
+try:
+    from transcription import get_transcription_pool, TranscriptionQueueFull
+except ImportError:
+    from .transcription import get_transcription_pool, TranscriptionQueueFull
+
+# Crash-safe store writes with a manifest per store
+try:
+    from store_integrity import write_store, remove_store
+except ImportError:
+    from .store_integrity import write_store, remove_store
+
+# Per-course segment store that queries read instead of every document's files
+try:
+    from course_store import CourseStore, compact_in_background, COURSE_STORE_ENABLED
+except ImportError:
+    from .course_store import CourseStore, compact_in_background, COURSE_STORE_ENABLED
+
+# Whisper is optional - only needed for YouTube transcription (imported on use)
+WHISPER_AVAILABLE = importlib.util.find_spec("whisper") is not None
+if not WHISPER_AVAILABLE:
     print("Warning: whisper not available. YouTube transcription disabled.")
 
+logger = logging.getLogger(__name__)
+
 # --- Configuration ---
 EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 DATA_DIR = os.environ.get('DATA_DIR', os.path.join(BASE_DIR, 'data'))
 VECTOR_STORES_DIR = os.path.join(DATA_DIR, 'vector_stores')
 TEMP_AUDIO_DIR = os.path.join(DATA_DIR, 'temp_audio')
+YOUTUBE_URL_REGEX = r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
+# Chunks per forward pass when embedding many documents at once (batch ingestion)
+INGEST_ENCODE_BATCH_SIZE = int(os.environ.get('INGEST_ENCODE_BATCH_SIZE', 64))
+PAGE_FETCH_USER_AGENT = 'Mozilla/5.0 (compatible; OmniLearn/1.0)'
+# Largest page download read into memory (trafilatura's own fetcher caps at the same size)
+PAGE_FETCH_MAX_BYTES = int(os.environ.get('PAGE_FETCH_MAX_BYTES', 20_000_000))
+PAGE_FETCH_BLOCK_BYTES = 64 * 1024
 
 if not os.path.exists(VECTOR_STORES_DIR):
     os.makedirs(VECTOR_STORES_DIR)
@@ -41,13 +98,191 @@ if not os.path.exists(TEMP_AUDIO_DIR):
 if not os.path.exists(VECTOR_STORES_DIR):
     os.makedirs(VECTOR_STORES_DIR)
 
+# --- Prompt Instructions ---
+# Kept constant so the system prompt (and the course context sent right after it)
+# forms a stable prefix across follow-up questions.
+CHAT_SYSTEM_PROMPT = """You are a helpful and knowledgeable tutor. Your students will ask you questions about the course materials.
+Answer the user's question based *only* on the provided context.
+For each piece of information you use, cite the source document using the format [citation_number].
+The citation number corresponds to the source provided in the context, e.g., Source [1]: filename.
+If the answer is not found in the context, say "I'm sorry, I can't find the answer in the provided documents."
+"""
+
+STUDY_GUIDE_SYSTEM_PROMPT = """You are an expert academic assistant. Based on the entire text from the course materials provided, generate a comprehensive study guide.
+
+The study guide should be well-structured and include the following sections:
+1.  **High-Level Summary:** A one-paragraph overview of the entire course material.
+2.  **Key Concepts & Definitions:** A detailed glossary of the most important terms, concepts, and definitions.
+3.  **Detailed Topic Summaries:** A section-by-section summary of the main topics covered in the documents.
+4.  **Potential Discussion Questions:** A list of 5-7 thought-provoking questions that could be used for discussion or exam preparation.
+
+Format the output using Markdown for clear headings, lists, and emphasis.
+"""
+
 # --- Core Functions ---
 
+# Process-wide embedding model and pre-fork vector store data. With gunicorn's preload mode
+# both are filled in the master (see preload_embedding_model / preload_vector_stores) and
+# workers inherit the pages copy-on-write instead of each loading their own copy.
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+_preloaded_store_files = {}  # absolute path -> (mtime, unpickled data)
+
+def _load_embedding_model(call):
+    """Loads the model once per process; call(fn, *args) runs the constructor"""
+    global _embedding_model
+    with _embedding_model_lock:
+        if _embedding_model is None:
+            from sentence_transformers import SentenceTransformer
+            start = time.perf_counter()
+            _embedding_model = call(SentenceTransformer, EMBEDDING_MODEL)
+            metrics.EMBEDDING_MODEL_LOADS.inc()
+            metrics.EMBEDDING_MODEL_LOAD_SECONDS.observe(time.perf_counter() - start)
+    return _embedding_model
+
+def get_embedding_model():
+    """Returns the sentence-transformer model used for all embeddings, loading it once per process."""
+    if _embedding_model is not None:
+        return _embedding_model
+    return _load_embedding_model(run_blocking)
+
+def preload_embedding_model():
+    """
+    Loads the embedding model before gunicorn forks its workers.
+    Runs inline and only loads weights: gevent's native thread pool and torch's intra-op
+    threads (started by the first encode) do not survive fork.
+    """
+    _load_embedding_model(lambda fn, *args: fn(*args))
+
+def preload_vector_stores(vector_store_paths):
+    """Unpickles the vector and chunk files of the given documents into the pre-fork cache; returns bytes read"""
+    total = 0
+    for vector_path in vector_store_paths:
+        chunks_path = vector_path.replace('_vectors.pkl', '_chunks.pkl')
+        for path in (vector_path, chunks_path):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                mtime = os.fstat(f.fileno()).st_mtime
+                _preloaded_store_files[os.path.abspath(path)] = (mtime, pickle.load(f))
+                total += f.tell()
+    return total
+
+def preload_course_stores(course_ids):
+    """
+    Unpickles the segment files of the given courses into the pre-fork cache.
+    Returns (bytes read, ids of the documents they cover).
+    """
+    total = 0
+    covered = set()
+    for course_id in course_ids:
+        store = course_store(course_id)
+        if not store:
+            continue
+        for path in store.segment_paths():
+            with open(path, 'rb') as f:
+                mtime = os.fstat(f.fileno()).st_mtime
+                _preloaded_store_files[os.path.abspath(path)] = (mtime, pickle.load(f))
+                total += f.tell()
+        covered |= store.document_ids()
+    return total, covered
+
+def encode_texts(model, texts, kind, **kwargs):
+    """Encodes texts with the embedding model, recording encode time by kind ('query' or 'document')."""
+    with metrics.EMBEDDING_ENCODE_SECONDS.labels(kind=kind).time():
+        return run_blocking(model.encode, texts, **kwargs)
+
+def _load_pickle(f, kind):
+    """
+    Unpickles a vector store file ('vectors' or 'chunks'), recording read metrics.
+    Files preloaded before fork are served from memory while they are unchanged on disk;
+    callers must treat the returned data as read-only.
+    """
+    preloaded = _preloaded_store_files.get(os.path.abspath(f.name))
+    if preloaded and preloaded[0] == os.fstat(f.fileno()).st_mtime:
+        return preloaded[1]
+    data = pickle.load(f)
+    metrics.VECTOR_STORE_READS.labels(kind=kind).inc()
+    metrics.VECTOR_STORE_READ_BYTES.labels(kind=kind).inc(f.tell())
+    return data
+
+def cosine_similarity(a, b):
+    """sklearn's cosine_similarity, imported on first use"""
+    from sklearn.metrics.pairwise import cosine_similarity as sk_cosine_similarity
+    return sk_cosine_similarity(a, b)
+
+def _text_splitter():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        length_function=len
+    )
+
+def chunk_timed_segments(segments, chunk_size=1000, chunk_overlap=200):
+    """
+    Groups timed transcript segments ({'text', 'start', 'duration'}) into chunks of about
+    chunk_size characters in a single pass, as they arrive. Yields chunk dicts in the
+    metadata format create_vector_store accepts, with the 'start'/'end' seconds they cover.
+    Consecutive chunks share trailing segments worth up to chunk_overlap characters.
+    """
+    window = []  # (text, start, end) of the segments in the current chunk
+    size = 0
+    unsent = 0   # segments in the window not yet part of an emitted chunk
+    index = 0
+    for segment in segments:
+        text = segment['text'].strip()
+        if not text:
+            continue
+        start = float(segment['start'])
+        end = start + float(segment.get('duration') or 0)
+        # A single over-long segment (e.g. captions without punctuation breaks) is split up
+        pieces = [text] if len(text) <= chunk_size else _text_splitter().split_text(text)
+        for piece in pieces:
+            if window and size + len(piece) > chunk_size:
+                yield _timed_chunk(window, index)
+                index += 1
+                unsent = 0
+                # Keep the trailing segments as overlap, as long as the next piece still fits
+                while window and (size > chunk_overlap or size + len(piece) > chunk_size):
+                    size -= len(window.pop(0)[0]) + 1
+            window.append((piece, start, end))
+            size += len(piece) + 1
+            unsent += 1
+    if unsent:
+        yield _timed_chunk(window, index)
+
+def _timed_chunk(window, index):
+    return {
+        "text": " ".join(text for text, _, _ in window),
+        "page": None,
+        "chunk_index": index,
+        "start": round(window[0][1], 2),
+        "end": round(max(end for _, _, end in window), 2)
+    }
+
+def format_timestamp(seconds):
+    """12:34 or 1:02:03"""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes}:{secs:02d}"
+
+def citation_timestamp(source_url, start):
+    """Citation locator for a timed chunk: seconds, label and a link that opens the video at that moment"""
+    match = re.match(YOUTUBE_URL_REGEX, source_url or '')
+    return {
+        "start": int(start),
+        "label": format_timestamp(start),
+        "url": f"https://www.youtube.com/watch?v={match.group(6)}&t={int(start)}s" if match else None
+    }
+
 def process_pdf_and_get_chunks(pdf_file_stream):
     """
     Loads a PDF, extracts text with page tracking, and splits it into chunks with metadata.
     Returns list of dicts: [{"text": str, "page": int, "chunk_index": int}, ...]
     """
+    import PyPDF2
     reader = PyPDF2.PdfReader(pdf_file_stream)
     
     # Extract text page by page with page numbers
@@ -57,11 +292,7 @@ def process_pdf_and_get_chunks(pdf_file_stream):
         if page_text.strip():
             pages_text.append({"text": page_text, "page": page_num})
 
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len
-    )
+    text_splitter = _text_splitter()
     
     # Process each page and track which page each chunk came from
     chunks_with_metadata = []
@@ -79,17 +310,117 @@ def process_pdf_and_get_chunks(pdf_file_stream):
     
     return chunks_with_metadata
 
-def process_url(url):
+def is_supported_url(url):
+    """
+    Whether url may be fetched: http(s) with a host, or a scheme-less YouTube link.
+    Anything else (file://, ftp://, ...) would let users ingest files from the server.
+    """
+    parts = urlsplit(url.strip())
+    if parts.scheme:
+        return parts.scheme.lower() in ('http', 'https') and bool(parts.hostname)
+    return bool(re.match(YOUTUBE_URL_REGEX, url.strip()))
+
+class _HTTPOnlyRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Follows redirects only to http(s) URLs (urllib would also follow ftp://)"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if urlsplit(newurl).scheme.lower() not in ('http', 'https'):
+            raise urllib.error.HTTPError(newurl, code, "Redirect to an unsupported URL scheme", headers, fp)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+_page_opener = urllib.request.build_opener(_HTTPOnlyRedirectHandler)
+
+class PageTooLargeError(ValueError):
+    """A page download exceeded PAGE_FETCH_MAX_BYTES"""
+
+def _read_limited(response, limit=None):
+    """Read a response body in blocks, raising PageTooLargeError once it exceeds limit bytes"""
+    limit = limit or PAGE_FETCH_MAX_BYTES
+    too_large = PageTooLargeError(f"The page is larger than {limit // 1_000_000} MB.")
+    length = response.headers.get('Content-Length')
+    if length and length.isdigit() and int(length) > limit:
+        raise too_large
+    body = bytearray()
+    while True:
+        block = response.read(PAGE_FETCH_BLOCK_BYTES)
+        if not block:
+            return bytes(body)
+        body += block
+        if len(body) > limit:
+            raise too_large
+
+def _fetch_page(url, revalidate=False):
+    """
+    Downloads a web page and extracts its main text, returning (text, title) or (None, None).
+    Goes through the source cache: fresh entries cost no network time, stale ones are
+    revalidated with a conditional GET and still served if the site can't be reached.
+    revalidate=True treats a fresh entry as stale, for refreshing a source.
+    Raises PageTooLargeError for downloads over PAGE_FETCH_MAX_BYTES.
+    """
+    import trafilatura
+    cache = get_source_cache()
+    key = canonical_url(url)
+    cached = cache.get(key, SOURCE_CACHE_PAGE_TTL_SECONDS) if cache else None
+    if cached and cached["fresh"] and not revalidate:
+        print(f"Using cached page: {url}")
+        return cached["value"]["text"], cached["value"]["title"]
+
+    request = urllib.request.Request(url, headers={'User-Agent': PAGE_FETCH_USER_AGENT})
+    if cached and cached["etag"]:
+        request.add_header('If-None-Match', cached["etag"])
+    if cached and cached["last_modified"]:
+        request.add_header('If-Modified-Since', cached["last_modified"])
+    etag = last_modified = None
+    try:
+        with _page_opener.open(request, timeout=30) as response:
+            downloaded = _read_limited(response)
+            etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and cached:
+            print(f"Page not modified, using cached copy: {url}")
+            cache.touch(key)
+            return cached["value"]["text"], cached["value"]["title"]
+        downloaded = None
+    except (urllib.error.URLError, OSError):
+        downloaded = None
+    if downloaded is None:
+        # Some sites reject plain urllib clients; trafilatura's fetcher has no validators to offer
+        downloaded = trafilatura.fetch_url(url)
+    if downloaded is None:
+        if cached:
+            print(f"Could not fetch {url}, using stale cached copy")
+            return cached["value"]["text"], cached["value"]["title"]
+        return None, None
+
+    text = trafilatura.extract(downloaded, include_comments=False, include_tables=False)
+    metadata = trafilatura.extract_metadata(downloaded)
+    title = metadata.title if metadata and metadata.title else (url.split('/')[-1] or url)
+    if cache and text:
+        cache.set(key, {"title": title, "text": text}, etag=etag, last_modified=last_modified)
+    return text, title
+
+def process_url(url, revalidate=False):
     """
     Detects the URL type (YouTube or generic web page), processes it, 
     and returns the text chunks and a title.
+    revalidate=True bypasses fresh source cache entries (used when refreshing a document).
     """
+    if not is_supported_url(url):
+        return None, "Only http and https URLs are supported."
+
     # YouTube URL detection
-    youtube_regex = r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
-    youtube_match = re.match(youtube_regex, url)
+    youtube_match = re.match(YOUTUBE_URL_REGEX, url)
 
     if youtube_match:
+        cache = get_source_cache()
+        cached = cache.get(video_key(youtube_match.group(6)), SOURCE_CACHE_VIDEO_TTL_SECONDS) if cache else None
+        if cached and cached["fresh"] and not revalidate:
+            print(f"Using cached YouTube transcript for: {cached['value']['title']}")
+            if "segments" in cached["value"]:
+                return list(chunk_timed_segments(cached["value"]["segments"])), cached["value"]["title"]
+            return _text_splitter().split_text(cached["value"]["text"]), cached["value"]["title"]
         try:
+            import yt_dlp
             # Extract video ID from URL
             video_id = youtube_match.group(6)
             
@@ -112,11 +443,16 @@ def process_url(url):
                 except:
                     transcript = transcript_list.find_generated_transcript(['en', 'en-US', 'en-GB'])
                 
-                # Fetch the transcript
+                # Fetch the transcript, keeping each caption's timing
                 transcript_data = transcript.fetch()
-                text = " ".join([entry['text'] for entry in transcript_data])
+                segments = [{"text": entry['text'], "start": entry['start'], "duration": entry.get('duration', 0)}
+                            for entry in transcript_data]
+                chunks = list(chunk_timed_segments(segments))
                 
-                print(f"Successfully extracted YouTube transcript for: {title} ({len(text)} chars)")
+                print(f"Successfully extracted YouTube transcript for: {title} ({len(segments)} segments, {len(chunks)} chunks)")
+                if cache and chunks:
+                    cache.set(video_key(video_id), {"title": title, "segments": segments})
+                return (chunks, title) if chunks else (None, None)
                 
             except Exception as transcript_error:
                 print(f"YouTube transcript error: {transcript_error}")
@@ -137,13 +473,27 @@ def process_url(url):
                         ydl.download([url])
                     
                     temp_audio_path = os.path.join(TEMP_AUDIO_DIR, f"{video_id}.mp3")
-                    model = whisper.load_model("base")
-                    result = model.transcribe(temp_audio_path)
-                    text = result['text']
-                    os.remove(temp_audio_path)
+                    # Chunks are formed from each piece of audio as soon as it is transcribed
+                    segments = []
+                    def transcribed():
+                        for segment in get_transcription_pool().transcribe_segments(temp_audio_path):
+                            segments.append(segment)
+                            yield segment
+                    try:
+                        chunks = list(chunk_timed_segments(transcribed()))
+                    finally:
+                        if os.path.exists(temp_audio_path):
+                            os.remove(temp_audio_path)
+                    print(f"Transcribed YouTube video with whisper: {title} ({len(chunks)} chunks)")
+                    if cache and segments:
+                        cache.set(video_key(video_id), {"title": title, "segments": segments})
+                    return (chunks, title) if chunks else (None, None)
                 else:
                     return None, f"Could not get YouTube transcript. Video may not have captions enabled."
 
+        except TranscriptionQueueFull as e:
+            print(f"Error processing YouTube URL: {e}")
+            return None, str(e)
         except Exception as e:
             error_message = str(e)
             if "Sign in to confirm you're not a bot" in error_message or "confirm your age" in error_message:
@@ -154,22 +504,15 @@ def process_url(url):
                 return None, None
     else:
         # --- Generic Web Page Processing ---
-        downloaded = trafilatura.fetch_url(url)
-        if downloaded is None:
-            return None, None
-        
-        text = trafilatura.extract(downloaded, include_comments=False, include_tables=False)
-        metadata = trafilatura.extract_metadata(downloaded)
-        title = metadata.title if metadata and metadata.title else (url.split('/')[-1] or url)
+        try:
+            text, title = _fetch_page(url, revalidate)
+        except PageTooLargeError as e:
+            return None, str(e)
 
     if not text:
         return None, None
 
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len
-    )
+    text_splitter = _text_splitter()
     chunks = text_splitter.split_text(text)
     return chunks, title
 
@@ -185,7 +528,7 @@ def get_all_text_for_course(document_models):
         if os.path.exists(chunks_path):
             try:
                 with open(chunks_path, 'rb') as f:
-                    chunks = pickle.load(f)
+                    chunks = _load_pickle(f, 'chunks')
                     full_text += f"\n\n--- Content from {doc.filename} ---\n"
                     full_text += "\n".join(chunks)
                     print(f"DEBUG: Added chunks from {doc.filename}. Current full_text length: {len(full_text)}")
@@ -196,47 +539,213 @@ def get_all_text_for_course(document_models):
     print(f"DEBUG: Finished get_all_text_for_course. Final full_text length: {len(full_text)}")
     return full_text
 
+def _texts_and_metadata(chunks):
+    """
+    Splits chunks into the texts to embed and the metadata to store. Supports both plain
+    text chunks (list of strings) and metadata chunks (list of dicts with 'text', 'page',
+    'chunk_index' keys).
+    """
+    if chunks and isinstance(chunks[0], dict):
+        # New format with metadata
+        return [c["text"] for c in chunks], chunks
+    # Legacy format: plain strings
+    return chunks, [{"text": c, "page": None, "chunk_index": i} for i, c in enumerate(chunks)]
+
+def save_vector_store(embeddings, metadata, course_id, document_id, revision=None):
+    """
+    Writes one document's embeddings and chunk metadata; returns the vectors file path.
+    A revision gives the files new names, so a refreshed store never overwrites the one
+    that readers are using until Document.vector_store_path is switched to it.
+    """
+    course_vector_dir = os.path.join(VECTOR_STORES_DIR, f"course_{course_id}")
+    os.makedirs(course_vector_dir, exist_ok=True)
+    
+    stem = f"doc_{document_id}_r{revision}" if revision else f"doc_{document_id}"
+    vector_path = os.path.abspath(os.path.join(course_vector_dir, f"{stem}_vectors.pkl"))
+    # Vectors, chunks (with their metadata) and a manifest, each renamed into place after fsync
+    write_store(vector_path, embeddings, metadata)
+    return vector_path
+
 def create_vector_store(chunks, course_id, document_id):
     """
     Takes text chunks (with optional metadata), generates embeddings, and saves them.
-    Supports both plain text chunks (list of strings) and metadata chunks 
-    (list of dicts with 'text', 'page', 'chunk_index' keys).
     """
     try:
-        # Handle both formats: plain strings or dicts with metadata
-        if chunks and isinstance(chunks[0], dict):
-            # New format with metadata
-            text_chunks = [c["text"] for c in chunks]
-            metadata = chunks  # Keep full metadata
-        else:
-            # Legacy format: plain strings
-            text_chunks = chunks
-            metadata = [{"text": c, "page": None, "chunk_index": i} for i, c in enumerate(chunks)]
+        text_chunks, metadata = _texts_and_metadata(chunks)
         
-        model = SentenceTransformer(EMBEDDING_MODEL)
-        embeddings = model.encode(text_chunks, convert_to_tensor=False)
+        model = get_embedding_model()
+        embeddings = encode_texts(model, text_chunks, 'document', convert_to_tensor=False)
 
         if len(embeddings) == 0:
             return None
 
-        course_vector_dir = os.path.join(VECTOR_STORES_DIR, f"course_{course_id}")
-        os.makedirs(course_vector_dir, exist_ok=True)
-        
-        vector_path = os.path.join(course_vector_dir, f"doc_{document_id}_vectors.pkl")
-        chunks_path = os.path.join(course_vector_dir, f"doc_{document_id}_chunks.pkl")
+        vector_path = save_vector_store(embeddings, metadata, course_id, document_id)
+        index_in_course_store(course_id, [(document_id, embeddings, metadata)])
+        return vector_path
 
-        with open(vector_path, 'wb') as f:
-            pickle.dump(embeddings, f)
+    except Exception as e:
+        print(f"Error creating vector store: {e}")
+        return None
 
-        # Save metadata along with chunks
-        with open(chunks_path, 'wb') as f:
-            pickle.dump(metadata, f)
+def create_vector_stores(documents, course_id, batch_size=INGEST_ENCODE_BATCH_SIZE):
+    """
+    Embeds the chunks of several documents in one encode call, so the model sees large
+    batches that span documents, then saves each document's store.
+    documents is a list of (document_id, chunks); returns {document_id: vectors path or None}.
+    """
+    texts = []
+    spans = []
+    for document_id, chunks in documents:
+        text_chunks, metadata = _texts_and_metadata(chunks)
+        spans.append((document_id, len(texts), len(texts) + len(text_chunks), metadata))
+        texts.extend(text_chunks)
+
+    embeddings = []
+    if texts:
+        model = get_embedding_model()
+        embeddings = encode_texts(model, texts, 'document', convert_to_tensor=False, batch_size=batch_size)
+
+    paths = {}
+    for document_id, lo, hi, metadata in spans:
+        try:
+            paths[document_id] = save_vector_store(embeddings[lo:hi], metadata, course_id, document_id) if hi > lo else None
+        except OSError as e:
+            print(f"Error saving vector store for document {document_id}: {e}")
+            paths[document_id] = None
+    # One segment for the whole batch
+    index_in_course_store(course_id, [(document_id, embeddings[lo:hi], metadata)
+                                      for document_id, lo, hi, metadata in spans if paths[document_id]])
+    return paths
+
+def chunk_hash(text):
+    """Content hash used to match chunks across re-indexing"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def refresh_vector_store(chunks, course_id, document_id, old_vector_store_path):
+    """
+    Re-indexes a document from freshly extracted chunks, embedding only chunks whose text
+    is not in the current store (matched by content hash) and reusing the other vectors.
+    The result is written under a new revision; the caller switches the document to the
+    returned path and then deletes the old store.
+    Returns (vectors path or None, {"total", "reused", "embedded", "removed"}).
+    """
+    text_chunks, metadata = _texts_and_metadata(chunks)
 
-        return os.path.abspath(vector_path)
+    known = {}
+    if old_vector_store_path and os.path.exists(old_vector_store_path):
+        try:
+            with open(old_vector_store_path, 'rb') as f:
+                old_embeddings = _load_pickle(f, 'vectors')
+            with open(old_vector_store_path.replace('_vectors.pkl', '_chunks.pkl'), 'rb') as f:
+                old_texts, _ = _texts_and_metadata(_load_pickle(f, 'chunks'))
+            if len(old_texts) == len(old_embeddings):
+                for text, embedding in zip(old_texts, old_embeddings):
+                    known.setdefault(chunk_hash(text), embedding)
+            else:
+                print(f"Vector store of document {document_id} is inconsistent, re-embedding everything")
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            print(f"Could not read old vector store of document {document_id}: {e}")
+
+    hashes = [chunk_hash(text) for text in text_chunks]
+    old_hashes = set(known)
+    missing = list(dict.fromkeys(h for h in hashes if h not in known))
+    if missing:
+        texts_by_hash = dict(zip(hashes, text_chunks))
+        model = get_embedding_model()
+        fresh = encode_texts(model, [texts_by_hash[h] for h in missing], 'document',
+                             convert_to_tensor=False, batch_size=INGEST_ENCODE_BATCH_SIZE)
+        known.update(zip(missing, fresh))
+
+    stats = {
+        "total": len(hashes),
+        "reused": sum(1 for h in hashes if h in old_hashes),
+        "embedded": len(missing),
+        "removed": len(old_hashes - set(hashes))
+    }
+    if not hashes:
+        return None, stats
+    embeddings = np.array([known[h] for h in hashes])
+    revision = time.strftime('%Y%m%d%H%M%S') + secrets.token_hex(2)
+    vector_path = save_vector_store(embeddings, metadata, course_id, document_id, revision)
+    # The new segment tombstones the document's previous rows
+    index_in_course_store(course_id, [(document_id, embeddings, metadata)])
+    return vector_path, stats
+
+def course_store(course_id):
+    """The course's segment store, or None when disabled"""
+    if not COURSE_STORE_ENABLED:
+        return None
+    return CourseStore(os.path.join(VECTOR_STORES_DIR, f"course_{course_id}"))
 
+def index_in_course_store(course_id, documents, replace=True):
+    """
+    Appends documents ((document_id, embeddings, chunk metadata) tuples) to the course's
+    segment store; replace=False skips documents it already holds. The per-document files
+    stay the source of truth: a document missing from the segment store is simply read from
+    its own files. So when a replacing append fails, the documents are tombstoned rather than
+    left serving their previous rows.
+    """
+    store = course_store(course_id)
+    if not store or not documents:
+        return
+    try:
+        if store.append(documents, replace):
+            compact_in_background(store)
     except Exception as e:
-        print(f"Error creating vector store: {e}")
-        return None
+        print(f"Error indexing documents in the course store of course {course_id}: {e}")
+        if replace:
+            remove_from_course_store(course_id, [document_id for document_id, _, _ in documents])
+
+def remove_from_course_store(course_id, document_ids):
+    """Tombstones documents in the course's segment store"""
+    store = course_store(course_id)
+    if not store:
+        return
+    try:
+        if store.delete(document_ids):
+            compact_in_background(store)
+    except Exception as e:
+        # Left in place, their old rows keep being served until the store is rebuilt
+        print(f"Error removing documents from the course store of course {course_id}, "
+              f"run `flask course-store-build --rebuild`: {e}")
+
+def load_document_vectors(course_id, documents):
+    """
+    Yields (document, embeddings, chunks) for each document (model or dict) with a readable
+    store. Documents indexed in the course's segment store come from its few segment files;
+    the rest are read from their own vector and chunk files.
+    """
+    def field(doc, name):
+        return doc.get(name) if isinstance(doc, dict) else getattr(doc, name, None)
+
+    indexed = {}
+    store = course_store(course_id)
+    if store:
+        try:
+            indexed = store.read([field(doc, 'id') for doc in documents], lambda f: _load_pickle(f, 'segment'))
+        except Exception as e:
+            print(f"Error reading the course store of course {course_id}, using document files: {e}")
+
+    for doc in documents:
+        if field(doc, 'id') in indexed:
+            embeddings, chunks = indexed[field(doc, 'id')]
+            yield doc, embeddings, chunks
+            continue
+        vector_store_path = field(doc, 'vector_store_path')
+        if not vector_store_path or not os.path.exists(vector_store_path):
+            continue
+        chunks_path = vector_store_path.replace('_vectors.pkl', '_chunks.pkl')
+        if not os.path.exists(chunks_path):
+            continue
+        with open(vector_store_path, 'rb') as f:
+            embeddings = _load_pickle(f, 'vectors')
+        with open(chunks_path, 'rb') as f:
+            chunks = _load_pickle(f, 'chunks')
+        if len(chunks) != len(embeddings):
+            # Half-written store; rows would be paired with the wrong chunks
+            print(f"Skipping inconsistent vector store of document {field(doc, 'id')}")
+            continue
+        yield doc, embeddings, chunks
 
 def query_rag(question, course_id, document_models):
     """
@@ -250,34 +759,29 @@ def query_rag(question, course_id, document_models):
         all_chunks_with_metadata = []
         all_embeddings = []
 
-        for doc in document_models:
-            if os.path.exists(doc.vector_store_path):
-                chunks_path = doc.vector_store_path.replace('_vectors.pkl', '_chunks.pkl')
-                if os.path.exists(chunks_path):
-                    with open(doc.vector_store_path, 'rb') as f:
-                        embeddings = pickle.load(f)
-                        all_embeddings.append(embeddings)
-                    with open(chunks_path, 'rb') as f:
-                        chunks = pickle.load(f)
-                        for chunk in chunks:
-                            # Handle both old format (plain strings) and new format (dicts with metadata)
-                            if isinstance(chunk, dict):
-                                all_chunks_with_metadata.append({
-                                    "document_id": doc.id,
-                                    "filename": doc.filename,
-                                    "content": chunk.get("text", ""),
-                                    "page": chunk.get("page"),
-                                    "chunk_index": chunk.get("chunk_index")
-                                })
-                            else:
-                                # Legacy format: plain string
-                                all_chunks_with_metadata.append({
-                                    "document_id": doc.id,
-                                    "filename": doc.filename,
-                                    "content": chunk,
-                                    "page": None,
-                                    "chunk_index": None
-                                })
+        for doc, embeddings, chunks in load_document_vectors(course_id, document_models):
+            all_embeddings.append(embeddings)
+            for chunk in chunks:
+                # Handle both old format (plain strings) and new format (dicts with metadata)
+                if isinstance(chunk, dict):
+                    all_chunks_with_metadata.append({
+                        "document_id": doc.id,
+                        "filename": doc.filename,
+                        "content": chunk.get("text", ""),
+                        "page": chunk.get("page"),
+                        "chunk_index": chunk.get("chunk_index"),
+                        "start": chunk.get("start"),
+                        "source_url": getattr(doc, "source_url", None)
+                    })
+                else:
+                    # Legacy format: plain string
+                    all_chunks_with_metadata.append({
+                        "document_id": doc.id,
+                        "filename": doc.filename,
+                        "content": chunk,
+                        "page": None,
+                        "chunk_index": None
+                    })
 
         if not all_embeddings:
             print("DEBUG: No embeddings loaded for RAG query.")
@@ -285,8 +789,8 @@ def query_rag(question, course_id, document_models):
 
         all_doc_embeddings = np.vstack(all_embeddings)
 
-        model = SentenceTransformer(EMBEDDING_MODEL)
-        question_embedding = model.encode([question])
+        model = get_embedding_model()
+        question_embedding = encode_texts(model, [question], 'query')
 
         similarities = cosine_similarity(question_embedding, all_doc_embeddings)
         k = 5 # Increased K for better context
@@ -301,7 +805,9 @@ def query_rag(question, course_id, document_models):
                 "source_filename": chunk_info["filename"],
                 "content": chunk_info["content"],
                 "page": chunk_info.get("page"),
-                "chunk_index": chunk_info.get("chunk_index")
+                "chunk_index": chunk_info.get("chunk_index"),
+                "start": chunk_info.get("start"),
+                "source_url": chunk_info.get("source_url")
             })
 
         return generate_answer(question, context_with_sources)
@@ -322,15 +828,18 @@ def generate_answer(question, context_with_sources):
         source_map = {}
         citation_counter = 1
         pages_per_source = {}  # Track pages used per source
+        timestamps_per_source = {}  # And video timestamps, for YouTube chunks
         
         full_context_text = ""
         for item in context_with_sources:
             source_key = f"{item['source_id']}-{item['source_filename']}"
             page_num = item.get('page')
+            start = item.get('start')
             
             if source_key not in source_map:
                 source_map[source_key] = citation_counter
                 pages_per_source[source_key] = set()
+                timestamps_per_source[source_key] = {}
                 unique_sources.append({
                     "document_id": item['source_id'],
                     "filename": item['source_filename'],
@@ -343,35 +852,24 @@ def generate_answer(question, context_with_sources):
             # Track pages for this source
             if page_num:
                 pages_per_source[source_key].add(page_num)
+            if start is not None:
+                timestamp = citation_timestamp(item.get('source_url'), start)
+                timestamps_per_source[source_key][timestamp['start']] = timestamp
             
-            # Build context text with page reference
-            page_ref = f" (Page {page_num})" if page_num else ""
+            # Build context text with page (or video time) reference
+            page_ref = f" (Page {page_num})" if page_num else (f" (at {format_timestamp(start)})" if start is not None else "")
             full_context_text += f"Source [{source_map[source_key]}]: {item['source_filename']}{page_ref}\n---\n{item['content']}\n---\n\n"
         
         # Add collected pages to unique_sources
         for source in unique_sources:
             key = f"{source['document_id']}-{source['filename']}"
             source['pages'] = sorted(list(pages_per_source.get(key, set())))
+            source['timestamps'] = [t for _, t in sorted(timestamps_per_source.get(key, {}).items())]
 
-    
-        prompt = f"""
-        You are a helpful and knowledgeable tutor. Your students will ask you questions about the course materials.
-        Answer the user's question based *only* on the provided context.
-        For each piece of information you use, cite the source document using the format [citation_number].
-        The citation number corresponds to the source provided in the context, e.g., Source [1]: filename.
-        If the answer is not found in the context, say "I'm sorry, I can't find the answer in the provided documents."
-
-        Context:
-        {full_context_text}
 
-        Question:
-        {question}
-
-        Answer:
-        """
         llm = get_provider()
-        print(f"Prompt length: {len(prompt)} characters")
-        response_text = llm.generate(prompt)
+        print(f"Context length: {len(full_context_text)} characters")
+        response_text = llm.generate_with_context(CHAT_SYSTEM_PROMPT, full_context_text, f"Question:\n{question}\n\nAnswer:")
         print(f"Raw LLM response length: {len(response_text)}")
         
         if not response_text:
@@ -393,11 +891,14 @@ def generate_answer(question, context_with_sources):
 def query_rag_stream(question, course_id, document_data):
     """
     Streaming version of query_rag - yields text chunks as they're generated.
-    Yields strings for text chunks, and a dict with 'sources' at the end.
+    Yields strings for text chunks, and a dict with 'sources' and 'timing' at the end.
+    'timing' holds per-stage milliseconds (model_load, store_load, encode, similarity,
+    prompt_build, llm_first_token, llm_total) plus token counts and tokens_per_sec.
     
     Args:
         document_data: List of dicts with 'id', 'filename', 'vector_store_path' keys
     """
+    timer = StageTimer()
     try:
         if not document_data:
             yield "No documents available to query."
@@ -408,23 +909,13 @@ def query_rag_stream(question, course_id, document_data):
         all_chunks_with_metadata = []
         all_embeddings = []
         
-        for doc in document_data:
-            # Handle both dict objects and SQLAlchemy models
-            vector_store_path = doc.get('vector_store_path') if isinstance(doc, dict) else doc.vector_store_path
-            doc_id = doc.get('id') if isinstance(doc, dict) else doc.id
-            doc_filename = doc.get('filename') if isinstance(doc, dict) else doc.filename
-            
-            if not vector_store_path or not os.path.exists(vector_store_path):
-                continue
-            
-            chunks_path = vector_store_path.replace('_vectors.pkl', '_chunks.pkl')
-            
-            if os.path.exists(vector_store_path) and os.path.exists(chunks_path):
-                with open(vector_store_path, 'rb') as f:
-                    embeddings = pickle.load(f)
-                with open(chunks_path, 'rb') as f:
-                    chunks = pickle.load(f)
-                
+        with timer.stage('store_load'):
+            for doc, embeddings, chunks in load_document_vectors(course_id, document_data):
+                # Handle both dict objects and SQLAlchemy models
+                doc_id = doc.get('id') if isinstance(doc, dict) else doc.id
+                doc_filename = doc.get('filename') if isinstance(doc, dict) else doc.filename
+                doc_source_url = doc.get('source_url') if isinstance(doc, dict) else doc.source_url
+
                 for i, chunk in enumerate(chunks):
                     chunk_text = chunk['text'] if isinstance(chunk, dict) else chunk
                     page_num = chunk.get('page') if isinstance(chunk, dict) else None
@@ -432,7 +923,9 @@ def query_rag_stream(question, course_id, document_data):
                         "document_id": doc_id,
                         "document_filename": doc_filename,
                         "text": chunk_text,
-                        "page": page_num
+                        "page": page_num,
+                        "start": chunk.get('start') if isinstance(chunk, dict) else None,
+                        "source_url": doc_source_url
                     })
                 all_embeddings.append(embeddings)
 
@@ -441,57 +934,59 @@ def query_rag_stream(question, course_id, document_data):
             yield {"sources": []}
             return
 
-        all_doc_embeddings = np.vstack(all_embeddings)
-        
-        model = SentenceTransformer(EMBEDDING_MODEL)
-        question_embedding = model.encode([question])
-        
-        similarities = cosine_similarity(question_embedding, all_doc_embeddings)
-        k = 5
-        top_k_indices = np.argsort(similarities[0])[-k:][::-1]
-
-        # Build context with sources
-        unique_sources = []
-        source_map = {}
-        citation_counter = 1
-        full_context_text = ""
+        with timer.stage('model_load'):
+            model = get_embedding_model()
+        with timer.stage('encode'):
+            question_embedding = encode_texts(model, [question], 'query')
         
-        for i in top_k_indices:
-            item = all_chunks_with_metadata[i]
-            source_key = f"{item['document_id']}-{item['document_filename']}"
+        with timer.stage('similarity'):
+            all_doc_embeddings = np.vstack(all_embeddings)
+            similarities = cosine_similarity(question_embedding, all_doc_embeddings)
+            k = 5
+            top_k_indices = np.argsort(similarities[0])[-k:][::-1]
+
+        with timer.stage('prompt_build'):
+            # Build context with sources
+            unique_sources = []
+            source_map = {}
+            citation_counter = 1
+            full_context_text = ""
             
-            if source_key not in source_map:
-                source_map[source_key] = citation_counter
-                unique_sources.append({
-                    "document_id": item['document_id'],
-                    "filename": item['document_filename'],
-                    "citation_number": citation_counter,
-                    "snippet": item['text'][:200] + "..." if len(item['text']) > 200 else item['text']
-                })
-                citation_counter += 1
-            
-            page_ref = f" (Page {item['page']})" if item.get('page') else ""
-            full_context_text += f"Source [{source_map[source_key]}]: {item['document_filename']}{page_ref}\n---\n{item['text']}\n---\n\n"
-
-        prompt = f"""
-        You are a helpful and knowledgeable tutor. Answer the question based on the provided context.
-        Cite sources using [citation_number] format.
-        If the answer is not in the context, say so.
-
-        Context:
-        {full_context_text}
-
-        Question: {question}
-
-        Answer:
-        """
-        
-        llm = get_provider()
-        for chunk in llm.generate_stream(prompt):
+            for i in top_k_indices:
+                item = all_chunks_with_metadata[i]
+                source_key = f"{item['document_id']}-{item['document_filename']}"
+                
+                if source_key not in source_map:
+                    source_map[source_key] = citation_counter
+                    unique_sources.append({
+                        "document_id": item['document_id'],
+                        "filename": item['document_filename'],
+                        "citation_number": citation_counter,
+                        "snippet": item['text'][:200] + "..." if len(item['text']) > 200 else item['text'],
+                        "timestamps": []
+                    })
+                    citation_counter += 1
+                
+                start = item.get('start')
+                if start is not None:
+                    timestamp = citation_timestamp(item['source_url'], start)
+                    timestamps = unique_sources[source_map[source_key] - 1]['timestamps']
+                    if timestamp not in timestamps:
+                        timestamps.append(timestamp)
+                        timestamps.sort(key=lambda t: t['start'])
+                page_ref = f" (Page {item['page']})" if item.get('page') else (f" (at {format_timestamp(start)})" if start is not None else "")
+                full_context_text += f"Source [{source_map[source_key]}]: {item['document_filename']}{page_ref}\n---\n{item['text']}\n---\n\n"
+
+        with timer.stage('provider_init'):
+            llm = get_provider()
+        token_stream = llm.generate_with_context_stream(CHAT_SYSTEM_PROMPT, full_context_text, f"Question:\n{question}\n\nAnswer:")
+        for chunk in timer.stream(llm.provider_name, token_stream):
             yield chunk
         
-        # Yield sources at the end
-        yield {"sources": unique_sources}
+        # Yield sources (and per-stage timings) at the end
+        timing = timer.summary()
+        logger.info(f"RAG stream timing: {json.dumps(timing)}", extra={"rag_timing": timing, "course_id": course_id})
+        yield {"sources": unique_sources, "timing": timing}
 
     except Exception as e:
         print(f"Error in streaming RAG: {e}")
@@ -509,29 +1004,22 @@ def search_documents(search_query, course_id, document_models):
         all_chunks_with_metadata = []
         all_embeddings = []
 
-        for doc in document_models:
-            if os.path.exists(doc.vector_store_path):
-                chunks_path = doc.vector_store_path.replace('_vectors.pkl', '_chunks.pkl')
-                if os.path.exists(chunks_path):
-                    with open(doc.vector_store_path, 'rb') as f:
-                        embeddings = pickle.load(f)
-                        all_embeddings.append(embeddings)
-                    with open(chunks_path, 'rb') as f:
-                        chunks = pickle.load(f)
-                        for i, chunk in enumerate(chunks):
-                            all_chunks_with_metadata.append({
-                                "source": doc.filename,
-                                "content": chunk,
-                                "page_number": i + 1 # Simple approximation
-                            })
+        for doc, embeddings, chunks in load_document_vectors(course_id, document_models):
+            all_embeddings.append(embeddings)
+            for i, chunk in enumerate(chunks):
+                all_chunks_with_metadata.append({
+                    "source": doc.filename,
+                    "content": chunk,
+                    "page_number": i + 1 # Simple approximation
+                })
 
         if not all_embeddings:
             return []
 
         all_doc_embeddings = np.vstack(all_embeddings)
 
-        model = SentenceTransformer(EMBEDDING_MODEL)
-        query_embedding = model.encode([search_query])
+        model = get_embedding_model()
+        query_embedding = encode_texts(model, [search_query], 'query')
 
         similarities = cosine_similarity(query_embedding, all_doc_embeddings)
         # Return top 10 results for a search query
@@ -548,7 +1036,7 @@ def search_documents(search_query, course_id, document_models):
         return []
 
 
-def generate_quiz_from_docs(document_models, difficulty='medium', count=5, question_types=None):
+def generate_quiz_from_docs(document_models, difficulty='medium', count=5, question_types=None, use_cache=True):
     """
     Generates a quiz based on the content of all provided documents.
     
@@ -557,6 +1045,7 @@ def generate_quiz_from_docs(document_models, difficulty='medium', count=5, quest
         difficulty: 'easy', 'medium', or 'hard' - affects question complexity
         count: Number of questions to generate (5, 10, 15, or 20)
         question_types: List of types to include ['mcq', 'true_false', 'fill_blank']
+        use_cache: Set to False to bypass the LLM response cache
     """
     # Default question types if not specified
     if question_types is None:
@@ -574,7 +1063,7 @@ def generate_quiz_from_docs(document_models, difficulty='medium', count=5, quest
             chunks_path = doc.vector_store_path.replace('_vectors.pkl', '_chunks.pkl')
             if os.path.exists(chunks_path):
                 with open(chunks_path, 'rb') as f:
-                    chunks = pickle.load(f)
+                    chunks = _load_pickle(f, 'chunks')
                     # Extract text from chunks (chunks are dicts with 'text' key)
                     chunk_texts = [c['text'] if isinstance(c, dict) else c for c in chunks[:chunks_per_doc]]
                     full_context += f"Source: {doc.filename}\n---\n" + "\n".join(chunk_texts) + "\n---\n\n"
@@ -661,6 +1150,11 @@ def generate_quiz_from_docs(document_models, difficulty='medium', count=5, quest
         """
         
         llm = get_provider()
+        cache_params = {"difficulty": difficulty, "count": count, "question_types": question_types}
+        cache_key, cached = cache_lookup('quiz', llm, prompt, cache_params, use_cache=use_cache)
+        if cached is not None:
+            return cached
+        
         response_text = llm.generate(prompt)
         
         print(f"DEBUG: Raw LLM quiz response (difficulty={difficulty}, count={count}): {response_text[:500]}...")
@@ -688,12 +1182,14 @@ def generate_quiz_from_docs(document_models, difficulty='medium', count=5, quest
             qtype = q.get('type', 'mcq')
             type_counts[qtype] = type_counts.get(qtype, 0) + 1
         
-        return {
+        result = {
             "quiz": quiz_data, 
             "difficulty": difficulty, 
             "count": len(quiz_data),
             "question_types": type_counts
         }
+        cache_store('quiz', cache_key, result)
+        return result
 
     except Exception as e:
         print(f"Error generating quiz: {e}")
@@ -709,14 +1205,7 @@ def delete_document_from_course(vector_store_path):
         if not vector_store_path or not os.path.exists(vector_store_path):
             return True, "Vector store path not found or already deleted."
 
-        vector_path = vector_store_path
-        chunks_path = vector_path.replace('_vectors.pkl', '_chunks.pkl')
-        
-        if os.path.exists(vector_path):
-            os.remove(vector_path)
-        
-        if os.path.exists(chunks_path):
-            os.remove(chunks_path)
+        remove_store(vector_store_path)
             
         return True, "Vector data deleted successfully."
 
@@ -730,29 +1219,12 @@ def generate_study_guide_from_text(full_text):
     """
     print(f"DEBUG: Study guide full_text length: {len(full_text)}")
 
-    prompt = f"""
-    You are an expert academic assistant. Based on the entire text from the course materials provided below, generate a comprehensive study guide.
-
-    The study guide should be well-structured and include the following sections:
-    1.  **High-Level Summary:** A one-paragraph overview of the entire course material.
-    2.  **Key Concepts & Definitions:** A detailed glossary of the most important terms, concepts, and definitions.
-    3.  **Detailed Topic Summaries:** A section-by-section summary of the main topics covered in the documents.
-    4.  **Potential Discussion Questions:** A list of 5-7 thought-provoking questions that could be used for discussion or exam preparation.
-
-    Format the output using Markdown for clear headings, lists, and emphasis.
-
-    **Course Materials:**
-    ---
-    {full_text}
-    ---
-
-    **Study Guide:**
-    """
-    print(f"DEBUG: Study guide prompt length: {len(prompt)} characters")
+    context = f"**Course Materials:**\n---\n{full_text}\n---"
+    print(f"DEBUG: Study guide context length: {len(context)} characters")
 
     llm = get_provider()
     try:
-        for chunk in llm.generate_stream(prompt):
+        for chunk in llm.generate_with_context_stream(STUDY_GUIDE_SYSTEM_PROMPT, context, "**Study Guide:**"):
             print(f"DEBUG: Received chunk: {chunk[:100]}...") # Log first 100 chars of each chunk
             yield chunk
     except Exception as e:
@@ -762,7 +1234,7 @@ def generate_study_guide_from_text(full_text):
         yield f"Error: An unexpected error occurred during study guide generation: {e}"
 
 
-def generate_flashcards(document_data, count=10, topic=None, difficulty='medium'):
+def generate_flashcards(document_data, count=10, topic=None, difficulty='medium', use_cache=True):
     """
     Generates flashcards from document content using AI.
     Returns a list of dictionaries with 'front', 'back', 'source', and 'page' keys.
@@ -772,6 +1244,7 @@ def generate_flashcards(document_data, count=10, topic=None, difficulty='medium'
         count: Number of flashcards to generate
         topic: Optional topic to focus flashcards on
         difficulty: 'easy', 'medium', or 'hard' - affects question complexity
+        use_cache: Set to False to bypass the LLM response cache
     """
     import json
     
@@ -786,7 +1259,7 @@ def generate_flashcards(document_data, count=10, topic=None, difficulty='medium'
         if os.path.exists(chunks_file):
             try:
                 with open(chunks_file, 'rb') as f:
-                    chunks = pickle.load(f)
+                    chunks = _load_pickle(f, 'chunks')
                     for chunk in chunks:
                         if isinstance(chunk, dict):
                             all_chunks_with_source.append({
@@ -888,6 +1361,10 @@ Generate {count} {difficulty.upper()}-level flashcards as JSON:
 """
     
     llm = get_provider()
+    cache_key, cached = cache_lookup('flashcards', llm, prompt, {"count": count, "difficulty": difficulty}, use_cache=use_cache)
+    if cached is not None:
+        return cached
+    
     try:
         response_text = llm.generate(prompt)
         response_text = response_text.strip()
@@ -912,7 +1389,10 @@ Generate {count} {difficulty.upper()}-level flashcards as JSON:
                     'page': card.get('page')
                 })
         
-        return validated[:count]  # Limit to requested count
+        validated = validated[:count]  # Limit to requested count
+        if validated:
+            cache_store('flashcards', cache_key, validated)
+        return validated
         
     except json.JSONDecodeError as e:
         print(f"JSON parsing error in flashcard generation: {e}")
@@ -923,9 +1403,10 @@ Generate {count} {difficulty.upper()}-level flashcards as JSON:
         return []
 
 
-def explain_flashcard(card_front, card_back, document_data):
+def explain_flashcard(card_front, card_back, document_data, use_cache=True):
     """
     Provides a deeper explanation of a flashcard answer with source citations.
+    Pass use_cache=False to bypass the LLM response cache.
     """
     import json
     
@@ -939,7 +1420,7 @@ def explain_flashcard(card_front, card_back, document_data):
         if os.path.exists(chunks_file):
             try:
                 with open(chunks_file, 'rb') as f:
-                    chunks = pickle.load(f)
+                    chunks = _load_pickle(f, 'chunks')
                     for chunk in chunks[:10]:  # Limit chunks per doc
                         text = chunk.get('text', chunk) if isinstance(chunk, dict) else chunk
                         all_content.append(f"[{doc.get('filename')}]: {text[:400]}")
@@ -968,9 +1449,15 @@ Keep the explanation clear and educational (2-3 paragraphs max).
 """
     
     llm = get_provider()
+    cache_key, cached = cache_lookup('explain_flashcard', llm, prompt, use_cache=use_cache)
+    if cached is not None:
+        return cached
+    
     try:
-        explanation = llm.generate(prompt)
-        return explanation.strip()
+        explanation = llm.generate(prompt).strip()
+        if explanation:
+            cache_store('explain_flashcard', cache_key, explanation)
+        return explanation
     except Exception as e:
         return f"Unable to generate explanation: {str(e)}"
 
@@ -995,7 +1482,7 @@ def regenerate_single_flashcard(existing_cards, document_data, topic=None):
         if os.path.exists(chunks_file):
             try:
                 with open(chunks_file, 'rb') as f:
-                    chunks = pickle.load(f)
+                    chunks = _load_pickle(f, 'chunks')
                     sources.append(doc.get('filename', 'Unknown'))
                     for chunk in chunks[:10]:
                         text = chunk.get('text', chunk) if isinstance(chunk, dict) else chunk
@@ -1042,10 +1529,11 @@ Return ONLY valid JSON for a single flashcard:
         return None
 
 
-def extract_concepts_from_docs(document_models, max_concepts=30):
+def extract_concepts_from_docs(document_models, max_concepts=30, use_cache=True):
     """
     Extract key concepts/terms from course documents to build a glossary.
     Returns a list of {term, definition, related_terms, source} objects.
+    Pass use_cache=False to bypass the LLM response cache.
     """
     try:
         # Gather text from all documents
@@ -1054,7 +1542,7 @@ def extract_concepts_from_docs(document_models, max_concepts=30):
             chunks_path = doc.vector_store_path.replace('_vectors.pkl', '_chunks.pkl')
             if os.path.exists(chunks_path):
                 with open(chunks_path, 'rb') as f:
-                    chunks = pickle.load(f)
+                    chunks = _load_pickle(f, 'chunks')
                     # Get first few chunks from each doc
                     for chunk in chunks[:5]:
                         if isinstance(chunk, dict):
@@ -1091,6 +1579,10 @@ def extract_concepts_from_docs(document_models, max_concepts=30):
         """
         
         llm = get_provider()
+        cache_key, cached = cache_lookup('concepts', llm, prompt, {"max_concepts": max_concepts}, use_cache=use_cache)
+        if cached is not None:
+            return cached
+        
         response_text = llm.generate(prompt)
         response_text = response_text.strip()
         
@@ -1119,7 +1611,10 @@ def extract_concepts_from_docs(document_models, max_concepts=30):
                     'source': c.get('source', None)
                 })
         
-        return validated[:max_concepts]
+        validated = validated[:max_concepts]
+        if validated:
+            cache_store('concepts', cache_key, validated)
+        return validated
         
     except Exception as e:
         print(f"Error extracting concepts: {e}")
@@ -1138,7 +1633,7 @@ def grade_essay_response(question, student_answer, document_models, custom_rubri
             chunks_path = doc.vector_store_path.replace('_vectors.pkl', '_chunks.pkl')
             if os.path.exists(chunks_path):
                 with open(chunks_path, 'rb') as f:
-                    chunks = pickle.load(f)
+                    chunks = _load_pickle(f, 'chunks')
                     for chunk in chunks[:3]:
                         if isinstance(chunk, dict):
                             context += chunk.get('text', '') + "\n"
@@ -1221,7 +1716,7 @@ def grade_essay_response(question, student_answer, document_models, custom_rubri
         }
 
 
-def generate_mind_map(document_models, topic=None):
+def generate_mind_map(document_models, topic=None, use_cache=True):
     """
     Generate a mind map structure from course documents.
     Returns nodes and edges for visualization.
@@ -1229,6 +1724,7 @@ def generate_mind_map(document_models, topic=None):
     Args:
         document_models: List of document objects or dicts with id, filename, vector_store_path
         topic: Optional topic to focus the mind map on
+        use_cache: Set to False to bypass the LLM response cache
     
     Returns:
         {
@@ -1257,7 +1753,7 @@ def generate_mind_map(document_models, topic=None):
             
             if os.path.exists(chunks_path):
                 with open(chunks_path, 'rb') as f:
-                    chunks = pickle.load(f)
+                    chunks = _load_pickle(f, 'chunks')
                 
                 # Sample chunks for mind map generation (limit to avoid token limit)
                 sample_size = min(10, len(chunks))
@@ -1320,6 +1816,10 @@ Rules:
 '''
         
         llm = get_provider()
+        cache_key, cached = cache_lookup('mind_map', llm, prompt, use_cache=use_cache)
+        if cached is not None:
+            return cached
+        
         response = llm.generate(prompt)
         
         # Parse JSON from response
@@ -1332,11 +1832,13 @@ Rules:
         
         result = json.loads(response_text)
         
-        return {
+        mind_map = {
             "nodes": result.get("nodes", []),
             "edges": result.get("edges", []),
             "central_topic": result.get("central_topic", "Mind Map")
         }
+        cache_store('mind_map', cache_key, mind_map)
+        return mind_map
         
     except json.JSONDecodeError as e:
         print(f"Error parsing mind map JSON: {e}")
@@ -0,0 +1,55 @@
+"""
+Serving helpers - keep blocking CPU work off cooperative (gevent) workers
+Under the gevent serving profile every request runs as a greenlet on one OS thread, so a
+long embedding encode would stall every open stream in that worker. run_blocking moves such
+calls to gevent's native thread pool (torch/numpy release the GIL); elsewhere it calls directly.
+"""
+
+import sys
+
+
+def is_cooperative() -> bool:
+    """True when running in a gevent-patched worker"""
+    if 'gevent' not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched('threading')
+
+
+def run_blocking(fn, *args, **kwargs):
+    """Run fn in a native thread when cooperative, otherwise inline; returns fn's result"""
+    if not is_cooperative():
+        return fn(*args, **kwargs)
+    import gevent
+    return gevent.get_hub().threadpool.apply(fn, args, kwargs)
+
+
+def process_memory(pid='self'):
+    """
+    Memory of one process from /proc/<pid>/smaps_rollup, in MiB: rss, pss, and its split into
+    unique (private pages) and shared (pages also mapped by other processes, e.g. inherited
+    copy-on-write from the gunicorn master). None where smaps_rollup is unavailable (non-Linux).
+    """
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    except OSError:
+        return None
+    return {
+        'rss': fields.get('Rss', 0.0),
+        'pss': fields.get('Pss', 0.0),
+        'unique': fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0),
+        'shared': fields.get('Shared_Clean', 0.0) + fields.get('Shared_Dirty', 0.0),
+    }
+
+
+def format_memory(label, memory):
+    """One report line for process_memory() output"""
+    if memory is None:
+        return f"{label}: memory report unavailable (needs /proc/<pid>/smaps_rollup)"
+    return (f"{label}: unique {memory['unique']:.0f} MiB, shared {memory['shared']:.0f} MiB, "
+            f"rss {memory['rss']:.0f} MiB, pss {memory['pss']:.0f} MiB")
@@ -0,0 +1,138 @@
+"""
+Source Cache
+Persistent cache of what process_url extracts from web pages and YouTube videos (title,
+text, ...), so re-adding a popular article or lecture costs no network time.
+Pages are keyed by canonical URL and revalidated with ETag/Last-Modified once their TTL
+expires; YouTube videos are keyed by video id.
+"""
+
+import os
+import json
+import time
+import sqlite3
+from typing import Any, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+try:
+    from sqlite_cache import SQLiteCache
+except ImportError:
+    from .sqlite_cache import SQLiteCache
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(BASE_DIR, 'data'))
+SOURCE_CACHE_PATH = os.environ.get('SOURCE_CACHE_PATH', os.path.join(DATA_DIR, 'source_cache.db'))
+
+# Defaults: pages are revalidated after a day, transcripts refetched after 30 days, 200 MB in total
+SOURCE_CACHE_ENABLED = os.environ.get('SOURCE_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+SOURCE_CACHE_PAGE_TTL_SECONDS = int(os.environ.get('SOURCE_CACHE_PAGE_TTL_SECONDS', 24 * 3600))
+SOURCE_CACHE_VIDEO_TTL_SECONDS = int(os.environ.get('SOURCE_CACHE_VIDEO_TTL_SECONDS', 30 * 24 * 3600))
+SOURCE_CACHE_MAX_BYTES = int(os.environ.get('SOURCE_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+
+# Query parameters that never change the content of a page
+TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ref_src')
+
+
+def canonical_url(url: str) -> str:
+    """Normalise a URL for use as a cache key: lower-case host, no fragment, default port or tracking params"""
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or 'http').lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and (scheme, parts.port) not in (('http', 80), ('https', 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if not k.lower().startswith(TRACKING_PARAMS))
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(query), ''))
+
+
+def video_key(video_id: str) -> str:
+    """Cache key of a YouTube video, whatever URL form it was added with"""
+    return f"youtube:{video_id}"
+
+
+class SourceCache(SQLiteCache):
+    """SQLite-backed source cache with per-entry validators, TTL and size-based (LRU) eviction"""
+
+    table = 'sources'
+
+    def __init__(self, path: str = SOURCE_CACHE_PATH, max_bytes: int = SOURCE_CACHE_MAX_BYTES):
+        super().__init__(path, max_bytes)
+
+    def _create_tables(self, conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sources (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                last_accessed REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_sources_last_accessed ON sources (last_accessed)")
+
+    def get(self, key: str, ttl_seconds: int) -> Optional[dict]:
+        """
+        Return the entry for key as {"value", "etag", "last_modified", "fresh"}, or None.
+        Stale entries are still returned so their validators can be used to revalidate.
+        """
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value, etag, last_modified, fetched_at FROM sources WHERE key = ?", (key,)
+                ).fetchone()
+                if not row:
+                    return None
+                conn.execute("UPDATE sources SET last_accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            print(f"[Source Cache] Read error: {e}")
+            return None
+        return {
+            "value": json.loads(row[0]),
+            "etag": row[1],
+            "last_modified": row[2],
+            "fresh": now - row[3] <= ttl_seconds
+        }
+
+    def set(self, key: str, value: Any, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """Store a JSON-serialisable value with its validators and evict old entries if over budget"""
+        now = time.time()
+        data = json.dumps(value)
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO sources (key, value, etag, last_modified, size, fetched_at, last_accessed) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, data, etag, last_modified, len(data), now, now)
+                )
+                self._evict_lru(conn)
+        except sqlite3.Error as e:
+            print(f"[Source Cache] Write error: {e}")
+
+    def touch(self, key: str):
+        """Mark an entry as freshly fetched after a 304 Not Modified"""
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute("UPDATE sources SET fetched_at = ?, last_accessed = ? WHERE key = ?", (now, now, key))
+        except sqlite3.Error as e:
+            print(f"[Source Cache] Write error: {e}")
+
+    def clear(self):
+        """Remove all cached sources"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM sources")
+
+
+# Global cache instance (lazy initialization)
+_source_cache: Optional[SourceCache] = None
+
+def get_source_cache() -> Optional[SourceCache]:
+    """Get or create the global source cache; None when disabled"""
+    global _source_cache
+    if not SOURCE_CACHE_ENABLED:
+        return None
+    if _source_cache is None:
+        _source_cache = SourceCache()
+    return _source_cache
@@ -0,0 +1,53 @@
+"""
+SQLite Cache - shared storage for the persistent caches (LLM responses, fetched sources)
+One SQLite file per cache with a table of entries that each record their size and when they
+were last accessed, so the cache can be held to a byte budget by evicting the least recently
+used entries.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SQLiteCache:
+    """Base class: subclasses set `table` and create it (with size and last_accessed columns) in _create_tables"""
+
+    table = None
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._create_tables(conn)
+
+    def _create_tables(self, conn):
+        raise NotImplementedError
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per operation keeps this safe across threads and gunicorn workers
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _evict_lru(self, conn):
+        """Drop least recently used entries until the table is back under max_bytes"""
+        total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        victims = []
+        for key, size in conn.execute(f"SELECT key, size FROM {self.table} ORDER BY last_accessed ASC"):
+            victims.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", victims)
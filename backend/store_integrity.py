@@ -0,0 +1,205 @@
+"""
+Vector Store Integrity - crash-safe writes and consistency checks for per-document stores
+A store is doc_<id>[_r<rev>]_vectors.pkl plus _chunks.pkl and a _manifest.json holding the
+row count and each file's size and SHA-256. Files are written to temp files, fsynced and
+renamed into place, and the manifest is written last, so it only ever describes complete
+files. Verification streams file contents and never unpickles a store whose manifest is present.
+"""
+
+import os
+import json
+import time
+import pickle
+import hashlib
+from typing import Iterator, Optional
+
+MANIFEST_VERSION = 1
+HASH_BUFFER = 1024 * 1024
+# Files younger than this may belong to a store that is still being written
+ORPHAN_GRACE_SECONDS = int(os.environ.get('VECTOR_STORE_ORPHAN_GRACE_SECONDS', 3600))
+
+SUFFIXES = ('_vectors.pkl', '_chunks.pkl', '_manifest.json')
+
+
+def chunks_path_for(vector_path: str) -> str:
+    return vector_path.replace('_vectors.pkl', '_chunks.pkl')
+
+
+def manifest_path_for(vector_path: str) -> str:
+    return vector_path.replace('_vectors.pkl', '_manifest.json')
+
+
+class _HashingWriter:
+    """File wrapper that hashes and counts what is written through it"""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        # Protocol 5 pickles hand large array buffers over as PickleBuffer, which has no len()
+        self.sha256.update(data)
+        self.size += memoryview(data).nbytes
+        return self.f.write(data)
+
+
+def _fsync_dir(directory: str):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # Not supported on this platform
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomic(path: str, dump) -> dict:
+    """Write through dump(writer) to a temp file, fsync it and rename it over path"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            writer = _HashingWriter(f)
+            dump(writer)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return {"name": os.path.basename(path), "size": writer.size, "sha256": writer.sha256.hexdigest()}
+
+
+def write_store(vector_path: str, embeddings, metadata):
+    """Write a store's vectors, chunks and (last) manifest crash-safely"""
+    if len(embeddings) != len(metadata):
+        raise ValueError(f"{len(embeddings)} embeddings for {len(metadata)} chunks")
+    files = {
+        "vectors": write_atomic(vector_path, lambda w: pickle.dump(embeddings, w, pickle.HIGHEST_PROTOCOL)),
+        "chunks": write_atomic(chunks_path_for(vector_path), lambda w: pickle.dump(metadata, w, pickle.HIGHEST_PROTOCOL)),
+    }
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "count": len(metadata),
+        "dim": int(embeddings.shape[1]) if getattr(embeddings, 'ndim', 0) == 2 else None,
+        "files": files,
+        "created_at": time.time()
+    }
+    write_atomic(manifest_path_for(vector_path), lambda w: w.write(json.dumps(manifest).encode()))
+    _fsync_dir(os.path.dirname(vector_path))
+    return manifest
+
+
+def read_manifest(vector_path: str) -> Optional[dict]:
+    try:
+        with open(manifest_path_for(vector_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(HASH_BUFFER)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _count_rows(path: str) -> int:
+    """Row count of a store file without a manifest (legacy stores); loads only this one file"""
+    with open(path, 'rb') as f:
+        return len(pickle.load(f))
+
+
+def verify_store(vector_path: str, checksums: bool = False) -> tuple:
+    """
+    Check one store. Returns (status, detail) where status is 'ok', 'no_manifest' (a
+    consistent store written before manifests existed), 'missing' or 'corrupt'.
+    Sizes are always compared with the manifest; checksums=True also hashes both files.
+    """
+    chunks_path = chunks_path_for(vector_path)
+    missing = [os.path.basename(p) for p in (vector_path, chunks_path) if not os.path.exists(p)]
+    if missing:
+        return 'missing', f"missing {', '.join(missing)}"
+
+    manifest = read_manifest(vector_path)
+    if manifest is None:
+        try:
+            vectors, chunks = _count_rows(vector_path), _count_rows(chunks_path)
+        except Exception as e:
+            return 'corrupt', f"unreadable: {e}"
+        if vectors != chunks:
+            return 'corrupt', f"{vectors} vectors but {chunks} chunks"
+        return 'no_manifest', f"{vectors} rows"
+
+    for kind, path in (('vectors', vector_path), ('chunks', chunks_path)):
+        expected = manifest["files"][kind]
+        size = os.path.getsize(path)
+        if size != expected["size"]:
+            return 'corrupt', f"{kind} file is {size} bytes, manifest says {expected['size']}"
+        if checksums and _file_sha256(path) != expected["sha256"]:
+            return 'corrupt', f"{kind} checksum does not match the manifest"
+    return 'ok', f"{manifest['count']} rows"
+
+
+def backfill_manifest(vector_path: str) -> dict:
+    """Write a manifest for a consistent legacy store without rewriting its files"""
+    chunks_path = chunks_path_for(vector_path)
+    with open(chunks_path, 'rb') as f:
+        count = len(pickle.load(f))
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "count": count,
+        "dim": None,
+        "files": {
+            kind: {"name": os.path.basename(path), "size": os.path.getsize(path), "sha256": _file_sha256(path)}
+            for kind, path in (('vectors', vector_path), ('chunks', chunks_path))
+        },
+        "created_at": time.time()
+    }
+    write_atomic(manifest_path_for(vector_path), lambda w: w.write(json.dumps(manifest).encode()))
+    return manifest
+
+
+def remove_store(vector_path: str):
+    """Delete a store's files (vectors, chunks, manifest); the manifest goes first"""
+    for path in (manifest_path_for(vector_path), vector_path, chunks_path_for(vector_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def scan_files(root: str) -> Iterator[tuple]:
+    """
+    Walk root/course_*/ and yield (vector_path, files, age_seconds) for every store found on
+    disk, where files lists the store's files present; leftover temp files are yielded as
+    (None, [path], age_seconds).
+    """
+    if not os.path.isdir(root):
+        return
+    now = time.time()
+    for course_dir in os.scandir(root):
+        if not course_dir.is_dir() or not course_dir.name.startswith('course_'):
+            continue
+        stores = {}
+        for entry in os.scandir(course_dir.path):
+            if not entry.is_file():
+                continue
+            age = now - entry.stat().st_mtime
+            if entry.name.endswith('.tmp'):
+                yield None, [entry.path], age
+                continue
+            for suffix in SUFFIXES:
+                if entry.name.endswith(suffix):
+                    stem = entry.path[:-len(suffix)]
+                    files, newest = stores.get(stem, ([], age))
+                    files.append(entry.path)
+                    stores[stem] = (files, min(newest, age))
+                    break
+        for stem, (files, age) in stores.items():
+            yield os.path.abspath(f"{stem}_vectors.pkl"), files, age
@@ -0,0 +1,129 @@
+"""
+Transcription - Whisper fallback for YouTube videos without captions
+Loaded Whisper models are kept for the life of the process and transcriptions run in a
+dedicated pool with a concurrency limit and a bounded queue. Long audio is cut into chunks
+and each chunk's timed segments are handed back as soon as it is transcribed.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Generator
+
+# Keeps CPU-bound inference off cooperative (gevent) workers
+try:
+    from serving import run_blocking
+except ImportError:
+    from .serving import run_blocking
+
+WHISPER_MODEL = os.environ.get('WHISPER_MODEL', 'base')
+# Transcriptions running at once (each holds its own model) and how many more may wait
+TRANSCRIPTION_WORKERS = int(os.environ.get('TRANSCRIPTION_WORKERS', 1))
+TRANSCRIPTION_QUEUE_SIZE = int(os.environ.get('TRANSCRIPTION_QUEUE_SIZE', 4))
+TRANSCRIPTION_CHUNK_SECONDS = int(os.environ.get('TRANSCRIPTION_CHUNK_SECONDS', 300))
+
+_DONE = object()
+
+
+class TranscriptionQueueFull(Exception):
+    """Raised when every transcription slot and queue position is taken"""
+
+
+class WhisperModelCache:
+    """
+    Process-level cache of loaded Whisper models. A transcription checks a model out for its
+    whole run: whisper installs decoding hooks on the model, so one instance must not be
+    shared by concurrent transcriptions. At most one model per pool worker is ever loaded.
+    """
+
+    def __init__(self):
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def checkout(self, name: str):
+        with self._lock:
+            idle = self._idle.setdefault(name, [])
+            if idle:
+                return idle.pop()
+        import whisper
+        return run_blocking(whisper.load_model, name)
+
+    def checkin(self, name: str, model):
+        with self._lock:
+            self._idle.setdefault(name, []).append(model)
+
+
+class TranscriptionPool:
+    """Runs transcriptions on a fixed number of threads, rejecting work beyond the queue limit"""
+
+    def __init__(self, workers: int = TRANSCRIPTION_WORKERS, queue_size: int = TRANSCRIPTION_QUEUE_SIZE,
+                 model_name: str = WHISPER_MODEL, chunk_seconds: int = TRANSCRIPTION_CHUNK_SECONDS):
+        self.model_name = model_name
+        self.chunk_seconds = chunk_seconds
+        self.models = WhisperModelCache()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='transcription')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def transcribe_segments(self, audio_path: str) -> Generator[dict, None, None]:
+        """
+        Queue a transcription of audio_path; the returned generator yields its segments
+        ({'text', 'start', 'duration'}, in seconds from the start of the file) in order, one
+        chunk of audio at a time as soon as it is transcribed. Raises TranscriptionQueueFull
+        right away when the pool is saturated.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise TranscriptionQueueFull("Too many videos are being transcribed, please try again later")
+        segments = queue.Queue()
+        try:
+            self._executor.submit(self._run, audio_path, segments)
+        except BaseException:
+            self._slots.release()
+            raise
+        return self._drain(segments)
+
+    @staticmethod
+    def _drain(segments):
+        """Yield queued segments until the worker signals completion or an error"""
+        while True:
+            item = segments.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield from item
+
+    def _run(self, audio_path, segments):
+        try:
+            import whisper
+            audio = run_blocking(whisper.load_audio, audio_path)
+            step = self.chunk_seconds * whisper.audio.SAMPLE_RATE
+            model = self.models.checkout(self.model_name)
+            try:
+                for offset in range(0, len(audio), step):
+                    result = run_blocking(model.transcribe, audio[offset:offset + step])
+                    base = offset / whisper.audio.SAMPLE_RATE
+                    segments.put([
+                        {"text": s['text'], "start": base + s['start'], "duration": s['end'] - s['start']}
+                        for s in result.get('segments', []) if s['text'].strip()
+                    ])
+            finally:
+                self.models.checkin(self.model_name, model)
+            segments.put(_DONE)
+        except Exception as e:
+            segments.put(e)
+        finally:
+            self._slots.release()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_transcription_pool() -> TranscriptionPool:
+    """Process-wide pool, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = TranscriptionPool()
+        return _pool
@@ -0,0 +1,236 @@
+"""
+Resumable Uploads - large PDFs are sent as numbered parts and assembled on completion
+Upload state lives on disk (one directory per upload with a meta.json and one file per
+received part), so any gunicorn worker can take any part and a client can resume after a
+dropped connection by asking which parts are still missing.
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import secrets
+import hashlib
+from typing import BinaryIO, Optional
+
+UPLOAD_PART_SIZE = int(os.environ.get('UPLOAD_PART_SIZE', 8 * 1024 * 1024))
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 1024 * 1024 * 1024))
+UPLOAD_EXPIRY_SECONDS = int(os.environ.get('UPLOAD_EXPIRY_SECONDS', 24 * 3600))
+# A completion marker not refreshed for this long was left by a process that died mid-assembly
+UPLOAD_COMPLETING_STALE_SECONDS = int(os.environ.get('UPLOAD_COMPLETING_STALE_SECONDS', 120))
+COPY_BUFFER = 1024 * 1024
+
+UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(Exception):
+    """A client error in the upload protocol; status is the HTTP status to answer with"""
+
+    def __init__(self, message: str, status: int = 400, details: Optional[dict] = None):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def _upload_dir(root: str, upload_id: str) -> str:
+    if not UPLOAD_ID.match(upload_id or ''):
+        raise UploadError("Upload not found", 404)
+    return os.path.join(root, upload_id)
+
+
+def _part_path(directory: str, part_number: int) -> str:
+    return os.path.join(directory, f"part_{part_number:05d}")
+
+
+def _write_meta(directory: str, meta: dict):
+    tmp = os.path.join(directory, 'meta.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(directory, 'meta.json'))
+
+
+def create_upload(root: str, user_id: int, course_id: int, filename: str, size: int,
+                  part_size: Optional[int] = None, sha256: Optional[str] = None) -> dict:
+    """Start an upload session and return its metadata (upload_id, part_size, total_parts, ...)"""
+    if size <= 0:
+        raise UploadError("File size must be positive")
+    if size > UPLOAD_MAX_BYTES:
+        raise UploadError(f"File is larger than {UPLOAD_MAX_BYTES} bytes", 413, {"max_bytes": UPLOAD_MAX_BYTES})
+    part_size = part_size or UPLOAD_PART_SIZE
+    if not 256 * 1024 <= part_size <= 64 * 1024 * 1024:
+        raise UploadError("part_size must be between 256 KiB and 64 MiB")
+    if sha256 is not None and not re.match(r'^[0-9a-f]{64}$', sha256):
+        raise UploadError("sha256 must be a lower-case hex SHA-256 digest")
+
+    purge_expired(root)
+    upload_id = secrets.token_hex(16)
+    directory = os.path.join(root, upload_id)
+    os.makedirs(directory)
+    meta = {
+        "upload_id": upload_id,
+        "user_id": user_id,
+        "course_id": course_id,
+        "filename": filename,
+        "size": size,
+        "part_size": part_size,
+        "total_parts": (size + part_size - 1) // part_size,
+        "sha256": sha256,
+        "created_at": time.time()
+    }
+    _write_meta(directory, meta)
+    return meta
+
+
+def load_upload(root: str, upload_id: str, user_id: int, course_id: int) -> dict:
+    """Metadata of an upload owned by user_id in course_id; raises UploadError(404) otherwise"""
+    directory = _upload_dir(root, upload_id)
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        raise UploadError("Upload not found", 404)
+    if meta["user_id"] != user_id or meta["course_id"] != course_id:
+        raise UploadError("Upload not found", 404)
+    return meta
+
+
+def expected_part_size(meta: dict, part_number: int) -> int:
+    if part_number == meta["total_parts"]:
+        return meta["size"] - meta["part_size"] * (meta["total_parts"] - 1)
+    return meta["part_size"]
+
+
+def write_part(root: str, meta: dict, part_number: int, stream: BinaryIO,
+               sha256: Optional[str] = None) -> dict:
+    """
+    Stream one part to disk in small buffers, checking its length and (if given) its SHA-256.
+    Re-sending a part replaces it atomically, so retries are safe.
+    """
+    if not 1 <= part_number <= meta["total_parts"]:
+        raise UploadError(f"Part number must be between 1 and {meta['total_parts']}")
+    directory = _upload_dir(root, meta["upload_id"])
+    expected = expected_part_size(meta, part_number)
+    digest = hashlib.sha256()
+    received = 0
+    tmp = f"{_part_path(directory, part_number)}.{secrets.token_hex(4)}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            while True:
+                block = stream.read(COPY_BUFFER)
+                if not block:
+                    break
+                received += len(block)
+                if received > expected:
+                    raise UploadError(f"Part {part_number} is larger than {expected} bytes")
+                digest.update(block)
+                f.write(block)
+        if received != expected:
+            raise UploadError(f"Part {part_number} has {received} bytes, expected {expected}")
+        if sha256 and digest.hexdigest() != sha256.lower():
+            raise UploadError(f"Checksum mismatch for part {part_number}", 422)
+        os.replace(tmp, _part_path(directory, part_number))
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return {"part_number": part_number, "size": received, "sha256": digest.hexdigest()}
+
+
+def upload_status(root: str, meta: dict) -> dict:
+    """Which parts have been received, for resuming"""
+    directory = _upload_dir(root, meta["upload_id"])
+    received = sorted(
+        n for n in range(1, meta["total_parts"] + 1)
+        if os.path.exists(_part_path(directory, n))
+    )
+    received_set = set(received)
+    return {
+        "upload_id": meta["upload_id"],
+        "filename": meta["filename"],
+        "size": meta["size"],
+        "part_size": meta["part_size"],
+        "total_parts": meta["total_parts"],
+        "received_parts": received,
+        "missing_parts": [n for n in range(1, meta["total_parts"] + 1) if n not in received_set],
+        "expires_at": meta["created_at"] + UPLOAD_EXPIRY_SECONDS
+    }
+
+
+def _claim_completion(directory: str) -> str:
+    """Create the .completing marker that lets one request assemble an upload, taking over a stale one"""
+    marker = os.path.join(directory, '.completing')
+    try:
+        os.close(os.open(marker, os.O_CREAT | os.O_EXCL))
+        return marker
+    except FileExistsError:
+        pass
+    try:
+        stale = time.time() - os.path.getmtime(marker) > UPLOAD_COMPLETING_STALE_SECONDS
+    except FileNotFoundError:
+        stale = True
+    if not stale:
+        raise UploadError("Upload is already being completed", 409)
+    # Move the old marker aside first so that only one of several retrying requests takes over
+    aside = f"{marker}.{secrets.token_hex(4)}"
+    try:
+        os.rename(marker, aside)
+        os.remove(aside)
+        os.close(os.open(marker, os.O_CREAT | os.O_EXCL))
+    except (FileNotFoundError, FileExistsError):
+        raise UploadError("Upload is already being completed", 409)
+    return marker
+
+
+def assemble(root: str, meta: dict, dest_path: str) -> str:
+    """
+    Concatenate all parts into dest_path, verifying the whole-file SHA-256 when one was
+    declared, then remove the upload session. Returns the file's SHA-256.
+    """
+    directory = _upload_dir(root, meta["upload_id"])
+    missing = upload_status(root, meta)["missing_parts"]
+    if missing:
+        raise UploadError("Upload is incomplete", 409, {"missing_parts": missing})
+    # Only one request may assemble an upload
+    marker = _claim_completion(directory)
+
+    digest = hashlib.sha256()
+    tmp = f"{dest_path}.{secrets.token_hex(4)}.tmp"
+    try:
+        with open(tmp, 'wb') as out:
+            for n in range(1, meta["total_parts"] + 1):
+                with open(_part_path(directory, n), 'rb') as part:
+                    while True:
+                        block = part.read(COPY_BUFFER)
+                        if not block:
+                            break
+                        digest.update(block)
+                        out.write(block)
+                # Keep the marker fresh so a long assembly is not mistaken for an abandoned one
+                os.utime(marker)
+        if meta.get("sha256") and digest.hexdigest() != meta["sha256"]:
+            raise UploadError("Checksum mismatch for the assembled file", 422)
+        os.replace(tmp, dest_path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        if os.path.exists(marker):
+            os.remove(marker)
+        raise
+    shutil.rmtree(directory, ignore_errors=True)
+    return digest.hexdigest()
+
+
+def discard(root: str, meta: dict):
+    """Abort an upload and delete its parts"""
+    shutil.rmtree(_upload_dir(root, meta["upload_id"]), ignore_errors=True)
+
+
+def purge_expired(root: str):
+    """Delete upload sessions older than UPLOAD_EXPIRY_SECONDS"""
+    if not os.path.isdir(root):
+        return
+    cutoff = time.time() - UPLOAD_EXPIRY_SECONDS
+    for name in os.listdir(root):
+        directory = os.path.join(root, name)
+        if UPLOAD_ID.match(name) and os.path.isdir(directory) and os.path.getmtime(directory) < cutoff:
+            shutil.rmtree(directory, ignore_errors=True)
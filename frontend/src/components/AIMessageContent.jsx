@@ -8,6 +8,7 @@ const AIMessageContent = ({ text, sources, setHighlightedSourceId }) => {
     isVisible: false,
     filename: '',
     snippet: '',
+    timestamps: [],
     targetRect: null,
   });
   const leaveTimeoutRef = useRef(null);
@@ -26,6 +27,7 @@ const AIMessageContent = ({ text, sources, setHighlightedSourceId }) => {
       isVisible: true,
       filename: source.filename,
       snippet: source.snippet || '',
+      timestamps: source.timestamps || [],
       targetRect: rect,
     });
   };
@@ -33,7 +35,7 @@ const AIMessageContent = ({ text, sources, setHighlightedSourceId }) => {
   const handleMouseLeave = () => {
     // Set a timer to hide the tooltip, allowing for brief mouse-outs
     leaveTimeoutRef.current = setTimeout(() => {
-      setTooltip({ isVisible: false, filename: '', snippet: '', targetRect: null });
+      setTooltip({ isVisible: false, filename: '', snippet: '', timestamps: [], targetRect: null });
     }, 300); // 300ms delay
   };
 
@@ -85,6 +87,7 @@ const AIMessageContent = ({ text, sources, setHighlightedSourceId }) => {
         <CitationTooltip
           filename={tooltip.filename}
           snippet={tooltip.snippet}
+          timestamps={tooltip.timestamps}
           targetRect={tooltip.targetRect}
           isVisible={tooltip.isVisible}
         />
@@ -1,6 +1,7 @@
 // src/components/AddSourceModal.jsx
 import React, { useState, useRef } from 'react';
 import apiClient from '../apiClient';
+import { uploadResumable, RESUMABLE_THRESHOLD } from '../resumableUpload';
 import { useToast } from '../hooks/use-toast';
 import { Button } from './ui/button';
 import { Input } from './ui/input';
@@ -37,6 +38,7 @@ const AddSourceModal = ({ courseId, onSourceAdded }) => {
   const [activeTab, setActiveTab] = useState('pdf');
   const [url, setUrl] = useState('');
   const [file, setFile] = useState(null);
+  const [uploadProgress, setUploadProgress] = useState(null);
   const fileInputRef = useRef(null);
   const { toast } = useToast();
 
@@ -61,12 +63,18 @@ const AddSourceModal = ({ courseId, onSourceAdded }) => {
     }
 
     try {
-      await apiClient.post(`/courses/${courseId}/add-source`, formData, {
-        headers: {
-          'Content-Type': 'multipart/form-data',
-        },
-      });
-      toast({ title: "Success", description: "Source added to course knowledge base." });
+      if (activeTab === 'pdf' && file.size > RESUMABLE_THRESHOLD) {
+        // Large PDFs go up in resumable parts and are processed in the background
+        await uploadResumable(courseId, file, setUploadProgress);
+        toast({ title: "Uploaded", description: "The PDF is being processed; you'll get a notification when it's ready." });
+      } else {
+        await apiClient.post(`/courses/${courseId}/add-source`, formData, {
+          headers: {
+            'Content-Type': 'multipart/form-data',
+          },
+        });
+        toast({ title: "Success", description: "Source added to course knowledge base." });
+      }
       onSourceAdded();
       setOpen(false);
       setFile(null);
@@ -75,11 +83,12 @@ const AddSourceModal = ({ courseId, onSourceAdded }) => {
       console.error("Failed to add source:", error);
       toast({
         title: "Error",
-        description: error.response?.data?.msg || "Failed to add source.",
+        description: error.response?.data?.msg || error.response?.data?.error || "Failed to add source.",
         variant: "destructive",
       });
     } finally {
       setLoading(false);
+      setUploadProgress(null);
     }
   };
 
@@ -190,7 +199,7 @@ const AddSourceModal = ({ courseId, onSourceAdded }) => {
             {loading ? (
               <span className="flex items-center gap-2">
                 <span className="w-4 h-4 border-2 border-white/30 border-t-white rounded-full animate-spin" />
-                Processing...
+                {uploadProgress !== null ? `Uploading ${Math.round(uploadProgress * 100)}%...` : 'Processing...'}
               </span>
             ) : 'Add Source'}
           </Button>
@@ -26,9 +26,13 @@ const ChatInterface = () => {
   const [showSources, setShowSources] = useState(false);
   const [selectedDocs, setSelectedDocs] = useState([]);
   const [highlightedSourceId, setHighlightedSourceId] = useState(null);
+  // Cursor for the next older page of chat history (X-Next-Before), null once all is loaded
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
 
   const messagesEndRef = useRef(null);
   const inputRef = useRef(null);
+  const skipScrollRef = useRef(false);
   const { toast } = useToast();
 
   const [searchQuery, setSearchQuery] = useState('');
@@ -48,19 +52,19 @@ const ChatInterface = () => {
     }
   };
 
-  // Load chat history from API
+  const formatHistory = (history) => history.map(msg => ({
+    id: msg.id,
+    text: msg.content,
+    sender: msg.role === 'assistant' ? 'ai' : 'user',
+    sources: msg.sources || []
+  }));
+
+  // Load the latest page of chat history from the API
   const fetchChatHistory = async () => {
     try {
       const response = await apiClient.get(`/courses/${courseId}/chat-history`);
-      if (response.data && response.data.messages) {
-        const formattedMessages = response.data.messages.map((msg, index) => ({
-          id: msg.id || index,
-          text: msg.content,
-          sender: msg.role === 'assistant' ? 'ai' : 'user',
-          sources: msg.sources || []
-        }));
-        setMessages(formattedMessages);
-      }
+      setMessages(formatHistory(response.data));
+      setOlderCursor(response.headers['x-next-before'] || null);
     } catch (error) {
       // If no history endpoint or error, fall back to session storage
       console.log("Loading from session storage", error);
@@ -71,11 +75,28 @@ const ChatInterface = () => {
     }
   };
 
+  // Prepend the next older page of chat history
+  const loadOlderMessages = async () => {
+    if (!olderCursor || isLoadingOlder) return;
+    setIsLoadingOlder(true);
+    try {
+      const response = await apiClient.get(`/courses/${courseId}/chat-history`, { params: { before: olderCursor } });
+      skipScrollRef.current = true;
+      setMessages(prev => [...formatHistory(response.data), ...prev]);
+      setOlderCursor(response.headers['x-next-before'] || null);
+    } catch (error) {
+      console.error("Failed to load older messages:", error);
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  };
+
   // Clear chat history
   const handleClearChat = async () => {
     try {
       await apiClient.delete(`/courses/${courseId}/chat-history`);
       setMessages([]);
+      setOlderCursor(null);
       sessionStorage.removeItem(`chatHistory_course_${courseId}`);
       toast({ title: "Success", description: "Chat history cleared." });
     } catch (error) {
@@ -142,7 +163,11 @@ const ChatInterface = () => {
   };
 
   useEffect(() => {
-    scrollToBottom();
+    if (skipScrollRef.current) {
+      skipScrollRef.current = false;
+    } else {
+      scrollToBottom();
+    }
     if (messages.length > 0) {
       sessionStorage.setItem(`chatHistory_course_${courseId}`, JSON.stringify(messages));
     } else {
@@ -152,6 +177,7 @@ const ChatInterface = () => {
 
   const handleNewChat = () => {
     setMessages([]);
+    setOlderCursor(null);
   };
 
   const handleSaveNote = async (content) => {
@@ -422,6 +448,13 @@ const ChatInterface = () => {
         ) : (
           !showSearchResults && (
             <div className="space-y-4 max-w-4xl mx-auto">
+              {olderCursor && (
+                <div className="flex justify-center">
+                  <Button variant="ghost" size="sm" onClick={loadOlderMessages} disabled={isLoadingOlder}>
+                    {isLoadingOlder ? 'Loading...' : 'Load older messages'}
+                  </Button>
+                </div>
+              )}
               <AnimatePresence mode="popLayout">
                 {messages.map((msg, index) => (
                   <motion.div
@@ -1,12 +1,12 @@
 import React from 'react';
 import { FileText } from 'lucide-react';
 
-const CitationTooltip = ({ filename, snippet, isVisible, targetRect }) => {
+const CitationTooltip = ({ filename, snippet, timestamps = [], isVisible, targetRect }) => {
   if (!targetRect) return null;
 
   // Position tooltip directly above the citation
   const tooltipWidth = 280;
-  const tooltipHeight = snippet ? 110 : 40;
+  const tooltipHeight = (snippet ? 110 : 40) + (timestamps.length ? 28 : 0);
 
   // Calculate position to center above the citation
   let left = targetRect.left + (targetRect.width / 2) - (tooltipWidth / 2);
@@ -52,6 +52,25 @@ const CitationTooltip = ({ filename, snippet, isVisible, targetRect }) => {
           <p className="italic line-clamp-3">"{snippet}"</p>
         </div>
       )}
+
+      {/* Video moments (YouTube sources) */}
+      {timestamps.length > 0 && (
+        <div className="flex flex-wrap gap-1 px-2 pb-2">
+          {timestamps.map((t) => t.url ? (
+            <a
+              key={t.start}
+              href={t.url}
+              target="_blank"
+              rel="noopener noreferrer"
+              className="text-[10px] px-1.5 py-0.5 rounded bg-blue-600/30 text-blue-300 hover:bg-blue-600/50"
+            >
+              ▶ {t.label}
+            </a>
+          ) : (
+            <span key={t.start} className="text-[10px] px-1.5 py-0.5 rounded bg-gray-700 text-gray-300">{t.label}</span>
+          ))}
+        </div>
+      )}
     </div>
   );
 };
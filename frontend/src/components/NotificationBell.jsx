@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Bell, X, Check, Trash2, CheckCheck } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
 import apiClient from '../apiClient';
@@ -7,23 +7,127 @@ import { Button } from './ui/button';
 const NotificationBell = () => {
   const [isOpen, setIsOpen] = useState(false);
   const [notifications, setNotifications] = useState([]);
+  const [unreadCount, setUnreadCount] = useState(0);
+  // Cursor for the next older page (X-Next-Before), null once everything is loaded
+  const [olderCursor, setOlderCursor] = useState(null);
+  // Newest notification id seen, so a reopened stream replays what arrived in between
+  const newestIdRef = useRef(null);
+
+  const noteNewest = (items) => {
+    for (const n of items) {
+      if (newestIdRef.current === null || n.id > newestIdRef.current) newestIdRef.current = n.id;
+    }
+  };
 
   const fetchNotifications = async () => {
     try {
       const response = await apiClient.get('/notifications');
       setNotifications(response.data);
+      noteNewest(response.data);
+      setOlderCursor(response.headers['x-next-before'] || null);
     } catch (error) {
       console.error('Error fetching notifications:', error);
     }
   };
 
+  const loadOlderNotifications = async () => {
+    try {
+      const response = await apiClient.get('/notifications', { params: { before: olderCursor } });
+      setNotifications(prev => [...prev, ...response.data.filter(n => !prev.some(p => p.id === n.id))]);
+      setOlderCursor(response.headers['x-next-before'] || null);
+    } catch (error) {
+      console.error('Error fetching older notifications:', error);
+    }
+  };
+
+  const fetchUnreadCount = async () => {
+    try {
+      const response = await apiClient.get('/notifications/unread-count');
+      setUnreadCount(response.data.unread);
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching unread count:', error);
+      return null;
+    }
+  };
+
   useEffect(() => {
     fetchNotifications();
-    const interval = setInterval(fetchNotifications, 30000);
-    return () => clearInterval(interval);
-  }, []);
 
-  const unreadCount = notifications.filter(n => !n.is_read).length;
+    // New notifications are pushed over SSE when the server runs gevent workers (the stream
+    // ends periodically and is reopened); otherwise the cheap unread count is polled.
+    const controller = new AbortController();
+    const baseUrl = import.meta.env.VITE_API_BASE_URL || 'http://localhost:5001';
+    let retryTimer = null;
+    let pollTimer = null;
+    let lastUnread = null;
+
+    const poll = async () => {
+      const data = await fetchUnreadCount();
+      if (data && data.unread !== lastUnread) fetchNotifications();
+      if (data) lastUnread = data.unread;
+    };
+
+    const openStream = async () => {
+      try {
+        const after = newestIdRef.current !== null ? `?after=${newestIdRef.current}` : '';
+        const response = await fetch(`${baseUrl}/notifications/stream${after}`, {
+          headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` },
+          signal: controller.signal
+        });
+        if (!response.ok) throw new Error('Failed to open notification stream');
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const frames = buffer.split('\n\n');
+          buffer = frames.pop();
+          for (const frame of frames) {
+            if (!frame.startsWith('data: ')) continue;
+            try {
+              const data = JSON.parse(frame.slice(6));
+              if (data.type === 'notification') {
+                noteNewest([data.notification]);
+                setNotifications(prev => prev.some(n => n.id === data.notification.id)
+                  ? prev
+                  : [data.notification, ...prev]);
+                fetchUnreadCount();
+              }
+            } catch (e) {
+              console.error('Error parsing notification event:', e);
+            }
+          }
+        }
+        retryTimer = setTimeout(openStream, 1000);
+      } catch (error) {
+        if (controller.signal.aborted) return;
+        // Catch up on anything missed, then retry the stream
+        fetchNotifications();
+        fetchUnreadCount();
+        retryTimer = setTimeout(openStream, 30000);
+      }
+    };
+
+    fetchUnreadCount().then(data => {
+      if (controller.signal.aborted) return;
+      lastUnread = data && data.unread;
+      if (data && data.stream) {
+        openStream();
+      } else {
+        pollTimer = setInterval(poll, 30000);
+      }
+    });
+
+    return () => {
+      controller.abort();
+      clearTimeout(retryTimer);
+      clearInterval(pollTimer);
+    };
+  }, []);
 
   const toggleOpen = () => setIsOpen(!isOpen);
 
@@ -31,6 +135,7 @@ const NotificationBell = () => {
     e.stopPropagation();
     try {
       await apiClient.delete(`/notifications/${id}`);
+      if (notifications.some(n => n.id === id && !n.is_read)) setUnreadCount(count => Math.max(0, count - 1));
       setNotifications(notifications.filter(n => n.id !== id));
     } catch (error) {
       console.error('Error removing notification:', error);
@@ -40,6 +145,7 @@ const NotificationBell = () => {
   const markAsRead = async (id) => {
     try {
       await apiClient.put(`/notifications/${id}/read`);
+      if (notifications.some(n => n.id === id && !n.is_read)) setUnreadCount(count => Math.max(0, count - 1));
       setNotifications(notifications.map(n =>
         n.id === id ? { ...n, is_read: true } : n
       ));
@@ -53,6 +159,7 @@ const NotificationBell = () => {
       const unreadIds = notifications.filter(n => !n.is_read).map(n => n.id);
       if (unreadIds.length === 0) return;
       await Promise.all(unreadIds.map(id => apiClient.put(`/notifications/${id}/read`)));
+      fetchUnreadCount();
       setNotifications(notifications.map(n => ({ ...n, is_read: true })));
     } catch (error) {
       console.error('Error marking all as read:', error);
@@ -63,6 +170,8 @@ const NotificationBell = () => {
     try {
       await apiClient.delete('/notifications');
       setNotifications([]);
+      setOlderCursor(null);
+      setUnreadCount(0);
     } catch (error) {
       console.error('Error clearing notifications:', error);
     }
@@ -190,6 +299,16 @@ const NotificationBell = () => {
                     ))}
                   </ul>
                 )}
+                {olderCursor && (
+                  <Button
+                    onClick={loadOlderNotifications}
+                    variant="ghost"
+                    size="sm"
+                    className="w-full h-8 text-xs text-muted-foreground"
+                  >
+                    Load older notifications
+                  </Button>
+                )}
               </div>
 
               {/* Footer */}
@@ -6,6 +6,9 @@ const QuizHistory = ({ courseId }) => {
   const [history, setHistory] = useState([]);
   const [isLoading, setIsLoading] = useState(true);
   const [expandedAttempt, setExpandedAttempt] = useState(null);
+  // Cursor for the next older page (X-Next-Before), null once all attempts are loaded
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
 
   useEffect(() => {
     const fetchHistory = async () => {
@@ -13,6 +16,7 @@ const QuizHistory = ({ courseId }) => {
       try {
         const response = await apiClient.get(`/courses/${courseId}/quizzes/history`);
         setHistory(response.data);
+        setOlderCursor(response.headers['x-next-before'] || null);
       } catch (error) {
         console.error("Failed to fetch quiz history:", error);
       } finally {
@@ -23,6 +27,19 @@ const QuizHistory = ({ courseId }) => {
     fetchHistory();
   }, [courseId]);
 
+  const loadOlderAttempts = async () => {
+    setIsLoadingOlder(true);
+    try {
+      const response = await apiClient.get(`/courses/${courseId}/quizzes/history`, { params: { before: olderCursor } });
+      setHistory(prev => [...prev, ...response.data]);
+      setOlderCursor(response.headers['x-next-before'] || null);
+    } catch (error) {
+      console.error("Failed to fetch older quiz attempts:", error);
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  };
+
   const toggleAttempt = (attemptId) => {
     setExpandedAttempt(expandedAttempt === attemptId ? null : attemptId);
   };
@@ -69,6 +86,15 @@ const QuizHistory = ({ courseId }) => {
           </div>
         ))}
       </div>
+      {olderCursor && (
+        <button
+          onClick={loadOlderAttempts}
+          disabled={isLoadingOlder}
+          className="mt-4 w-full text-sm text-muted-foreground hover:text-foreground disabled:opacity-50"
+        >
+          {isLoadingOlder ? 'Loading...' : 'Show older attempts'}
+        </button>
+      )}
     </div>
   );
 };
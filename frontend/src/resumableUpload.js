@@ -0,0 +1,60 @@
+// frontend/src/resumableUpload.js
+import apiClient from './apiClient';
+
+// Files above this size are sent in parts that survive dropped connections
+export const RESUMABLE_THRESHOLD = 20 * 1024 * 1024;
+
+const sessionKey = (courseId, file) =>
+  `upload:${courseId}:${file.name}:${file.size}:${file.lastModified}`;
+
+const sha256Hex = async (blob) => {
+  const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+  return Array.from(new Uint8Array(digest)).map((b) => b.toString(16).padStart(2, '0')).join('');
+};
+
+// crypto.subtle only exists in secure contexts (HTTPS or localhost); the checksum is optional
+const partHeaders = async (part) => {
+  const headers = { 'Content-Type': 'application/octet-stream' };
+  if (globalThis.crypto?.subtle) headers['X-Part-SHA256'] = await sha256Hex(part);
+  return headers;
+};
+
+// Reuse an unfinished upload of the same file if the server still has it
+const resumeOrStart = async (courseId, file) => {
+  const key = sessionKey(courseId, file);
+  const saved = localStorage.getItem(key);
+  if (saved) {
+    try {
+      const res = await apiClient.get(`/courses/${courseId}/uploads/${saved}`);
+      return res.data;
+    } catch (error) {
+      localStorage.removeItem(key);
+    }
+  }
+  const res = await apiClient.post(`/courses/${courseId}/uploads`, { filename: file.name, size: file.size });
+  localStorage.setItem(key, res.data.upload_id);
+  return res.data;
+};
+
+// Upload a PDF part by part, skipping parts the server already has, then start ingestion.
+// Resolves with the ingestion status (poll /courses/<id>/sources/batch/<batch_id>).
+export const uploadResumable = async (courseId, file, onProgress = () => {}) => {
+  const upload = await resumeOrStart(courseId, file);
+  const { upload_id: uploadId, part_size: partSize, total_parts: totalParts } = upload;
+  let done = totalParts - upload.missing_parts.length;
+  onProgress(done / totalParts);
+
+  for (const partNumber of upload.missing_parts) {
+    const part = file.slice((partNumber - 1) * partSize, partNumber * partSize);
+    await apiClient.put(`/courses/${courseId}/uploads/${uploadId}/parts/${partNumber}`, part, {
+      headers: await partHeaders(part),
+      timeout: 0,
+    });
+    done += 1;
+    onProgress(done / totalParts);
+  }
+
+  const res = await apiClient.post(`/courses/${courseId}/uploads/${uploadId}/complete`);
+  localStorage.removeItem(sessionKey(courseId, file));
+  return res.data;
+};
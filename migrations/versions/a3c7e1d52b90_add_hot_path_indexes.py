@@ -0,0 +1,58 @@
+"""Add composite indexes for hot query paths
+
+Revision ID: a3c7e1d52b90
+Revises: f9b302071519
+Create Date: 2026-10-19 10:12:41.208117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c7e1d52b90'
+down_revision = 'f9b302071519'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns)
+INDEXES = [
+    ('ix_user_reset_token', 'user', ['reset_token']),
+    ('ix_course_user_id', 'course', ['user_id']),
+    ('ix_document_course_id', 'document', ['course_id']),
+    ('ix_note_user_id_course_id', 'note', ['user_id', 'course_id']),
+    ('ix_notification_user_id_created_at', 'notification', ['user_id', 'created_at']),
+    ('ix_quiz_attempt_user_id_course_id_timestamp', 'quiz_attempt', ['user_id', 'course_id', 'timestamp']),
+    ('ix_quiz_attempt_user_id_timestamp', 'quiz_attempt', ['user_id', 'timestamp']),
+    ('ix_quiz_question_response_quiz_attempt_id', 'quiz_question_response', ['quiz_attempt_id']),
+    ('ix_chat_message_user_id_course_id_created_at', 'chat_message', ['user_id', 'course_id', 'created_at']),
+    ('ix_flashcard_deck_user_id_course_id', 'flashcard_deck', ['user_id', 'course_id']),
+    ('ix_flashcard_deck_id_next_review', 'flashcard', ['deck_id', 'next_review']),
+    ('ix_study_session_user_id_course_id', 'study_session', ['user_id', 'course_id']),
+    ('ix_study_session_user_id_created_at', 'study_session', ['user_id', 'created_at']),
+    ('ix_course_share_course_id', 'course_share', ['course_id']),
+    ('ix_course_glossary_course_id_term', 'course_glossary', ['course_id', 'term']),
+]
+
+
+def _existing_indexes(inspector, table):
+    return {ix['name'] for ix in inspector.get_indexes(table)}
+
+
+def upgrade():
+    # Tables added after the initial migration are created by `flask init-db`,
+    # which also creates these indexes, so skip anything already in place.
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, columns in INDEXES:
+        if table in tables and name not in _existing_indexes(inspector, table):
+            op.create_index(name, table, columns, unique=False)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, columns in reversed(INDEXES):
+        if table in tables and name in _existing_indexes(inspector, table):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,35 @@
+"""Mark already indexed documents as ready
+
+Revision ID: b6e4d1a09c53
+Revises: f3a9c6e2b174
+Create Date: 2026-10-19 21:40:12.530817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e4d1a09c53'
+down_revision = 'f3a9c6e2b174'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The status columns were only ever created by `flask init-db`
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('document')}
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        if 'processing_status' not in columns:
+            batch_op.add_column(sa.Column('processing_status', sa.String(length=20), nullable=False,
+                                          server_default='pending'))
+        if 'error_message' not in columns:
+            batch_op.add_column(sa.Column('error_message', sa.Text(), nullable=True))
+    # Documents added one at a time were left 'pending' even after they were indexed
+    op.execute("UPDATE document SET processing_status = 'ready' "
+               "WHERE processing_status = 'pending' AND vector_store_path IS NOT NULL AND vector_store_path != ''")
+
+
+def downgrade():
+    # The status of indexed documents can't be told apart from batch results, so it is kept
+    pass
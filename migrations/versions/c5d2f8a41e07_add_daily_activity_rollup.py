@@ -0,0 +1,77 @@
+"""Add daily_activity rollup table
+
+Revision ID: c5d2f8a41e07
+Revises: a3c7e1d52b90
+Create Date: 2026-10-19 14:03:17.554921
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d2f8a41e07'
+down_revision = 'a3c7e1d52b90'
+branch_labels = None
+depends_on = None
+
+
+# Same rollup as `flask backfill-daily-activity`, so streaks and heatmaps survive the upgrade.
+# Each source is (tables it reads, SELECT of user_id, course_id, day, study_seconds, quizzes,
+# flashcard_reviews); study_session and the flashcard tables only exist once `flask init-db` ran.
+# Only the latest review of each flashcard is stored, so older reviews can't be recovered.
+SOURCES = [
+    (('study_session',),
+     'SELECT user_id, course_id, DATE(created_at) AS day, COALESCE(duration_seconds, 0) AS study_seconds, '
+     '0 AS quizzes, 0 AS flashcard_reviews FROM study_session'),
+    (('quiz_attempt',),
+     'SELECT user_id, course_id, DATE("timestamp") AS day, 0 AS study_seconds, '
+     '1 AS quizzes, 0 AS flashcard_reviews FROM quiz_attempt'),
+    (('flashcard', 'flashcard_deck'),
+     'SELECT flashcard_deck.user_id, flashcard_deck.course_id, DATE(flashcard.last_reviewed) AS day, '
+     '0 AS study_seconds, 0 AS quizzes, 1 AS flashcard_reviews '
+     'FROM flashcard JOIN flashcard_deck ON flashcard.deck_id = flashcard_deck.id '
+     'WHERE flashcard.last_reviewed IS NOT NULL'),
+]
+
+
+def backfill(bind):
+    tables = set(sa.inspect(bind).get_table_names())
+    selects = [select for required, select in SOURCES if tables.issuperset(required)]
+    if not selects:
+        return
+    op.execute(
+        'INSERT INTO daily_activity (user_id, course_id, day, study_seconds, quizzes, flashcard_reviews) '
+        'SELECT user_id, course_id, day, SUM(study_seconds), SUM(quizzes), SUM(flashcard_reviews) '
+        f'FROM ({" UNION ALL ".join(selects)}) AS activity '
+        'WHERE day IS NOT NULL GROUP BY user_id, course_id, day'
+    )
+
+
+def upgrade():
+    # `flask init-db` may already have created the table; backfill it only while it is empty
+    bind = op.get_bind()
+    if 'daily_activity' in sa.inspect(bind).get_table_names():
+        if bind.execute(sa.text('SELECT 1 FROM daily_activity LIMIT 1')).first() is None:
+            backfill(bind)
+        return
+    op.create_table('daily_activity',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('study_seconds', sa.Integer(), nullable=False),
+    sa.Column('quizzes', sa.Integer(), nullable=False),
+    sa.Column('flashcard_reviews', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['course_id'], ['course.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'course_id', 'day', name='uq_daily_activity_user_course_day')
+    )
+    op.create_index('ix_daily_activity_user_id_day', 'daily_activity', ['user_id', 'day'], unique=False)
+    backfill(bind)
+
+
+def downgrade():
+    op.drop_index('ix_daily_activity_user_id_day', table_name='daily_activity')
+    op.drop_table('daily_activity')
@@ -0,0 +1,26 @@
+"""Add (user_id, is_read) index for unread notification counts
+
+Revision ID: e8b14c37d9a2
+Revises: c5d2f8a41e07
+Create Date: 2026-10-19 16:41:05.372810
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b14c37d9a2'
+down_revision = 'c5d2f8a41e07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('notification')}
+    if 'ix_notification_user_id_is_read' not in existing:
+        op.create_index('ix_notification_user_id_is_read', 'notification', ['user_id', 'is_read'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_notification_user_id_is_read', table_name='notification')
@@ -0,0 +1,33 @@
+"""Add document.ingestion_batch_id for batch ingestion progress
+
+Revision ID: f3a9c6e2b174
+Revises: e8b14c37d9a2
+Create Date: 2026-10-19 18:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a9c6e2b174'
+down_revision = 'e8b14c37d9a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    columns = {c['name'] for c in inspector.get_columns('document')}
+    if 'ingestion_batch_id' not in columns:
+        with op.batch_alter_table('document', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('ingestion_batch_id', sa.String(length=32), nullable=True))
+    existing = {ix['name'] for ix in inspector.get_indexes('document')}
+    if 'ix_document_ingestion_batch_id' not in existing:
+        op.create_index('ix_document_ingestion_batch_id', 'document', ['ingestion_batch_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_document_ingestion_batch_id', table_name='document')
+    with op.batch_alter_table('document', schema=None) as batch_op:
+        batch_op.drop_column('ingestion_batch_id')